@@ -0,0 +1,276 @@
+# Offline end-to-end benchmark: drives /api/chat in-process for every tool
+# with a deterministic fake LLM (benchmarks/fake_llm.py), then times the hot
+# code paths on their own at several batch and table sizes.
+#
+#   python -m benchmarks.bench_e2e --latency-ms 200 --iterations 20 --output bench_e2e.json
+#   python -m benchmarks.bench_e2e --output new.json --baseline old.json
+#
+# Runs against a throwaway database and LLM cache in a temp directory. The
+# micro-benchmarks set the fake LLM latency to zero so they measure only our
+# own code. --baseline prints the p50 ratio of every case against an earlier
+# report, so two commits can be compared on the same machine.
+import os
+import re
+import json
+import time
+import random
+import shutil
+import sqlite3
+import asyncio
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from benchmarks.fake_llm import install_fake_llm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHAT_SCENARIOS = {
+    "prediction_new": "Predict churn for a 40-year-old female from Germany with balance 120000 and 1 products",
+    "prediction_known": "Predict churn for customer {customer_id}",
+    "recommendation": "Recommend actions for a 45-year-old male from Spain with low activity",
+    "sql": "Show average balance for exited customers",
+    "probability_filter": "Customers from France with churn probability greater than 0.6",
+}
+
+FEATURES = {"CreditScore": 600, "Geography": "France", "Gender": "Male", "Age": 40, "Tenure": 3,
+            "Balance": 60000.0, "NumOfProducts": 2, "HasCrCard": True, "IsActiveMember": True,
+            "EstimatedSalary": 50000.0}
+
+SCORED_SQL = "SELECT CustomerId, Surname, Age, Balance FROM customers WHERE Geography = 'France'"
+# No CustomerId, so fetch_above_threshold falls back to in-memory scoring
+FALLBACK_SQL = ("SELECT CreditScore, Geography, Gender, Age, Tenure, Balance, NumOfProducts, HasCrCard, "
+                "IsActiveMember, EstimatedSalary FROM customers WHERE Geography = 'France'")
+
+def summarize(samples):
+    samples = np.array(samples)
+    return {"n": int(len(samples)), "mean_ms": float(samples.mean()), "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)), "p99_ms": float(np.percentile(samples, 99))}
+
+def timeit(func, repeats: int):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+def stage_means(metrics_text: str):
+    # Mean ms per (stage, tool) from the churnbot_stage_seconds histogram
+    sums, counts = {}, {}
+    for line in metrics_text.splitlines():
+        match = re.match(r'churnbot_stage_seconds_(sum|count)\{stage="([^"]*)",tool="([^"]*)"\} (\S+)', line)
+        if match:
+            kind, stage, tool, value = match.groups()
+            (sums if kind == "sum" else counts)[f"{stage}/{tool}"] = float(value)
+    return {key: sums[key] / counts[key] * 1000 for key in sorted(sums) if counts.get(key)}
+
+def bench_chat(client, customer_id: str, iterations: int):
+    results = {}
+    for name, template in CHAT_SCENARIOS.items():
+        message = template.format(customer_id=customer_id)
+        chat_id = None
+        samples = []
+        # One untimed turn to create the chat; the rest carry its history
+        for i in range(iterations + 1):
+            start = time.perf_counter()
+            response = client.post("/api/chat", json={"message": message, "chat_id": chat_id})
+            elapsed = (time.perf_counter() - start) * 1000
+            response.raise_for_status()
+            chat_id = response.json()["chat_id"]
+            if i:
+                samples.append(elapsed)
+        results[name] = summarize(samples)
+
+    # Time to first token and total time of the streaming endpoint
+    first_token, total = [], []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        first = None
+        with client.stream("POST", "/api/chat/stream", json={"message": CHAT_SCENARIOS["prediction_new"], "chat_id": None}) as response:
+            for line in response.iter_lines():
+                if first is None and line == "event: token":
+                    first = (time.perf_counter() - start) * 1000
+        total.append((time.perf_counter() - start) * 1000)
+        first_token.append(first if first is not None else total[-1])
+    results["stream_prediction_first_token"] = summarize(first_token)
+    results["stream_prediction_total"] = summarize(total)
+    results["stages_mean_ms"] = stage_means(client.get("/api/metrics").text)
+    return results
+
+def bench_prediction(repeats: int, batch_sizes):
+    from src.services.prediction import predict_and_explain, predict_batch
+    from src.db.write_behind import writer
+    results = {"predict_and_explain": timeit(lambda: predict_and_explain(FEATURES, "bench"), repeats)}
+    for size in batch_sizes:
+        records = [dict(FEATURES, Age=18 + i % 70, Balance=1000.0 * (i % 200)) for i in range(size)]
+        results[f"predict_batch/{size}"] = timeit(lambda: predict_batch(records), max(1, repeats // size) + 2)
+    writer.flush()
+    return results
+
+def bench_crud(repeats: int, batch_sizes, customer_id: str):
+    from src.db import crud
+    from src.db.write_behind import writer
+    from src.services.history import load_history
+    results = {"get_customer": timeit(lambda: crud.get_customer(customer_id), repeats)}
+    for size in batch_sizes:
+        chat_id = crud.create_chat(f"bench {size}")
+
+        def insert_messages():
+            for i in range(size):
+                crud.create_message(chat_id, f"benchmark message {i} " * 10, "user" if i % 2 else "assistant")
+        results[f"create_message/{size}"] = timeit(insert_messages, 3)
+        results[f"get_recent_messages/{size}"] = timeit(lambda: crud.get_recent_messages(chat_id, 8), repeats)
+        results[f"load_history/{size}"] = timeit(lambda: load_history(chat_id), repeats)
+
+        def sync_logs():
+            for i in range(size):
+                crud.create_log("bench query", "bench response", "sql_tool", 1.0)
+
+        def queued_logs():
+            for i in range(size):
+                writer.submit(crud.LOG_INSERT, ("bench query", "bench response", "sql_tool", 1.0))
+        results[f"create_log/{size}"] = timeit(sync_logs, 3)
+        # Enqueue cost only; the flush waits on the writer's batching interval
+        results[f"queue_log/{size}"] = timeit(queued_logs, 3)
+        writer.flush()
+    return results
+
+def build_customers(path: str, customers: int):
+    from src.db.migrations import migrate
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    rng = random.Random(42)
+    conn.executemany(
+        """INSERT INTO customers (RowNumber, CustomerId, Surname, CreditScore, Geography, Gender, Age, Tenure,
+        Balance, NumOfProducts, HasCrCard, IsActiveMember, EstimatedSalary, Exited)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            (i + 1, 10_000_000 + i, f"Surname{i}", rng.randint(300, 850), rng.choice(["France", "Germany", "Spain"]),
+             rng.choice(["Male", "Female"]), rng.randint(18, 92), rng.randint(0, 10), round(rng.uniform(0, 250000), 2),
+             rng.randint(1, 4), rng.randint(0, 1), rng.randint(0, 1), round(rng.uniform(10, 200000), 2), rng.randint(0, 1))
+            for i in range(customers)
+        )
+    )
+    conn.commit()
+    conn.close()
+
+def use_database(path: str):
+    # Point the app at another file; per-thread connections reopen lazily
+    from src.core.config import config
+    from src.db.database import close_all_connections
+    from src.db.write_behind import writer
+    writer.flush()
+    close_all_connections()
+    config.DB_PATH = path
+
+def bench_probability_filter(repeats: int, table_sizes, workdir: str):
+    from src.core.config import config
+    from src.services.scoring import rebuild_customer_scores
+    from src.services.router_agent import fetch_above_threshold, probability_filter_query
+    original = config.DB_PATH
+    results = {}
+    try:
+        for size in table_sizes:
+            path = os.path.join(workdir, f"customers_{size}.db")
+            build_customers(path, size)
+            use_database(path)
+            start = time.perf_counter()
+            rebuild_customer_scores()
+            results[f"rebuild_scores/{size}"] = {"seconds": time.perf_counter() - start}
+            results[f"scored/{size}"] = timeit(lambda: fetch_above_threshold(SCORED_SQL, 0.6), repeats)
+            results[f"fallback/{size}"] = timeit(lambda: fetch_above_threshold(FALLBACK_SQL, 0.6), max(2, repeats // 5))
+            results[f"probability_filter_query/{size}"] = timeit(
+                lambda: asyncio.run(probability_filter_query(CHAT_SCENARIOS["probability_filter"])), repeats
+            )
+    finally:
+        use_database(original)
+    return results
+
+def compare(report, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    def cases(data, prefix=""):
+        for key, value in data.items():
+            if isinstance(value, dict) and "p50_ms" in value:
+                yield prefix + key, value["p50_ms"]
+            elif isinstance(value, dict):
+                yield from cases(value, f"{prefix}{key}.")
+
+    old = dict(cases({k: baseline.get(k, {}) for k in ("e2e", "micro")}))
+    print(f"\np50 vs {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for name, p50 in cases({k: report[k] for k in ("e2e", "micro")}):
+        if old.get(name):
+            print(f"  {name:<55} {old[name]:10.2f}ms -> {p50:10.2f}ms  x{p50 / old[name]:.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with a fake LLM")
+    parser.add_argument("--latency-ms", type=float, default=100, help="Fake LLM latency per call during the chat runs")
+    parser.add_argument("--token-latency-ms", type=float, default=0, help="Fake LLM delay per streamed token")
+    parser.add_argument("--iterations", type=int, default=10, help="Timed chat turns per tool")
+    parser.add_argument("--repeats", type=int, default=50, help="Repeats per micro-benchmark case")
+    parser.add_argument("--batch-sizes", default="1,10,100", help="Comma-separated batch sizes for crud and predict_batch")
+    parser.add_argument("--table-sizes", default="10000,100000", help="Comma-separated customer counts for the probability filter")
+    parser.add_argument("--skip-micro", action="store_true", help="Only run the chat scenarios")
+    parser.add_argument("--keep-db", action="store_true", help="Keep the temp directory with the benchmark databases")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare p50 latencies against")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+    batch_sizes = [int(s) for s in args.batch_sizes.split(",") if s]
+    table_sizes = [int(s) for s in args.table_sizes.split(",") if s]
+
+    workdir = tempfile.mkdtemp(prefix="churnbot-bench-")
+    # Read by src.core.config on import, so set before anything imports it
+    os.environ["DB_PATH"] = os.path.join(workdir, "bank_churn.db")
+    os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.db")
+    os.environ["MAINTENANCE_ENABLED"] = "false"
+    fake = install_fake_llm(args.latency_ms, args.token_latency_ms)
+
+    from fastapi.testclient import TestClient
+    import main as app_main
+
+    report = {"commit": git_commit(), "params": vars(args), "startup": {}, "e2e": {}, "micro": {}}
+    try:
+        start = time.perf_counter()
+        # The app shuts its db executor down on exit, so everything runs inside
+        with TestClient(app_main.app) as client:
+            while client.get("/api/ready").status_code != 200:
+                time.sleep(0.1)
+            report["startup"]["ready_s"] = time.perf_counter() - start
+            report["startup"]["phases"] = app_main.pipeline.timings
+            from src.db.crud import get_customer
+            from src.db.database import get_db_connection
+            conn = get_db_connection()
+            try:
+                customer_id = str(conn.execute("SELECT CustomerId FROM customers LIMIT 1").fetchone()[0])
+            finally:
+                conn.close()
+            assert get_customer(customer_id) is not None
+
+            report["e2e"] = bench_chat(client, customer_id, args.iterations)
+            if not args.skip_micro:
+                fake.latency_ms = fake.token_latency_ms = 0
+                report["micro"]["prediction"] = bench_prediction(args.repeats, batch_sizes)
+                report["micro"]["crud"] = bench_crud(args.repeats, batch_sizes, customer_id)
+                report["micro"]["probability_filter"] = bench_probability_filter(args.repeats, table_sizes, workdir)
+            report["llm_calls"] = fake.calls
+    finally:
+        if not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        compare(report, args.baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# Parity check and single-row latency benchmark for the array-backed forest
+# evaluator (src/services/fast_forest.py) against the sklearn path.
+#
+#   python -m benchmarks.bench_fast_forest --rows 2000 --repeats 500 --output bench_fast_forest.json
+#
+# Exits non-zero when predictions or probabilities diverge from sklearn.
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from src.services.fast_forest import FastForest, verify_parity
+from src.services.model_registry import get_model, get_preprocessor, get_model_version
+from src.services.scoring import FEATURE_COLUMNS
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "dataset.csv")
+
+def load_records(rows: int):
+    df = pd.read_csv(DATA_PATH, nrows=rows)[FEATURE_COLUMNS]
+    df["HasCrCard"] = df["HasCrCard"].astype(bool)
+    df["IsActiveMember"] = df["IsActiveMember"].astype(bool)
+    return df.to_dict(orient="records")
+
+def sklearn_predict_one(features):
+    # The pre-existing path in score_customer
+    processed = get_preprocessor().transform(pd.DataFrame([features]))
+    model = get_model()
+    return int(model.predict(processed)[0]), float(model.predict_proba(processed)[0][1])
+
+def latency(func, records, repeats):
+    samples = []
+    for i in range(repeats):
+        record = records[i % len(records)]
+        start = time.perf_counter()
+        func(record)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return {"mean_ms": float(samples.mean()), "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)), "p99_ms": float(np.percentile(samples, 99))}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fast forest evaluator against sklearn")
+    parser.add_argument("--rows", type=int, default=2000, help="Dataset rows used for the parity check")
+    parser.add_argument("--repeats", type=int, default=500, help="Single-row predictions timed per engine")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    engine = FastForest.from_sklearn(get_preprocessor(), get_model(), get_model_version())
+    compile_s = time.perf_counter() - start
+
+    records = load_records(args.rows)
+    parity = verify_parity(engine, records)
+    report = {
+        "params": vars(args),
+        "compile_s": compile_s,
+        "parity": parity,
+        "sklearn": latency(sklearn_predict_one, records, args.repeats),
+        "fast_forest": latency(engine.predict_one, records, args.repeats),
+    }
+    report["speedup_p50"] = report["sklearn"]["p50_ms"] / report["fast_forest"]["p50_ms"]
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if not parity["ok"] or parity["prediction_mismatches"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
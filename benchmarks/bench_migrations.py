@@ -0,0 +1,132 @@
+# Before/after benchmark for the schema migrations in src/db/migrations.py.
+#
+# Builds a database in the pre-migration layout (customers without a primary
+# key, no secondary indexes), times the hot lookups, applies the migrations and
+# times them again.
+#
+#   python -m benchmarks.bench_migrations --customers 1000000 --output bench_migrations.json
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+from src.db.migrations import _create_base_tables, migrate
+
+GEOGRAPHIES = ["France", "Germany", "Spain"]
+GENDERS = ["Male", "Female"]
+
+def build_legacy_db(path: str, customers: int, chats: int, messages_per_chat: int, predictions: int, logs: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    # Same layout df.to_sql(if_exists='replace') used to produce
+    conn.execute("""
+    CREATE TABLE customers (
+        "RowNumber" INTEGER, "CustomerId" INTEGER, "Surname" TEXT, "CreditScore" INTEGER,
+        "Geography" TEXT, "Gender" TEXT, "Age" INTEGER, "Tenure" INTEGER, "Balance" REAL,
+        "NumOfProducts" INTEGER, "HasCrCard" INTEGER, "IsActiveMember" INTEGER,
+        "EstimatedSalary" REAL, "Exited" INTEGER
+    )
+    """)
+    _create_base_tables(conn)
+
+    rng = random.Random(42)
+    ids = rng.sample(range(10_000_000, 99_999_999), customers)
+    conn.executemany(
+        "INSERT INTO customers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            (i + 1, cid, f"Surname{i}", rng.randint(300, 850), rng.choice(GEOGRAPHIES), rng.choice(GENDERS),
+             rng.randint(18, 92), rng.randint(0, 10), round(rng.uniform(0, 250000), 2), rng.randint(1, 4),
+             rng.randint(0, 1), rng.randint(0, 1), round(rng.uniform(10, 200000), 2), rng.randint(0, 1))
+            for i, cid in enumerate(ids)
+        )
+    )
+
+    start = datetime(2025, 1, 1)
+    conn.executemany("INSERT INTO chats (id, title) VALUES (?, ?)", ((c, f"chat {c}") for c in range(1, chats + 1)))
+    # Interleave chats like concurrent users would
+    conn.executemany(
+        "INSERT INTO messages (chat_id, content, role, created_at) VALUES (?, ?, ?, ?)",
+        (
+            ((n % chats) + 1, "x" * 200, "user" if n % 2 else "assistant",
+             (start + timedelta(seconds=n)).isoformat(sep=" "))
+            for n in range(chats * messages_per_chat)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO predictions (customer_id, features, prediction, probability, timestamp) VALUES (?, ?, ?, ?, ?)",
+        (
+            (str(rng.choice(ids)), "{}", rng.randint(0, 1), rng.random(), (start + timedelta(seconds=n)).isoformat())
+            for n in range(predictions)
+        )
+    )
+    conn.executemany(
+        "INSERT INTO logs (query, response, timestamp) VALUES (?, ?, ?)",
+        (("q", "r", (start + timedelta(seconds=n * 10)).isoformat(sep=" ")) for n in range(logs))
+    )
+    conn.commit()
+    return conn, ids
+
+def time_queries(conn: sqlite3.Connection, ids, chats: int, repeats: int):
+    rng = random.Random(7)
+    sample_ids = [rng.choice(ids) for _ in range(repeats)]
+    sample_chats = [rng.randint(1, chats) for _ in range(repeats)]
+    cases = {
+        "customer_by_id": ("SELECT * FROM customers WHERE CustomerId = ?", [(str(c),) for c in sample_ids]),
+        "messages_by_chat": ("SELECT * FROM messages WHERE chat_id = ? ORDER BY created_at ASC", [(c,) for c in sample_chats]),
+        "predictions_by_customer": ("SELECT * FROM predictions WHERE customer_id = ? ORDER BY timestamp DESC", [(str(c),) for c in sample_ids]),
+        "logs_last_day": ("SELECT COUNT(*) FROM logs WHERE timestamp >= ?", [("2025-01-20",)] * repeats),
+    }
+    results = {}
+    for name, (sql, params) in cases.items():
+        t0 = time.perf_counter()
+        for p in params:
+            conn.execute(sql, p).fetchall()
+        elapsed = time.perf_counter() - t0
+        plan = " | ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params[0]))
+        results[name] = {"mean_ms": elapsed / len(params) * 1000, "plan": plan}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hot lookups before and after schema migrations")
+    parser.add_argument("--customers", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=1_000)
+    parser.add_argument("--messages-per-chat", type=int, default=100)
+    parser.add_argument("--predictions", type=int, default=200_000)
+    parser.add_argument("--logs", type=int, default=200_000)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        conn, ids = build_legacy_db(path, args.customers, args.chats, args.messages_per_chat, args.predictions, args.logs)
+        build_s = time.perf_counter() - t0
+
+        before = time_queries(conn, ids, args.chats, args.repeats)
+        t0 = time.perf_counter()
+        version = migrate(conn)
+        migrate_s = time.perf_counter() - t0
+        after = time_queries(conn, ids, args.chats, args.repeats)
+        conn.close()
+
+    report = {
+        "params": vars(args),
+        "build_s": build_s,
+        "migrate_s": migrate_s,
+        "schema_version": version,
+        "before": before,
+        "after": after,
+        "speedup": {name: before[name]["mean_ms"] / max(after[name]["mean_ms"], 1e-9) for name in before},
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Accuracy check of the local keyword router (src/services/intent_router.py)
+# against a labelled query list. A query may fall through to the LLM router
+# (no fast route), but must never be fast-routed to the wrong tool.
+#
+#   python -m benchmarks.check_intent_router
+#
+# Exits non-zero on any misroute.
+import sys
+import json
+from src.services.intent_router import classify_intent, fast_route, score_intents
+
+LABELLED_QUERIES = [
+    # Single customers: prediction
+    ("Predict churn for customer 15634602", "prediction_tool"),
+    ("Will customer 15647311 churn?", "prediction_tool"),
+    ("Is a 42-year-old from France with a zero balance likely to churn?", "prediction_tool"),
+    ("Why is customer 15619304 likely to leave?", "prediction_tool"),
+    ("Explain the prediction for customer 15701354", "prediction_tool"),
+    ("Predict whether a 35-year-old man from Spain with 2 products will churn", "prediction_tool"),
+    ("What is the churn prediction for 15737888?", "prediction_tool"),
+    ("Explain why this customer will churn", "prediction_tool"),
+    ("Explain why customer 15634602 with a high total balance is at risk", "prediction_tool"),
+    # Recommendations
+    ("Recommend actions to retain customer 15634602", "recommendation_tool"),
+    ("What can we do to keep customer 15647311?", "recommendation_tool"),
+    ("Suggest retention actions for a 50-year-old from Germany", "recommendation_tool"),
+    ("Give me recommendations for customer 15619304", "recommendation_tool"),
+    ("What actions should we take for customers likely to churn?", "recommendation_tool"),
+    # Aggregates and lists: sql
+    ("How many customers are in Germany?", "sql_tool"),
+    ("Count customers predicted to churn", "sql_tool"),
+    ("How many customers are predicted to churn?", "sql_tool"),
+    ("How many customers will churn?", "sql_tool"),
+    ("Number of customers predicted to leave", "sql_tool"),
+    ("Total number of customers who churned", "sql_tool"),
+    ("Count churned customers by geography", "sql_tool"),
+    ("What is the average balance of customers in France?", "sql_tool"),
+    ("Average age of customers who are likely to churn", "sql_tool"),
+    ("List all customers older than 60", "sql_tool"),
+    ("Show all customers with more than 3 products", "sql_tool"),
+    ("What is the highest credit score?", "sql_tool"),
+    ("Sum of balances of churned customers in Spain", "sql_tool"),
+    # Thresholds on the churn probability
+    ("Show customers in Germany with churn probability greater than 0.7", "probability_filter_tool"),
+    ("List customers with churn probability above 0.8", "probability_filter_tool"),
+    ("Which female customers have a churn probability over 0.6?", "probability_filter_tool"),
+    ("Customers aged over 50 with churn probability more than 0.5", "probability_filter_tool"),
+    ("How many customers have a churn probability above 0.9?", "probability_filter_tool"),
+]
+
+def main():
+    misrouted, fast = [], 0
+    for query, expected in LABELLED_QUERIES:
+        tool = fast_route(query)
+        if tool is None:
+            continue
+        fast += 1
+        if tool != expected:
+            _, confidence = classify_intent(query)
+            misrouted.append({"query": query, "expected": expected, "routed": tool,
+                              "confidence": confidence, "scores": score_intents(query)})
+    report = {"queries": len(LABELLED_QUERIES), "fast_routed": fast,
+              "fast_path_share": fast / len(LABELLED_QUERIES), "misrouted": misrouted}
+    print(json.dumps(report, indent=2))
+    if misrouted:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
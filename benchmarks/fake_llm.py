@@ -0,0 +1,176 @@
+# Deterministic stand-in for the shared ChatOpenAI client, so the chat
+# pipeline can be benchmarked offline with a fixed, configurable LLM latency.
+#
+#   from benchmarks.fake_llm import install_fake_llm
+#   install_fake_llm(latency_ms=200, token_latency_ms=5)  # before importing main or src.services.*
+#
+# Responses are canned per prompt (router, SQL, feature extraction, and free
+# text for explain/recommend) and derived from the query only, so every run
+# sends the same work down the same code paths.
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+# The real client is still constructed when llm_utils is imported
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+GEOGRAPHIES = ("France", "Germany", "Spain")
+
+def _field(pattern: str, text: str, default: Any, cast=float) -> Any:
+    match = re.search(pattern, text, re.IGNORECASE)
+    return cast(match.group(1)) if match else default
+
+def _line(prefix: str, text: str) -> str:
+    match = re.search(rf"^{prefix}\s*(.*)$", text, re.MULTILINE)
+    return match.group(1).strip() if match else ""
+
+def route_for(query: str) -> str:
+    lowered = query.lower()
+    if "probability" in lowered:
+        return "probability_filter_tool"
+    if any(word in lowered for word in ("recommend", "action", "suggest")):
+        return "recommendation_tool"
+    if any(word in lowered for word in ("average", "count", "how many", "list", "show")):
+        return "sql_tool"
+    return "prediction_tool"
+
+def sql_for(query: str) -> str:
+    # Row-returning SELECTs keep CustomerId so the probability filter can use
+    # the indexed customer_scores join
+    geography = next((g for g in GEOGRAPHIES if g.lower() in query.lower()), None)
+    if "average" in query.lower():
+        return "SELECT AVG(Balance) FROM customers WHERE Exited = 1"
+    if geography:
+        return f"SELECT CustomerId, Surname, Age, Balance FROM customers WHERE Geography = '{geography}'"
+    return "SELECT CustomerId, Surname, Age, Balance FROM customers WHERE Age > 40"
+
+def features_for(text: str) -> Dict[str, Any]:
+    lowered = text.lower()
+    return {
+        "CreditScore": _field(r"credit score (?:of )?(\d+)", text, 650, int),
+        "Geography": next((g for g in GEOGRAPHIES if g.lower() in lowered), "France"),
+        "Gender": "Female" if "female" in lowered else "Male",
+        "Age": _field(r"(\d+)[- ]year", text, 40, int),
+        "Tenure": _field(r"tenure (?:of )?(\d+)", text, 5, int),
+        "Balance": _field(r"balance (?:of )?(\d+(?:\.\d+)?)", text, 60000.0),
+        "NumOfProducts": _field(r"(\d+) products", text, 2, int),
+        "HasCrCard": "no credit card" not in lowered,
+        "IsActiveMember": "inactive" not in lowered and "low activity" not in lowered,
+        "EstimatedSalary": _field(r"salary (?:of )?(\d+(?:\.\d+)?)", text, 50000.0),
+    }
+
+def respond(prompt: str) -> str:
+    if "Previous conversation:" in prompt:
+        return route_for(_line("Current query:", prompt))
+    if "You are a SQL expert" in prompt:
+        return sql_for(_line("Query:", prompt))
+    if "Extract the following fields" in prompt:
+        return json.dumps(features_for(_line("Text:", prompt)))
+    if "recommendations" in prompt:
+        return ("- Offer a loyalty discount on the next renewal.\n"
+                "- Assign a relationship manager for a personal check-in.\n"
+                "- Promote a second product that fits the customer's profile.")
+    return ("- Age is the strongest factor in this prediction.\n"
+            "- Number of products held shifts the risk noticeably.\n"
+            "- Account activity and balance complete the top three.")
+
+class FakeChatModel(BaseChatModel):
+    # latency_ms is paid once per call (time to first token), token_latency_ms
+    # between streamed tokens; non-streamed calls pay both up front
+    latency_ms: float = 0.0
+    token_latency_ms: float = 0.0
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _prompt(self, messages: List[BaseMessage]) -> str:
+        return "\n".join(str(message.content) for message in messages)
+
+    def _usage(self, prompt: str, text: str) -> Dict[str, int]:
+        # ~4 characters per token, like the history module's fallback
+        prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(text) // 4 + 1
+        return {"input_tokens": prompt_tokens, "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _tokens(self, text: str) -> List[str]:
+        return re.findall(r"\S+\s*|\s+", text)
+
+    def _full_delay(self, text: str) -> float:
+        return (self.latency_ms + self.token_latency_ms * len(self._tokens(text))) / 1000
+
+    def _result(self, prompt: str, text: str) -> ChatResult:
+        message = AIMessage(content=text, usage_metadata=self._usage(prompt, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        prompt = self._prompt(messages)
+        text = respond(prompt)
+        time.sleep(self._full_delay(text))
+        return self._result(prompt, text)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        prompt = self._prompt(messages)
+        text = respond(prompt)
+        await asyncio.sleep(self._full_delay(text))
+        return self._result(prompt, text)
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        prompt = self._prompt(messages)
+        text = respond(prompt)
+        time.sleep(self.latency_ms / 1000)
+        for token in self._tokens(text):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            time.sleep(self.token_latency_ms / 1000)
+        # Usage arrives on a final empty chunk, as with stream_usage=True
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, text)))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        prompt = self._prompt(messages)
+        text = respond(prompt)
+        await asyncio.sleep(self.latency_ms / 1000)
+        for token in self._tokens(text):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+            await asyncio.sleep(self.token_latency_ms / 1000)
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(prompt, text)))
+
+def install_fake_llm(latency_ms: float = 0.0, token_latency_ms: float = 0.0) -> FakeChatModel:
+    # The chains bind llm_utils.llm when their modules are imported, so this
+    # has to run first. The LLM cache is disabled: hits would hide the latency.
+    loaded = [name for name in ("src.services.router_agent", "src.services.prediction", "src.services.sql",
+                                "src.services.recommendation") if name in sys.modules]
+    if loaded:
+        raise RuntimeError(f"install_fake_llm() must run before importing {', '.join(loaded)}")
+    from src.core.config import config
+    config.LLM_CACHE_ENABLED = False
+    import src.services.llm_utils as llm_utils
+    from langchain_core.globals import set_llm_cache
+    set_llm_cache(None)
+    model_class = FakeChatModel
+    if config.LLM_SCHEDULER_ENABLED:
+        # Same scheduling as the real client gets
+        from src.services.llm_scheduler import ScheduledChatModel
+        model_class = type("ScheduledFakeChatModel", (ScheduledChatModel, FakeChatModel), {})
+    fake = model_class(latency_ms=latency_ms, token_latency_ms=token_latency_ms,
+                         callbacks=[llm_utils.TokenUsageCallback()])
+    llm_utils.llm = fake
+    return fake
@@ -0,0 +1,243 @@
+# Concurrent load generator for a running server. Simulated users open chats
+# and send a weighted mix of messages for every tool, with think time between
+# turns, at each concurrency level in turn.
+#
+#   python -m benchmarks.mock_openai --port 8100 --latency-ms 400 --latency-dist lognormal &
+#   OPENROUTER_BASE=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock LLM_CACHE_ENABLED=false uvicorn main:app --port 8000 &
+#   python -m benchmarks.load_chat --url http://127.0.0.1:8000 --mock-url http://127.0.0.1:8100 \
+#       --concurrency 50,200,500 --duration 60 --output load_chat.json
+#
+# Reports throughput, errors and client-side p50/p95/p99 per scenario, plus
+# per-tool server-side latency estimated from the churnbot_turn_seconds
+# histogram and, with --mock-url, the peak number of concurrent LLM calls.
+import os
+import re
+import csv
+import json
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+import numpy as np
+import httpx
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "dataset.csv")
+
+GEOGRAPHIES = ["France", "Germany", "Spain"]
+GENDERS = ["male", "female"]
+
+# Scenario -> (default weight, message builder)
+SCENARIOS = {
+    "prediction_new": (30, lambda r, ids: f"Predict churn for a {r.randint(18, 80)}-year-old {r.choice(GENDERS)} from "
+                                          f"{r.choice(GEOGRAPHIES)} with balance {r.randint(0, 200) * 1000} and {r.randint(1, 4)} products"),
+    "prediction_known": (20, lambda r, ids: f"Predict churn for customer {r.choice(ids)}"),
+    "recommendation": (15, lambda r, ids: f"Recommend actions for a {r.randint(18, 80)}-year-old {r.choice(GENDERS)} "
+                                          f"from {r.choice(GEOGRAPHIES)} with low activity"),
+    "sql": (20, lambda r, ids: r.choice(["Show average balance for exited customers",
+                                         f"How many customers from {r.choice(GEOGRAPHIES)} are older than {r.randint(30, 70)}",
+                                         f"List customers from {r.choice(GEOGRAPHIES)} with high balance but low activity"])),
+    "probability_filter": (10, lambda r, ids: f"Customers from {r.choice(GEOGRAPHIES)} with churn probability "
+                                              f"greater than {r.choice([0.5, 0.6, 0.7, 0.8])}"),
+    "follow_up": (5, lambda r, ids: r.choice(["Why?", "Explain that in more detail", "What should we do about it?"])),
+}
+
+def load_customer_ids(limit: int = 2000) -> List[str]:
+    with open(DATA_PATH, newline="") as f:
+        return [row["CustomerId"] for _, row in zip(range(limit), csv.DictReader(f))]
+
+def parse_mix(spec: Optional[str]) -> Dict[str, float]:
+    if not spec:
+        return {name: weight for name, (weight, _) in SCENARIOS.items()}
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{name}', expected one of: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {"n": 0}
+    samples = np.array(samples)
+    return {"n": int(len(samples)), "mean_ms": float(samples.mean()), "p50_ms": float(np.percentile(samples, 50)),
+            "p95_ms": float(np.percentile(samples, 95)), "p99_ms": float(np.percentile(samples, 99))}
+
+_SAMPLE = re.compile(r'churnbot_turn_seconds_(bucket|sum|count)\{tool="([^"]*)"(?:,le="([^"]*)")?\} (\S+)')
+
+def turn_histograms(metrics_text: str) -> Dict[str, Dict]:
+    series: Dict[str, Dict] = {}
+    for line in metrics_text.splitlines():
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        kind, tool, le, value = match.groups()
+        entry = series.setdefault(tool, {"buckets": {}, "sum": 0.0, "count": 0.0})
+        if kind == "bucket":
+            entry["buckets"][float("inf") if le == "+Inf" else float(le)] = float(value)
+        else:
+            entry[kind] = float(value)
+    return series
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> Optional[float]:
+    # Linear interpolation within the bucket, as Prometheus does
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if not total:
+        return None
+    rank, lower, below = q * total, 0.0, 0.0
+    for bound in bounds:
+        if buckets[bound] >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * (rank - below) / max(buckets[bound] - below, 1e-9)
+        lower, below = bound, buckets[bound]
+    return lower
+
+def server_side(before: Dict[str, Dict], after: Dict[str, Dict]) -> Dict[str, Dict]:
+    results = {}
+    for tool, entry in after.items():
+        previous = before.get(tool, {"buckets": {}, "sum": 0.0, "count": 0.0})
+        count = entry["count"] - previous["count"]
+        if count <= 0:
+            continue
+        buckets = {bound: value - previous["buckets"].get(bound, 0.0) for bound, value in entry["buckets"].items()}
+        results[tool] = {"n": int(count), "mean_ms": (entry["sum"] - previous["sum"]) / count * 1000,
+                         **{f"p{int(q * 100)}_ms": (histogram_quantile(q, buckets) or 0) * 1000 for q in (0.5, 0.95, 0.99)}}
+    return results
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.first_token: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.completed = 0
+
+    def ok(self, scenario: str, elapsed_ms: float):
+        self.latencies.setdefault(scenario, []).append(elapsed_ms)
+        self.completed += 1
+
+    def fail(self, scenario: str, reason: str):
+        key = f"{scenario}:{reason}"
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+async def send(client: httpx.AsyncClient, message: str, chat_id: Optional[int], stream: bool, recorder: Recorder) -> Optional[int]:
+    if not stream:
+        response = await client.post("/api/chat", json={"message": message, "chat_id": chat_id})
+        response.raise_for_status()
+        return response.json()["chat_id"]
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/api/chat/stream", json={"message": message, "chat_id": chat_id}) as response:
+        response.raise_for_status()
+        event = None
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event == "token" and first is None:
+                    first = (time.perf_counter() - start) * 1000
+                    recorder.first_token.append(first)
+            elif line.startswith("data: ") and event == "chat":
+                chat_id = json.loads(line[6:])["chat_id"]
+    return chat_id
+
+async def user(client, rng: random.Random, ids, mix, args, deadline: float, recorder: Recorder):
+    names, weights = list(mix), list(mix.values())
+    while time.monotonic() < deadline:
+        chat_id = None
+        for turn in range(args.turns):
+            if time.monotonic() >= deadline:
+                return
+            scenario = rng.choices(names, weights)[0]
+            if scenario == "follow_up" and chat_id is None:
+                scenario = "prediction_new"  # A follow-up needs an earlier turn
+            message = SCENARIOS[scenario][1](rng, ids)
+            stream = rng.random() < args.stream_ratio
+            label = scenario + ("/stream" if stream else "")
+            start = time.perf_counter()
+            try:
+                chat_id = await send(client, message, chat_id, stream, recorder)
+                recorder.ok(label, (time.perf_counter() - start) * 1000)
+            except httpx.HTTPStatusError as e:
+                recorder.fail(label, str(e.response.status_code))
+            except httpx.HTTPError as e:
+                recorder.fail(label, type(e).__name__)
+            if args.think_ms:
+                await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+async def run_level(concurrency: int, args, ids, mix) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        before = turn_histograms((await client.get("/api/metrics")).text)
+        if args.mock_url:
+            await client.post(f"{args.mock_url}/stats/reset")
+        recorder = Recorder()
+        start = time.monotonic()
+        deadline = start + args.duration
+        tasks = []
+        for i in range(concurrency):
+            rng = random.Random(args.seed * 100003 + i)
+            tasks.append(asyncio.create_task(user(client, rng, ids, mix, args, deadline, recorder)))
+            if args.ramp_s:
+                await asyncio.sleep(args.ramp_s / concurrency)
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - start
+        after = turn_histograms((await client.get("/api/metrics")).text)
+        level = {
+            "concurrency": concurrency,
+            "elapsed_s": elapsed,
+            "completed": recorder.completed,
+            "errors": recorder.errors,
+            "throughput_rps": recorder.completed / elapsed,
+            "scenarios": {name: summarize(samples) for name, samples in sorted(recorder.latencies.items())},
+            "stream_first_token": summarize(recorder.first_token),
+            "server_tools": server_side(before, after),
+        }
+        if args.mock_url:
+            level["llm_upstream"] = (await client.get(f"{args.mock_url}/stats")).json()
+        return level
+
+def print_level(level: Dict):
+    print(f"\nconcurrency {level['concurrency']}: {level['completed']} turns in {level['elapsed_s']:.1f}s "
+          f"({level['throughput_rps']:.1f}/s), {sum(level['errors'].values())} errors")
+    for name, stats in list(level["scenarios"].items()) + [("server:" + k, v) for k, v in level["server_tools"].items()]:
+        if stats.get("n"):
+            print(f"  {name:<32} n={stats['n']:<6} p50={stats['p50_ms']:8.0f}ms p95={stats['p95_ms']:8.0f}ms p99={stats['p99_ms']:8.0f}ms")
+    if "llm_upstream" in level:
+        print(f"  upstream LLM calls: {level['llm_upstream']['requests']}, peak in flight: {level['llm_upstream']['peak_in_flight']}")
+
+async def run(args):
+    ids = load_customer_ids()
+    mix = parse_mix(args.mix)
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",") if c]:
+        level = await run_level(concurrency, args, ids, mix)
+        print_level(level)
+        levels.append(level)
+    return levels
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent chat load generator")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the running app")
+    parser.add_argument("--mock-url", help="Base URL of benchmarks.mock_openai, for upstream call stats")
+    parser.add_argument("--concurrency", default="50", help="Comma-separated numbers of simulated users")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds per concurrency level")
+    parser.add_argument("--ramp-s", type=float, default=2, help="Seconds over which users are started")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per chat before a user opens a new one")
+    parser.add_argument("--think-ms", type=float, default=500, help="Mean think time between turns (0 for none)")
+    parser.add_argument("--stream-ratio", type=float, default=0.3, help="Fraction of turns sent to /api/chat/stream")
+    parser.add_argument("--mix", help="Scenario weights, e.g. prediction_new=3,sql=1 (default: " +
+                        ",".join(f"{name}={weight}" for name, (weight, _) in SCENARIOS.items()) + ")")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    report = {"params": vars(args), "levels": asyncio.run(run(args))}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
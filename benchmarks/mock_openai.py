@@ -0,0 +1,179 @@
+# OpenAI-compatible stand-in for load tests. Serves /v1/chat/completions
+# (plain and streamed) with the canned responses of benchmarks/fake_llm.py,
+# a tunable latency distribution and optional error injection.
+#
+#   python -m benchmarks.mock_openai --port 8100 --latency-ms 400 --latency-dist lognormal --error-rate 0.01
+#   OPENROUTER_BASE=http://127.0.0.1:8100/v1 OPENAI_API_KEY=mock uvicorn main:app --port 8000
+#
+# GET /stats reports request counts, injected errors and peak concurrency,
+# i.e. how many calls the app really had in flight against the provider;
+# POST /stats/reset clears them between runs.
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from typing import Any, Dict, List
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from benchmarks.fake_llm import respond
+
+class MockSettings:
+    latency_ms: float = 300
+    latency_dist: str = "fixed"   # fixed, uniform, normal or lognormal
+    jitter: float = 0.3           # spread relative to latency_ms (sigma for lognormal)
+    token_latency_ms: float = 10
+    error_rate: float = 0.0       # 500 responses
+    rate_limit_rate: float = 0.0  # 429 responses with Retry-After
+    hang_rate: float = 0.0        # requests that stall for hang_seconds, for client timeouts
+    hang_seconds: float = 60
+    seed: int = 0
+
+settings = MockSettings()
+rng = random.Random(settings.seed)
+stats: Dict[str, Any] = {}
+
+def reset_stats():
+    stats.update(requests=0, streamed=0, errors=0, rate_limited=0, hung=0, in_flight=0, peak_in_flight=0,
+                 prompt_tokens=0, completion_tokens=0, started=time.time())
+
+reset_stats()
+app = FastAPI(title="Mock OpenAI")
+
+def sample_latency() -> float:
+    base = settings.latency_ms / 1000
+    if settings.latency_dist == "uniform":
+        return max(0.0, rng.uniform(base * (1 - settings.jitter), base * (1 + settings.jitter)))
+    if settings.latency_dist == "normal":
+        return max(0.0, rng.gauss(base, base * settings.jitter))
+    if settings.latency_dist == "lognormal":
+        # Median at latency_ms with a long right tail, like real providers
+        return base * rng.lognormvariate(0, settings.jitter)
+    return base
+
+def prompt_text(messages: List[Dict[str, Any]]) -> str:
+    parts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):  # Content parts
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        parts.append(content)
+    return "\n".join(parts)
+
+def usage(prompt: str, text: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4 + 1, len(text) // 4 + 1
+    stats["prompt_tokens"] += prompt_tokens
+    stats["completion_tokens"] += completion_tokens
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens}
+
+def error(status: int, message: str, kind: str, headers: Dict[str, str] = None) -> JSONResponse:
+    return JSONResponse({"error": {"message": message, "type": kind, "code": status}}, status_code=status, headers=headers)
+
+@app.get("/stats")
+@app.get("/v1/stats")
+async def get_stats():
+    return {**stats, "uptime_s": time.time() - stats["started"]}
+
+@app.post("/stats/reset")
+@app.post("/v1/stats/reset")
+async def post_stats_reset():
+    reset_stats()
+    return {"ok": True}
+
+@app.get("/models")
+@app.get("/v1/models")
+async def models():
+    return {"object": "list", "data": [{"id": "mock", "object": "model", "owned_by": "benchmarks"}]}
+
+@app.post("/chat/completions")
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    streaming = False
+    try:
+        roll = rng.random()
+        if roll < settings.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return error(429, "Rate limit reached (injected)", "rate_limit_exceeded", {"Retry-After": "1"})
+        if roll < settings.rate_limit_rate + settings.error_rate:
+            stats["errors"] += 1
+            return error(500, "Internal server error (injected)", "server_error")
+        if roll < settings.rate_limit_rate + settings.error_rate + settings.hang_rate:
+            stats["hung"] += 1
+            await asyncio.sleep(settings.hang_seconds)
+
+        prompt = prompt_text(body.get("messages", []))
+        text = respond(prompt)
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        await asyncio.sleep(sample_latency())
+
+        if body.get("stream"):
+            stats["streamed"] += 1
+            include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+            streaming = True
+            return StreamingResponse(stream(completion_id, created, model, prompt, text, include_usage),
+                                     media_type="text/event-stream")
+
+        await asyncio.sleep(settings.token_latency_ms * len(text.split()) / 1000)
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage(prompt, text),
+        }
+    finally:
+        if not streaming:
+            stats["in_flight"] -= 1
+
+async def stream(completion_id: str, created: int, model: str, prompt: str, text: str, include_usage: bool):
+    def chunk(delta: Dict[str, Any], finish_reason=None, **extra) -> str:
+        payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                   "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+        return f"data: {json.dumps(payload)}\n\n"
+
+    try:
+        yield chunk({"role": "assistant", "content": ""})
+        words = text.split(" ")
+        for i, word in enumerate(words):
+            yield chunk({"content": word if i == len(words) - 1 else word + " "})
+            await asyncio.sleep(settings.token_latency_ms / 1000)
+        yield chunk({}, "stop")
+        if include_usage:
+            # With stream_options.include_usage the last chunk has no choices
+            payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                       "choices": [], "usage": usage(prompt, text)}
+            yield f"data: {json.dumps(payload)}\n\n"
+        yield "data: [DONE]\n\n"
+    finally:
+        stats["in_flight"] -= 1
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=MockSettings.latency_ms, help="Median time to first token")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "normal", "lognormal"], default=MockSettings.latency_dist)
+    parser.add_argument("--jitter", type=float, default=MockSettings.jitter, help="Relative spread (sigma for lognormal)")
+    parser.add_argument("--token-latency-ms", type=float, default=MockSettings.token_latency_ms, help="Delay per generated word")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of requests answered with a 429")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that stall for --hang-seconds")
+    parser.add_argument("--hang-seconds", type=float, default=MockSettings.hang_seconds)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for name in ("latency_ms", "latency_dist", "jitter", "token_latency_ms", "error_rate",
+                 "rate_limit_rate", "hang_rate", "hang_seconds", "seed"):
+        setattr(settings, name, getattr(args, name))
+    rng.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
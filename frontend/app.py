@@ -139,11 +139,16 @@ def render_chat():
             if message["role"] == "assistant" and message["content"].startswith("|"):
                 try:
                     lines = message["content"].strip().split("\n")
-                    if len(lines) >= 2:
-                        headers = [h.strip() for h in lines[0].strip("|").split("|")]
-                        data = [[c.strip() for c in row.strip("|").split("|")] for row in lines[2:]]
+                    # Paged SQL results end with a summary line after the table
+                    table_lines = [line for line in lines if line.startswith("|")]
+                    footer = "\n".join(line for line in lines[len(table_lines):] if line.strip())
+                    if len(table_lines) >= 2:
+                        headers = [h.strip() for h in table_lines[0].strip("|").split("|")]
+                        data = [[c.strip() for c in row.strip("|").split("|")] for row in table_lines[2:]]
                         df = pd.DataFrame(data, columns=headers)
                         st.dataframe(df)
+                        if footer:
+                            st.caption(footer)
                     else:
                         st.write(message["content"])
                 except:
@@ -1,10 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from src.routers import chat
-from src.db.database import init_db
-from src.core.config import setup_logging
+from src.routers import chat, predict, results, system
+import asyncio
+import logging
+from src.db.database import close_all_connections, run_db, shutdown_db_executor
+from src.db.write_behind import writer
+from src.core.config import config, setup_logging
+from src.core.startup import pipeline, BLOCKING_PHASES
+from src.core.workers import WorkerStatsMiddleware, heartbeat_loop, try_lock, worker
 
 setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Bank Churn Prediction Chatbot")
 
@@ -16,14 +22,50 @@ app.add_middleware(
     allow_methods=["*"],  # Allow all methods
     allow_headers=["*"],  # Allow all headers
 )
+app.add_middleware(WorkerStatsMiddleware)  # Request counts for /api/workers
 
 # Include routers
 app.include_router(chat.router, prefix="/api")
+app.include_router(predict.router, prefix="/api")
+app.include_router(results.router, prefix="/api")
+app.include_router(system.router, prefix="/api")
+
+async def warm_up_in_background():
+    try:
+        await asyncio.to_thread(pipeline.run)
+    except Exception as e:
+        logger.error(f"Warm-up failed, service stays unready: {str(e)}")
+
+async def maintenance_loop():
+    # Retention, log rollup and compaction, once after startup and then every
+    # MAINTENANCE_INTERVAL_HOURS
+    from src.db.maintenance import run_maintenance
+    while True:
+        try:
+            await run_db(run_maintenance)
+        except Exception as e:
+            logger.error(f"Maintenance failed: {str(e)}")
+        await asyncio.sleep(config.MAINTENANCE_INTERVAL_HOURS * 3600)
 
 @app.on_event("startup")
 async def startup_event():
-    init_db()
+    pipeline.run(BLOCKING_PHASES)
+    # Model warm-up, score refresh and LLM client creation run while the server
+    # already answers health checks; /api/ready turns green when they finish
+    app.state.warm_up_task = asyncio.create_task(warm_up_in_background())
+    # With several workers only the one holding the lock runs maintenance
+    if config.MAINTENANCE_ENABLED and try_lock(config.DB_PATH + ".maintenance.lock"):
+        app.state.maintenance_task = asyncio.create_task(maintenance_loop())
+    if worker.count > 1:
+        app.state.heartbeat_task = asyncio.create_task(heartbeat_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    writer.stop()  # Flush queued audit rows before the connections go away
+    shutdown_db_executor()
+    close_all_connections()
 
 if __name__ == "__main__":
+    # Single process; serve.py runs several workers that share the loaded models
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
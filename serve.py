@@ -0,0 +1,127 @@
+# Prefork production server. The parent runs the startup phases that load the
+# model, preprocessor and SHAP explainer and migrate and score the database,
+# then forks the workers. They share those pages copy-on-write and accept
+# connections on one listening socket; each has its own event loop and GIL,
+# so CPU-bound preprocessing, prediction and SHAP spread across cores.
+#
+#   python serve.py --workers 4 --port 8000
+#
+# A worker that dies is replaced. SIGTERM or SIGINT stops the workers
+# gracefully (each flushes its write-behind queue) and then the parent.
+import os
+import gc
+import time
+import signal
+import socket
+import logging
+import argparse
+import threading
+from typing import Dict
+import uvicorn
+from main import app
+from src.core.config import config
+from src.core.startup import pipeline, PRELOAD_PHASES
+from src.core.workers import clear_heartbeats, worker
+from src.db.database import close_all_connections
+
+logger = logging.getLogger("serve")
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def preload():
+    start = time.perf_counter()
+    pipeline.run(PRELOAD_PHASES)
+    close_all_connections()  # SQLite handles must not be shared across a fork
+    if threading.active_count() > 1:
+        # Threads don't survive fork(); whatever they were holding stays locked
+        names = ", ".join(t.name for t in threading.enumerate() if t is not threading.main_thread())
+        logger.warning(f"Threads running before fork: {names}")
+    # Move everything loaded so far out of the collector's reach, so its
+    # passes don't write to (and copy) the shared pages in every worker
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded {', '.join(PRELOAD_PHASES)} in {time.perf_counter() - start:.2f}s")
+
+class Master:
+    def __init__(self, sock: socket.socket, count: int, log_level: str):
+        self.sock = sock
+        self.count = count
+        self.log_level = log_level
+        self.children: Dict[int, int] = {}  # pid -> worker index
+        self.restarts = 0
+        self.stopping = False
+
+    def spawn(self, index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self.run_worker(index)
+            except BaseException:
+                logger.exception(f"Worker {index} crashed")
+                code = 1
+            os._exit(code)
+        self.children[pid] = index
+        logger.info(f"Started worker {index} (pid {pid})")
+
+    def run_worker(self, index: int):
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, signal.SIG_DFL)  # uvicorn installs its own
+        worker.reset(index, self.count)
+        server = uvicorn.Server(uvicorn.Config(app, log_level=self.log_level))
+        server.run(sockets=[self.sock])
+
+    def stop(self, signum, frame):
+        self.stopping = True
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.count):
+            self.spawn(index)
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            index = self.children.pop(pid, None)
+            if index is None or self.stopping:
+                continue
+            self.restarts += 1
+            logger.warning(f"Worker {index} (pid {pid}) exited with code {os.waitstatus_to_exitcode(status)}, restarting")
+            time.sleep(1)  # Don't spin if workers die on startup
+            if not self.stopping:
+                self.spawn(index)
+        logger.info("All workers stopped")
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API with several preforked workers")
+    parser.add_argument("--host", default=config.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVE_WORKERS,
+                        help="Number of worker processes (default: one per CPU core)")
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    count = args.workers or os.cpu_count() or 1
+    # Bind first so a taken port fails fast, before the models are loaded
+    sock = bind(args.host, args.port, args.backlog)
+    preload()
+    clear_heartbeats()
+    logger.info(f"Serving on {args.host}:{args.port} with {count} workers")
+    Master(sock, count, args.log_level).run()
+
+if __name__ == "__main__":
+    main()
@@ -15,17 +15,128 @@ def setup_logging():
         ]
     )
 
+def parse_chain_settings(spec: str, cast=int) -> dict:
+    # "router=8,sql=4" -> {"router": 8, "sql": 4}
+    values = {}
+    for part in spec.split(","):
+        name, _, value = part.strip().partition("=")
+        if name and value:
+            values[name] = cast(value)
+    return values
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 class Config:
-    DB_PATH: str = os.path.join(BASE_DIR, "bank_churn.db")
+    DB_PATH: str = os.getenv("DB_PATH", os.path.join(BASE_DIR, "bank_churn.db"))
+    DB_BUSY_TIMEOUT_MS: int = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+    DB_CACHED_STATEMENTS: int = 256
+    DB_MAX_WORKERS: int = int(os.getenv("DB_MAX_WORKERS", "4"))
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     MODEL_NAME = "gpt-4o-mini"
-    OPENROUTER_BASE = "https://models.inference.ai.azure.com"
+    OPENROUTER_BASE = os.getenv("OPENROUTER_BASE", "https://models.inference.ai.azure.com")
     
     # OPENROUTER_BASE = "https://openrouter.ai/api/v1"
     # MODEL_NAME = "openai/gpt-oss-120b"
+    # Write-behind queue for audit inserts (src/db/write_behind.py)
+    WRITE_BEHIND_ENABLED: bool = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() == "true"
+    WRITE_BEHIND_BATCH_SIZE: int = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "500"))
+    WRITE_BEHIND_FLUSH_INTERVAL: float = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.2"))
+    WRITE_BEHIND_MAX_QUEUE: int = int(os.getenv("WRITE_BEHIND_MAX_QUEUE", "10000"))
+
+    # Maintenance (src/db/maintenance.py): retention in days, 0 keeps rows forever
+    MAINTENANCE_ENABLED: bool = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+    MAINTENANCE_INTERVAL_HOURS: float = float(os.getenv("MAINTENANCE_INTERVAL_HOURS", "24"))
+    LOG_RETENTION_DAYS: int = int(os.getenv("LOG_RETENTION_DAYS", "90"))
+    PREDICTION_RETENTION_DAYS: int = int(os.getenv("PREDICTION_RETENTION_DAYS", "365"))
+    CHAT_RETENTION_DAYS: int = int(os.getenv("CHAT_RETENTION_DAYS", "0"))
+    QUERY_RESULT_RETENTION_DAYS: int = 7
+    QUERY_COST_RETENTION_DAYS: int = 30
+    LOG_RESPONSE_MAX_CHARS: int = 4000
+    MESSAGE_MAX_CHARS: int = 8000
+    MESSAGE_COMPACT_AFTER_DAYS: int = 30
+    MAINTENANCE_DELETE_BATCH: int = 5000
+    INCREMENTAL_VACUUM_PAGES: int = 20000
+
+    # Guardrails for LLM-generated SQL (src/services/sql_guard.py)
+    SQL_ALLOWED_TABLES = {"customers", "customer_scores"}
+    SQL_TIME_BUDGET_SECONDS: float = float(os.getenv("SQL_TIME_BUDGET_SECONDS", "5"))
+    SQL_EXPORT_TIME_BUDGET_SECONDS: float = 120
+    SQL_EXPORT_MAX_ROWS: int = 1000000
+    SQL_MAX_ROWS: int = 100000
+    SQL_PROGRESS_STEPS: int = 10000
+    SQL_SLOW_QUERY_MS: float = 1000
+
+    # Chat history sent to the router: the newest HISTORY_MAX_MESSAGES
+    # messages, trimmed to HISTORY_TOKEN_BUDGET tokens
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", "8"))
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+
+    # Materialized customer_scores (src/services/scoring.py): rows scored and upserted per chunk
+    SCORE_CHUNK_SIZE: int = int(os.getenv("SCORE_CHUNK_SIZE", "50000"))
+
+    # Streaming fallback of the probability filter tool
+    SCORE_STREAM_CHUNK_SIZE: int = int(os.getenv("SCORE_STREAM_CHUNK_SIZE", "10000"))
+    SCORE_STREAM_MAX_ROWS: int = 50000000
+    SCORE_STREAM_TIME_BUDGET_SECONDS: float = 600
+    PROBABILITY_FILTER_TOP_K: int = 20
+
+    # SQL tool result handles (src/services/result_store.py)
+    RESULT_PAGE_SIZE: int = 20
+    RESULT_MAX_PAGE_SIZE: int = 500
+    RESULT_EXPORT_CHUNK_SIZE: int = 1000
+
+    # LLM response cache (only safe because every chain runs at temperature 0)
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", os.path.join(BASE_DIR, "llm_cache.db"))
+    LLM_CACHE_MEMORY_ENTRIES: int = 1024
+    LLM_CACHE_MAX_ENTRIES: int = 100000
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+
+    # LLM call scheduler (src/services/llm_scheduler.py): in-flight limits,
+    # overall and per chain ("router=8,sql=4"), and coalescing of identical calls
+    LLM_SCHEDULER_ENABLED: bool = os.getenv("LLM_SCHEDULER_ENABLED", "true").lower() == "true"
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+    LLM_CHAIN_LIMITS: str = os.getenv("LLM_CHAIN_LIMITS", "router=8,sql=6,extraction=8,explain=8,recommend=6")
+    LLM_SINGLE_FLIGHT_ENABLED: bool = os.getenv("LLM_SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+    # Deadlines, timeouts, retries and hedging of LLM calls (src/services/llm_resilience.py).
+    # A chat turn gets CHAT_DEADLINE_SECONDS, below the frontend's 60 s request timeout
+    CHAT_DEADLINE_SECONDS: float = float(os.getenv("CHAT_DEADLINE_SECONDS", "45"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+    LLM_CHAIN_TIMEOUTS: str = os.getenv("LLM_CHAIN_TIMEOUTS", "router=8,sql=12,extraction=10,explain=15,recommend=15")
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BASE_SECONDS: float = 0.5
+    LLM_RETRY_MAX_SECONDS: float = 4
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = 0.2
+    LLM_LATENCY_WINDOW: int = 200
+
+    # Local keyword router; queries at or below the confidence margin go to router_chain
+    FAST_ROUTER_ENABLED: bool = os.getenv("FAST_ROUTER_ENABLED", "true").lower() == "true"
+    INTENT_MIN_SCORE: int = 3
+    INTENT_CONFIDENCE_THRESHOLD: float = 0.5
+
+    # Largest /api/predict/batch request; the whole matrix and its SHAP values are held in memory
+    BATCH_PREDICT_MAX_ROWS: int = int(os.getenv("BATCH_PREDICT_MAX_ROWS", "5000"))
     MODEL_PATH = os.path.join(BASE_DIR, "assets", "Tuned-RF-with-SMOTE.pkl")
     PREPROCESSOR_PATH = os.path.join(BASE_DIR, "assets", "preprocessor.pkl")
+    # SHAP attribution cache and bulk precompute (customer_shap table)
+    SHAP_CACHE_ENTRIES: int = 4096
+    SHAP_CHUNK_SIZE: int = 2000
+    SHAP_PRECOMPUTE_ON_STARTUP: bool = os.getenv("SHAP_PRECOMPUTE_ON_STARTUP", "false").lower() == "true"
+    # Optional array-backed inference engine (src/services/fast_forest.py)
+    FAST_INFERENCE_ENABLED: bool = os.getenv("FAST_INFERENCE_ENABLED", "false").lower() == "true"
+    FAST_FOREST_PATH = os.path.join(BASE_DIR, "assets", "fast_forest.npz")
+    # joblib mmap mode for model artifacts ("r", empty to disable); maps plain numpy
+    # arrays only, not the forest's tree nodes (see model_registry._load_joblib)
+    MODEL_MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "r") or None
+
+    # Prefork serving (serve.py): workers share the models loaded by the parent
+    SERVE_HOST: str = os.getenv("SERVE_HOST", "0.0.0.0")
+    SERVE_PORT: int = int(os.getenv("SERVE_PORT", "8000"))
+    SERVE_WORKERS: int = int(os.getenv("SERVE_WORKERS", "0"))  # 0: one per CPU core
+    WORKER_HEARTBEAT_SECONDS: float = float(os.getenv("WORKER_HEARTBEAT_SECONDS", "5"))
+    WORKER_STATE_DIR: str = os.getenv("WORKER_STATE_DIR", os.path.join(BASE_DIR, "run"))
 
 config = Config()
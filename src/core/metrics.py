@@ -0,0 +1,215 @@
+import sys
+import time
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Minimal in-process metrics rendered in the Prometheus text format at
+# /api/metrics. Stage timings are labelled with the tool of the current chat
+# turn, which route_query stores in current_tool once the router has decided.
+# Every series also gets a constant worker label: under serve.py each worker
+# keeps its own counters, and a scrape reports all of them (see
+# src/core/workers.py) instead of whichever worker happened to answer.
+
+current_tool: ContextVar[str] = ContextVar("current_tool", default="none")
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(labels: Dict[str, Any]) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels.items()]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+# (name, type, help, [(sample name, labels, value)])
+Family = Tuple[str, str, str, List[Tuple[str, Dict[str, Any], float]]]
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def family(self, const_labels: Dict[str, Any]) -> Family:
+        with self._lock:
+            samples = [(self.name, {**dict(zip(self.labelnames, key)), **const_labels}, value)
+                       for key, value in sorted(self._values.items())]
+        return self.name, "counter", self.help, samples
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help_text, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}  # key -> bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def family(self, const_labels: Dict[str, Any]) -> Family:
+        samples = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                labels = {**dict(zip(self.labelnames, key)), **const_labels}
+                for bound, count in zip(self.buckets, series):
+                    samples.append((f"{self.name}_bucket", {**labels, "le": str(bound)}, count))
+                samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]))
+                samples.append((f"{self.name}_sum", labels, series[-2]))
+                samples.append((f"{self.name}_count", labels, series[-1]))
+        return self.name, "histogram", self.help, samples
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+        # Callables returning (name, type, help, [(labels dict, value)]) at
+        # scrape time, for counters that other modules already keep
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]] = []
+
+    def counter(self, *args, **kwargs) -> Counter:
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collector(self, func: Callable):
+        self.collectors.append(func)
+        return func
+
+    def families(self, const_labels: Optional[Dict[str, Any]] = None) -> List[Family]:
+        const_labels = const_labels or {}
+        families = [metric.family(const_labels) for metric in self.metrics]
+        for collect in self.collectors:
+            try:
+                collected = list(collect())
+            except Exception:
+                continue  # A failing collector must not break the scrape
+            for name, kind, help_text, samples in collected:
+                families.append((name, kind, help_text, [(name, {**labels, **const_labels}, value)
+                                                        for labels, value in samples]))
+        return families
+
+    def render(self, const_labels: Optional[Dict[str, Any]] = None) -> str:
+        return render_families(self.families(const_labels))
+
+def render_families(families: Iterable[Family]) -> str:
+    # Families of the same name (one per worker) are merged, since the text
+    # format allows each metric's HELP/TYPE and samples only once
+    merged: Dict[str, Family] = {}
+    for name, kind, help_text, samples in families:
+        if name in merged:
+            merged[name][3].extend(samples)
+        else:
+            merged[name] = (name, kind, help_text, list(samples))
+    lines = []
+    for name, kind, help_text, samples in merged.values():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    "churnbot_stage_seconds", "Time spent in each stage of a chat turn.", ["stage", "tool"]
+)
+turn_seconds = registry.histogram(
+    "churnbot_turn_seconds", "End-to-end chat turn latency.", ["tool"]
+)
+llm_tokens = registry.counter(
+    "churnbot_llm_tokens_total", "LLM tokens used by uncached calls.", ["chain", "kind"]
+)
+llm_wait_seconds = registry.histogram(
+    "churnbot_llm_wait_seconds", "Time LLM calls waited for a scheduler slot.", ["chain", "priority"]
+)
+llm_events = registry.counter(
+    "churnbot_llm_events_total", "LLM call timeouts, retries, hedged requests and degraded answers.", ["chain", "event"]
+)
+
+def observe_stage(name: str, seconds: float, tool: Optional[str] = None):
+    stage_seconds.observe(seconds, stage=name, tool=tool or current_tool.get())
+
+@contextmanager
+def stage(name: str, tool: Optional[str] = None):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - started, tool)
+
+def timed(name: str):
+    # Decorator form of stage() for sync and async functions
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@registry.collector
+def _cache_metrics():
+    # Counters the caches, router and writer already keep; only modules the
+    # process has loaded are reported, so a scrape never imports the model stack
+    llm_cache_module = sys.modules.get("src.services.llm_cache")
+    if llm_cache_module is not None and llm_cache_module.llm_cache is not None:
+        stats = llm_cache_module.llm_cache.stats()
+        yield ("churnbot_llm_cache_events_total", "counter", "LLM response cache lookups by outcome.",
+               [({"event": key}, value) for key, value in stats.items() if key in ("memory_hits", "disk_hits", "misses", "expired", "evicted")])
+    shap_module = sys.modules.get("src.services.shap_store")
+    if shap_module is not None:
+        stats = shap_module.shap_cache.stats()
+        yield ("churnbot_shap_cache_events_total", "counter", "SHAP attribution cache lookups by outcome.",
+               [({"event": "hits"}, stats["hits"]), ({"event": "misses"}, stats["misses"])])
+    router_module = sys.modules.get("src.services.intent_router")
+    if router_module is not None:
+        yield ("churnbot_routes_total", "counter", "Routing decisions by router and tool.",
+               [({"route": key}, value) for key, value in sorted(router_module.route_counts.items())])
+    writer_module = sys.modules.get("src.db.write_behind")
+    if writer_module is not None:
+        stats = writer_module.writer.stats()
+        yield ("churnbot_write_queue_depth", "gauge", "Rows waiting in the write-behind queue.",
+               [({}, stats["queued"])])
+        yield ("churnbot_write_rows_total", "counter", "Rows handled by the write-behind writer.",
+               [({"outcome": "written"}, stats["written"]), ({"outcome": "failed"}, stats["failed"])])
+    scheduler_module = sys.modules.get("src.services.llm_scheduler")
+    if scheduler_module is not None:
+        stats = scheduler_module.scheduler.stats()
+        yield ("churnbot_llm_in_flight", "gauge", "LLM calls holding a scheduler slot.",
+               [({"chain": chain}, values["in_flight"]) for chain, values in stats["chains"].items()])
+        yield ("churnbot_llm_queue_depth", "gauge", "LLM calls waiting for a scheduler slot.",
+               [({"priority": priority}, count) for priority, count in stats["waiting"].items()])
+        yield ("churnbot_llm_coalesced_total", "counter", "LLM calls served by an identical call already in flight.",
+               [({}, stats["coalesced"])])
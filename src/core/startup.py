@@ -0,0 +1,103 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Heavy modules are imported inside the phases so importing the app stays cheap
+
+def _schema():
+    from src.db.database import init_schema
+    init_schema()
+
+def _data():
+    from src.db.database import ingest_customers
+    ingest_customers()
+
+def _models():
+    from src.services.model_registry import warm_up
+    warm_up()
+
+def _scores():
+    from src.services.scoring import rebuild_customer_scores
+    rebuild_customer_scores()
+
+def _shap():
+    from src.core.config import config
+    if config.SHAP_PRECOMPUTE_ON_STARTUP:
+        from src.services.shap_store import precompute_customer_shap
+        precompute_customer_shap()
+
+def _llm():
+    # Importing the router builds the shared LLM client and every chain
+    from src.services.router_agent import detect_language
+    detect_language("warm up")  # langdetect loads its profiles on first use
+    from src.services.history import get_encoding
+    get_encoding()  # tiktoken loads (and may download) its encoding on first use
+
+class StartupPipeline:
+    # Ordered, idempotent startup phases. Each phase runs at most once per
+    # process; its duration is recorded for the timing report.
+    def __init__(self, phases: List[Tuple[str, Callable[[], Any]]]):
+        self.phases = phases
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def run(self, names: Optional[List[str]] = None):
+        with self._lock:
+            for name, func in self.phases:
+                if (names is not None and name not in names) or name in self.timings:
+                    continue
+                start = time.perf_counter()
+                try:
+                    func()
+                except Exception as e:
+                    self.errors[name] = str(e)
+                    logger.error(f"Startup phase '{name}' failed: {str(e)}")
+                    raise
+                self.timings[name] = time.perf_counter() - start
+                self.errors.pop(name, None)
+                logger.info(f"Startup phase '{name}' done in {self.timings[name]:.2f}s")
+        if self.ready:
+            self.log_report()
+
+    @property
+    def ready(self) -> bool:
+        return all(name in self.timings for name, _ in self.phases)
+
+    def log_report(self):
+        lines = [f"  {name:<8} {self.timings[name]:7.2f}s" for name, _ in self.phases if name in self.timings]
+        logger.info("Startup timing report:\n" + "\n".join(lines) + f"\n  {'total':<8} {sum(self.timings.values()):7.2f}s")
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "phases": {
+                name: {
+                    "done": name in self.timings,
+                    "seconds": self.timings.get(name),
+                    "error": self.errors.get(name),
+                }
+                for name, _ in self.phases
+            },
+        }
+
+pipeline = StartupPipeline([
+    ("schema", _schema),
+    ("data", _data),
+    ("models", _models),
+    ("scores", _scores),
+    ("shap", _shap),
+    ("llm", _llm),
+])
+
+# Phases that must finish before the server accepts traffic; the rest run in
+# the background and gate /api/ready
+BLOCKING_PHASES = ["schema", "data"]
+
+# Phases the prefork server (serve.py) runs once in the parent, so workers
+# inherit loaded models and a migrated, scored database. The LLM client is
+# built in each worker: its connection pool must not cross a fork.
+PRELOAD_PHASES = ["schema", "data", "models", "scores", "shap"]
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, List
+from src.core.config import config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, only single-process serving
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Identity and health of this serving process. serve.py forks the workers and
+# calls worker.reset() in each; under plain uvicorn the process is worker 0 of 1.
+# Workers publish their status and metrics to WORKER_STATE_DIR so any of them
+# can report on all of them.
+
+class WorkerInfo:
+    def __init__(self):
+        self.reset(0, 1)
+
+    def reset(self, index: int, count: int):
+        self.index = index
+        self.count = count
+        self.pid = os.getpid()
+        self.started = time.time()
+        self.requests = 0
+        self.in_flight = 0
+
+worker = WorkerInfo()
+
+class WorkerStatsMiddleware:
+    # Plain ASGI middleware (no extra task per request) counting HTTP requests
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        worker.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            worker.in_flight -= 1
+            worker.requests += 1
+
+@contextmanager
+def file_lock(path: str):
+    # Exclusive lock across processes, e.g. so only one worker migrates the DB
+    if fcntl is None:
+        yield
+        return
+    with open(path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+_held_locks = []
+
+def try_lock(path: str) -> bool:
+    # Non-blocking; a lock that is won stays held until the process exits, so
+    # a replacement worker can take it over from one that died
+    if fcntl is None:
+        return True
+    f = open(path, "a")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _held_locks.append(f)
+    return True
+
+def _memory() -> Dict[str, int]:
+    # Pages still shared with the parent and the other workers (the preloaded
+    # models) show up as Shared_*, pages this worker wrote to as Private_*
+    memory = {"resident_bytes": 0, "shared_bytes": 0, "private_bytes": 0}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name == "Rss":
+                    key = "resident_bytes"
+                elif name.startswith("Shared_"):
+                    key = "shared_bytes"
+                elif name.startswith("Private_"):
+                    key = "private_bytes"
+                else:
+                    continue
+                memory[key] += int(value.split()[0]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass  # Not Linux: memory is not reported
+    return memory
+
+def status() -> Dict[str, Any]:
+    from src.core.startup import pipeline
+    now = time.time()
+    return {
+        "index": worker.index,
+        "pid": worker.pid,
+        "ready": pipeline.ready,
+        "uptime_s": now - worker.started,
+        "requests": worker.requests,
+        "in_flight": worker.in_flight,
+        **_memory(),
+        "updated": now,
+    }
+
+def _state_path(index: int) -> str:
+    return os.path.join(config.WORKER_STATE_DIR, f"worker-{index}.json")
+
+def _metrics_path(index: int) -> str:
+    return os.path.join(config.WORKER_STATE_DIR, f"worker-{index}.metrics.json")
+
+def _write_json(path: str, data: Any):
+    tmp = f"{path}.{worker.pid}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)  # Readers never see a half-written file
+
+def local_metrics() -> List[Any]:
+    # This worker's metric families, labelled with its index
+    from src.core.metrics import registry
+    return registry.families({"worker": worker.index})
+
+def write_heartbeat():
+    os.makedirs(config.WORKER_STATE_DIR, exist_ok=True)
+    _write_json(_state_path(worker.index), status())
+    _write_json(_metrics_path(worker.index), {"updated": time.time(), "families": local_metrics()})
+
+def clear_heartbeats():
+    # Called by the parent before forking, so workers of an earlier run don't
+    # show up as dead
+    if not os.path.isdir(config.WORKER_STATE_DIR):
+        return
+    for name in os.listdir(config.WORKER_STATE_DIR):
+        if name.startswith("worker-"):
+            os.remove(os.path.join(config.WORKER_STATE_DIR, name))
+
+async def heartbeat_loop():
+    while True:
+        try:
+            write_heartbeat()
+        except OSError as e:
+            logger.warning(f"Worker heartbeat failed: {str(e)}")
+        await asyncio.sleep(config.WORKER_HEARTBEAT_SECONDS)
+
+def worker_statuses() -> List[Dict[str, Any]]:
+    # This worker's live status plus the others' last heartbeats; a worker
+    # that missed three heartbeats counts as down
+    statuses = []
+    for index in range(worker.count):
+        if index == worker.index:
+            entry = status()
+        else:
+            try:
+                with open(_state_path(index)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = {"index": index, "updated": None}
+        age = None if entry["updated"] is None else time.time() - entry["updated"]
+        entry["heartbeat_age_s"] = age
+        entry["alive"] = age is not None and age <= 3 * config.WORKER_HEARTBEAT_SECONDS
+        statuses.append(entry)
+    return statuses
+
+def all_worker_metrics() -> List[Any]:
+    # This worker's live metrics plus the others' as of their last heartbeat.
+    # Each series carries its worker label, so Prometheus sees every worker's
+    # counters on every scrape rather than one worker's, then another's.
+    families = local_metrics()
+    for index in range(worker.count):
+        if index == worker.index:
+            continue
+        try:
+            with open(_metrics_path(index)) as f:
+                published = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if time.time() - published["updated"] <= 3 * config.WORKER_HEARTBEAT_SECONDS:
+            families.extend(published["families"])  # Down workers' series go stale
+    return families
@@ -1,8 +1,10 @@
 import sqlite3
-from typing import List, Optional
+from typing import List, Optional, Tuple
 from datetime import datetime
 from src.core.config import config
+from src.core.metrics import timed
 from src.db.database import get_db_connection
+from src.db.write_behind import writer
 
 def create_chat(title: str) -> int:
     conn = get_db_connection()
@@ -38,12 +40,23 @@ def delete_chat(chat_id: int) -> bool:
     conn.close()
     return rows_affected > 0
 
-def create_message(chat_id: int, content: str, role: str) -> int:
+def delete_all_chats() -> None:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM messages")
+    cursor.execute("DELETE FROM chats")
+    conn.commit()
+    # Hand the freed pages back to the filesystem (no-op unless auto_vacuum
+    # is INCREMENTAL, see src.db.maintenance)
+    cursor.execute("PRAGMA incremental_vacuum").fetchall()  # Runs one page per step
+    conn.close()
+
+def create_message(chat_id: int, content: str, role: str, token_count: Optional[int] = None) -> int:
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute(
-        "INSERT INTO messages (chat_id, content, role) VALUES (?, ?, ?)",
-        (chat_id, content, role)
+        "INSERT INTO messages (chat_id, content, role, token_count) VALUES (?, ?, ?, ?)",
+        (chat_id, content, role, token_count)
     )
     conn.commit()
     message_id = cursor.lastrowid
@@ -61,6 +74,31 @@ def get_messages(chat_id: int) -> List[sqlite3.Row]:
     conn.close()
     return messages
 
+def get_recent_messages(chat_id: int, limit: int) -> List[sqlite3.Row]:
+    # Tail of a chat in chronological order, read backwards off the
+    # (chat_id, created_at) index
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        SELECT * FROM (
+            SELECT id, chat_id, content, role, token_count, created_at FROM messages
+            WHERE chat_id = ? ORDER BY created_at DESC, id DESC LIMIT ?
+        ) ORDER BY created_at ASC, id ASC
+        """,
+        (chat_id, limit)
+    )
+    messages = cursor.fetchall()
+    conn.close()
+    return messages
+
+def set_message_token_counts(counts: List[Tuple[int, int]]) -> None:
+    # counts: (token_count, message_id) pairs
+    conn = get_db_connection()
+    conn.executemany("UPDATE messages SET token_count = ? WHERE id = ?", counts)
+    conn.commit()
+    conn.close()
+
 def update_chat_title(chat_id: int, title: str) -> bool:
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -71,4 +109,33 @@ def update_chat_title(chat_id: int, title: str) -> bool:
     conn.commit()
     rows_affected = cursor.rowcount
     conn.close()
-    return rows_affected > 0
\ No newline at end of file
+    return rows_affected > 0
+
+def get_customer(customer_id: str) -> Optional[dict]:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM customers WHERE CustomerId = ?", (customer_id,))
+    customer = cursor.fetchone()
+    conn.close()
+    return dict(customer) if customer else None
+
+LOG_INSERT = "INSERT INTO logs (query, response, tool, latency_ms) VALUES (?, ?, ?, ?)"
+
+def truncate_response(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n... [truncated {len(text) - max_chars} chars]"
+
+def create_log(query: str, response: str, tool: Optional[str] = None, latency_ms: Optional[float] = None) -> int:
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute(LOG_INSERT, (query, truncate_response(response, config.LOG_RESPONSE_MAX_CHARS), tool, latency_ms))
+    conn.commit()
+    log_id = cursor.lastrowid
+    conn.close()
+    return log_id
+
+@timed("persistence")
+async def queue_log(query: str, response: str, tool: Optional[str] = None, latency_ms: Optional[float] = None) -> None:
+    # Request-path variant of create_log: committed by the write-behind writer
+    await writer.asubmit(LOG_INSERT, (query, truncate_response(response, config.LOG_RESPONSE_MAX_CHARS), tool, latency_ms))
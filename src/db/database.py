@@ -1,76 +1,137 @@
 import os
 import sqlite3
-import pandas as pd
+import asyncio
+import contextvars
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from src.core.config import config
+from src.core.workers import file_lock
+from src.db.migrations import migrate
 
-def get_db_connection():
-    conn = sqlite3.connect(config.DB_PATH)
+class ManagedConnection(sqlite3.Connection):
+    # Long-lived per-thread connection. close() only releases the caller's
+    # reference; the underlying handle stays open for the next caller on the
+    # same thread and is rolled back if the last user left a transaction open.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refs = 0
+        self.disposed = False
+
+    def close(self):
+        self.refs = max(self.refs - 1, 0)
+        if self.refs == 0 and self.in_transaction:
+            self.rollback()
+
+    def dispose(self):
+        self.disposed = True
+        super().close()
+
+_local = threading.local()
+_connections = weakref.WeakSet()
+_connections_lock = threading.Lock()
+
+def _open_connection() -> ManagedConnection:
+    conn = sqlite3.connect(
+        config.DB_PATH,
+        timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=config.DB_CACHED_STATEMENTS,
+        factory=ManagedConnection,
+        # Each connection is only used by its owning thread; this just lets
+        # close_all_connections() dispose of it from the shutdown thread
+        check_same_thread=False
+    )
     conn.row_factory = sqlite3.Row  # This allows access to columns by name
+    # Only takes effect on a new, empty database; src.db.maintenance converts
+    # existing ones with a one-time VACUUM
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA foreign_keys=ON")  # Enforce ON DELETE CASCADE on messages
+    with _connections_lock:
+        _connections.add(conn)
     return conn
 
-def init_db():
+def open_readonly_connection() -> sqlite3.Connection:
+    # Standalone read-only connection for long-running reads such as exports;
+    # the caller owns it and must close it
+    conn = sqlite3.connect(
+        f"file:{config.DB_PATH}?mode=ro",
+        uri=True,
+        timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=False
+    )
+    conn.execute(f"PRAGMA busy_timeout={config.DB_BUSY_TIMEOUT_MS}")
+    return conn
+
+def get_db_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is None or conn.disposed:
+        conn = _local.conn = _open_connection()
+    conn.refs += 1
+    return conn
+
+# Dedicated, bounded pool for blocking database work issued from async code.
+# Each worker thread keeps its own long-lived connection.
+_db_executor = ThreadPoolExecutor(max_workers=config.DB_MAX_WORKERS, thread_name_prefix="db")
+
+async def run_db(func, *args, **kwargs):
+    # Like asyncio.to_thread, runs in a copy of the caller's context so
+    # context variables (e.g. the current tool for metrics) carry over
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_db_executor, functools.partial(context.run, func, *args, **kwargs))
+
+def shutdown_db_executor():
+    _db_executor.shutdown(wait=True)
+
+def close_all_connections():
+    # Close every thread's connection, e.g. on shutdown
+    with _connections_lock:
+        connections = list(_connections)
+        _connections.clear()
+    for conn in connections:
+        conn.dispose()
+
+def _init_lock():
+    # Every worker runs startup; only one may migrate or ingest at a time
+    return file_lock(config.DB_PATH + ".init.lock")
+
+def init_schema():
     conn = get_db_connection()
-    
-    # Load initial data if not present
     try:
-        pd.read_sql("SELECT * FROM customers LIMIT 1", conn)
-    except:
-        # Get absolute path to project root
-        PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-        
-        # Build path to dataset.csv
-        DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'dataset.csv')
-        
-        # Load dataset
-        df = pd.read_csv(DATA_PATH)
-        df.to_sql('customers', conn, if_exists='replace', index=False)
-    
-    # Create predictions table if not exists
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS predictions (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        customer_id TEXT,
-        features TEXT,  -- JSON
-        prediction INTEGER,
-        probability REAL,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Create logs table
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS logs (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        query TEXT,
-        response TEXT,
-        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Create chats table
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS chats (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    """)
-    
-    # Create messages table
-    conn.execute("""
-    CREATE TABLE IF NOT EXISTS messages (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        chat_id INTEGER NOT NULL,
-        content TEXT NOT NULL,
-        role TEXT NOT NULL,  -- 'user' or 'assistant'
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
-    )
-    """)
-    
-    conn.commit()
-    conn.close()
+        with _init_lock():
+            migrate(conn)
+    finally:
+        conn.close()
 
-# Call init_db on startup
-init_db()
\ No newline at end of file
+def ingest_customers() -> bool:
+    # Load initial data if not present; returns True when rows were loaded
+    conn = get_db_connection()
+    try:
+        with _init_lock():
+            if conn.execute("SELECT 1 FROM customers LIMIT 1").fetchone() is not None:
+                return False
+
+            import pandas as pd  # Only needed for the one-time CSV ingest
+
+            # Get absolute path to project root
+            PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+            # Build path to dataset.csv
+            DATA_PATH = os.path.join(PROJECT_ROOT, 'data', 'dataset.csv')
+
+            # Load dataset into the migrated table so its primary key is kept
+            df = pd.read_csv(DATA_PATH)
+            df.to_sql('customers', conn, if_exists='append', index=False)
+            conn.commit()
+            return True
+    finally:
+        conn.close()
+
+def init_db():
+    init_schema()
+    ingest_customers()
@@ -0,0 +1,184 @@
+import sqlite3
+import logging
+import argparse
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from src.core.config import config
+from src.db.database import get_db_connection
+from src.db.crud import truncate_response
+
+logger = logging.getLogger(__name__)
+
+# Periodic upkeep so bank_churn.db stops growing without bound: roll logs up
+# per day, expire rows past their retention window, trim oversized stored
+# responses, remove orphans and hand free pages back to the filesystem.
+# Deletes run in small committed batches to keep write locks short.
+
+# (table, timestamp column, retention setting, stored as CURRENT_TIMESTAMP?)
+# CURRENT_TIMESTAMP columns hold UTC "YYYY-MM-DD HH:MM:SS"; the others hold
+# local datetime.now().isoformat() strings.
+RETENTION = [
+    ("logs", "timestamp", "LOG_RETENTION_DAYS", True),
+    ("predictions", "timestamp", "PREDICTION_RETENTION_DAYS", False),
+    ("query_results", "created_at", "QUERY_RESULT_RETENTION_DAYS", False),
+    ("query_costs", "timestamp", "QUERY_COST_RETENTION_DAYS", False),
+]
+
+def _cutoff(days: int, utc: bool) -> str:
+    if utc:
+        return (datetime.utcnow() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+    return (datetime.now() - timedelta(days=days)).isoformat()
+
+def _delete_in_batches(conn: sqlite3.Connection, table: str, where: str, params: tuple = ()) -> int:
+    deleted = 0
+    while True:
+        cursor = conn.execute(
+            f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+            (*params, config.MAINTENANCE_DELETE_BATCH)
+        )
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < config.MAINTENANCE_DELETE_BATCH:
+            return deleted
+
+def rollup_logs(conn: sqlite3.Connection) -> int:
+    # Aggregates every complete (UTC) day not rolled up yet; runs before
+    # retention so expired logs are already counted
+    last_day = conn.execute("SELECT MAX(day) FROM log_daily_stats").fetchone()[0]
+    cursor = conn.execute(
+        """
+        INSERT OR REPLACE INTO log_daily_stats (day, tool, queries, avg_latency_ms, p95_latency_ms, max_latency_ms)
+        WITH ranked AS (
+            SELECT date(timestamp) AS day, COALESCE(tool, 'unknown') AS tool, latency_ms,
+                   ROW_NUMBER() OVER (PARTITION BY date(timestamp), COALESCE(tool, 'unknown') ORDER BY latency_ms) AS rn,
+                   COUNT(*) OVER (PARTITION BY date(timestamp), COALESCE(tool, 'unknown')) AS n
+            FROM logs
+            WHERE timestamp >= COALESCE(date(?, '+1 day'), '') AND timestamp < date('now')
+        )
+        SELECT day, tool, MAX(n), AVG(latency_ms),
+               MAX(CASE WHEN rn = CAST(0.95 * n + 0.999999 AS INTEGER) THEN latency_ms END),
+               MAX(latency_ms)
+        FROM ranked
+        GROUP BY day, tool
+        """,
+        (last_day,)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+def apply_retention(conn: sqlite3.Connection) -> Dict[str, int]:
+    deleted = {}
+    for table, column, setting, utc in RETENTION:
+        days = getattr(config, setting)
+        if days > 0:
+            deleted[table] = _delete_in_batches(conn, table, f"{column} < ?", (_cutoff(days, utc),))
+    if config.CHAT_RETENTION_DAYS > 0:
+        # Chats idle for longer than the window; messages follow via ON DELETE CASCADE
+        deleted["chats"] = _delete_in_batches(
+            conn, "chats",
+            "created_at < ? AND NOT EXISTS (SELECT 1 FROM messages WHERE messages.chat_id = chats.id AND messages.created_at >= ?)",
+            (_cutoff(config.CHAT_RETENTION_DAYS, True),) * 2
+        )
+    return deleted
+
+def truncate_large_responses(conn: sqlite3.Connection) -> Dict[str, int]:
+    # Logs are truncated when written; this catches rows written before that.
+    # Old assistant messages are trimmed too and recounted on next load.
+    truncated = {}
+    rows = conn.execute(
+        "SELECT id, response FROM logs WHERE length(response) > ?",
+        (config.LOG_RESPONSE_MAX_CHARS + 64,)
+    ).fetchall()
+    conn.executemany(
+        "UPDATE logs SET response = ? WHERE id = ?",
+        [(truncate_response(row["response"], config.LOG_RESPONSE_MAX_CHARS), row["id"]) for row in rows]
+    )
+    truncated["logs"] = len(rows)
+    rows = conn.execute(
+        "SELECT id, content FROM messages WHERE role = 'assistant' AND created_at < ? AND length(content) > ?",
+        (_cutoff(config.MESSAGE_COMPACT_AFTER_DAYS, True), config.MESSAGE_MAX_CHARS + 64)
+    ).fetchall()
+    conn.executemany(
+        "UPDATE messages SET content = ?, token_count = NULL WHERE id = ?",
+        [(truncate_response(row["content"], config.MESSAGE_MAX_CHARS), row["id"]) for row in rows]
+    )
+    truncated["messages"] = len(rows)
+    conn.commit()
+    return truncated
+
+def remove_orphans(conn: sqlite3.Connection) -> Dict[str, int]:
+    # Messages left behind while foreign keys were not enforced, and cached
+    # scores/attributions of customers that no longer exist
+    return {
+        "messages": _delete_in_batches(conn, "messages", "chat_id NOT IN (SELECT id FROM chats)"),
+        "customer_scores": _delete_in_batches(conn, "customer_scores", "CustomerId NOT IN (SELECT CustomerId FROM customers)"),
+        "customer_shap": _delete_in_batches(conn, "customer_shap", "CustomerId NOT IN (SELECT CustomerId FROM customers)"),
+    }
+
+def reclaim_space(conn: sqlite3.Connection, full: bool = False) -> Dict[str, Any]:
+    # Databases created before auto_vacuum=INCREMENTAL need one full VACUUM to
+    # switch modes; after that, each run frees up to INCREMENTAL_VACUUM_PAGES.
+    # The full VACUUM rewrites the file under an exclusive lock, so only the
+    # --full-vacuum CLI runs it; the background loop skips reclaiming until then.
+    mode = conn.execute("PRAGMA auto_vacuum").fetchone()[0]
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if full:
+        logger.info("Running full VACUUM to enable incremental vacuuming")
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        vacuum = "full"
+    elif mode != 2:
+        logger.warning("Database is not in incremental auto_vacuum mode; free pages are not reclaimed until "
+                       "'python -m src.db.maintenance --full-vacuum' is run while the app is stopped")
+        vacuum = "skipped"
+    else:
+        conn.execute(f"PRAGMA incremental_vacuum({config.INCREMENTAL_VACUUM_PAGES})").fetchall()
+        vacuum = "incremental"
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    return {
+        "vacuum": vacuum,
+        "free_pages_before": free_before,
+        "free_pages_after": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        "page_count": conn.execute("PRAGMA page_count").fetchone()[0],
+    }
+
+def run_maintenance(full_vacuum: bool = False) -> Dict[str, Any]:
+    started = time.perf_counter()
+    conn = get_db_connection()
+    try:
+        report = {
+            "rolled_up": rollup_logs(conn),
+            "deleted": apply_retention(conn),
+            "truncated": truncate_large_responses(conn),
+            "orphans": remove_orphans(conn),
+            "space": reclaim_space(conn, full_vacuum),
+        }
+    finally:
+        conn.close()
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"Maintenance finished: {report}")
+    return report
+
+def daily_stats(days: int = 30) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT * FROM log_daily_stats WHERE day >= date('now', ?) ORDER BY day DESC, tool",
+            (f"-{days} days",)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]
+
+if __name__ == "__main__":
+    from src.core.config import setup_logging
+    from src.db.database import init_schema
+
+    parser = argparse.ArgumentParser(description="Roll up logs, apply retention and compact bank_churn.db")
+    parser.add_argument("--full-vacuum", action="store_true", help="Run a full VACUUM instead of an incremental one")
+    args = parser.parse_args()
+
+    setup_logging()
+    init_schema()
+    print(run_maintenance(full_vacuum=args.full_vacuum))
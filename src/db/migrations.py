@@ -0,0 +1,230 @@
+import sqlite3
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_COLUMNS = [
+    ("RowNumber", "INTEGER"),
+    ("CustomerId", "INTEGER PRIMARY KEY"),
+    ("Surname", "TEXT"),
+    ("CreditScore", "INTEGER"),
+    ("Geography", "TEXT"),
+    ("Gender", "TEXT"),
+    ("Age", "INTEGER"),
+    ("Tenure", "INTEGER"),
+    ("Balance", "REAL"),
+    ("NumOfProducts", "INTEGER"),
+    ("HasCrCard", "INTEGER"),
+    ("IsActiveMember", "INTEGER"),
+    ("EstimatedSalary", "REAL"),
+    ("Exited", "INTEGER"),
+]
+
+def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    ).fetchone() is not None
+
+def _create_base_tables(conn: sqlite3.Connection):
+    # Create predictions table if not exists
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS predictions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id TEXT,
+        features TEXT,  -- JSON
+        prediction INTEGER,
+        probability REAL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Materialized churn probabilities, refreshed by src.services.scoring
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS customer_scores (
+        CustomerId INTEGER PRIMARY KEY,
+        probability REAL NOT NULL,
+        model_version TEXT NOT NULL,
+        feature_hash TEXT NOT NULL,
+        scored_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_customer_scores_probability ON customer_scores (probability)")
+    
+    # Create logs table
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT,
+        response TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Create chats table
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS chats (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    
+    # Create messages table
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        content TEXT NOT NULL,
+        role TEXT NOT NULL,  -- 'user' or 'assistant'
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES chats (id) ON DELETE CASCADE
+    )
+    """)
+
+def _customers_primary_key(conn: sqlite3.Connection):
+    # customers used to be created by df.to_sql(if_exists='replace') without a
+    # key; rebuild it with CustomerId as the rowid so lookups are a B-tree seek
+    columns_sql = ", ".join(f'"{name}" {decl}' for name, decl in CUSTOMER_COLUMNS)
+    if not _table_exists(conn, "customers"):
+        conn.execute(f"CREATE TABLE customers ({columns_sql})")
+        return
+
+    existing = {row[1]: row[5] for row in conn.execute("PRAGMA table_info(customers)")}
+    if existing.get("CustomerId"):
+        return
+
+    column_names = [name for name, _ in CUSTOMER_COLUMNS if name in existing]
+    column_list = ", ".join(f'"{name}"' for name in column_names)
+    conn.execute("ALTER TABLE customers RENAME TO customers_legacy")
+    conn.execute(f"CREATE TABLE customers ({columns_sql})")
+    # Duplicate ids keep their first row
+    conn.execute(f"INSERT OR IGNORE INTO customers ({column_list}) SELECT {column_list} FROM customers_legacy")
+    conn.execute("DROP TABLE customers_legacy")
+
+def _hot_lookup_indexes(conn: sqlite3.Connection):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_created ON messages (chat_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_customer_timestamp ON predictions (customer_id, timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_timestamp ON logs (timestamp)")
+
+def _customer_shap(conn: sqlite3.Connection):
+    # Precomputed positive-class SHAP rows, filled by src.services.shap_store
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS customer_shap (
+        CustomerId INTEGER PRIMARY KEY,
+        model_version TEXT NOT NULL,
+        feature_hash TEXT NOT NULL,
+        shap_values TEXT NOT NULL,  -- JSON list aligned with get_feature_names_out()
+        computed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _query_results(conn: sqlite3.Connection):
+    # Result handles for paginated/exported SQL tool output
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS query_results (
+        id TEXT PRIMARY KEY,
+        sql TEXT NOT NULL,
+        params TEXT NOT NULL,  -- JSON list
+        columns TEXT NOT NULL,  -- JSON list
+        total_estimate INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_query_results_created ON query_results (created_at)")
+
+def _query_costs(conn: sqlite3.Connection):
+    # Cost of every guarded execution of LLM-generated SQL
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS query_costs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        label TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        sql TEXT NOT NULL,
+        status TEXT NOT NULL,  -- 'ok', 'rejected', 'timeout' or 'error'
+        error TEXT,
+        duration_ms REAL,
+        vm_steps INTEGER,
+        rows INTEGER,
+        plan TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_query_costs_fingerprint ON query_costs (fingerprint)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_query_costs_timestamp ON query_costs (timestamp)")
+
+def _message_token_counts(conn: sqlite3.Connection):
+    # Tokenizer count of "role: content", filled when a message is saved
+    conn.execute("ALTER TABLE messages ADD COLUMN token_count INTEGER")
+
+def _log_rollups(conn: sqlite3.Connection):
+    # Which tool answered and how long the turn took, rolled up per day by
+    # src.db.maintenance so raw logs can expire without losing the stats
+    conn.execute("ALTER TABLE logs ADD COLUMN tool TEXT")
+    conn.execute("ALTER TABLE logs ADD COLUMN latency_ms REAL")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS log_daily_stats (
+        day TEXT NOT NULL,
+        tool TEXT NOT NULL,
+        queries INTEGER NOT NULL,
+        avg_latency_ms REAL,
+        p95_latency_ms REAL,
+        max_latency_ms REAL,
+        PRIMARY KEY (day, tool)
+    )
+    """)
+    # Retention deletes predictions by age alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_predictions_timestamp ON predictions (timestamp)")
+
+def _query_result_keys(conn: sqlite3.Connection):
+    # Sort key of a result handle (JSON list of [column, "asc"|"desc"]), so
+    # its pages are fetched by keyset instead of OFFSET; NULL when unordered
+    conn.execute("ALTER TABLE query_results ADD COLUMN order_key TEXT")
+
+# Ordered list of (version, name, function). Append new migrations at the end;
+# never edit or reorder one that has shipped.
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "customers primary key", _customers_primary_key),
+    (3, "hot lookup indexes", _hot_lookup_indexes),
+    (4, "customer shap store", _customer_shap),
+    (5, "query result handles", _query_results),
+    (6, "query costs", _query_costs),
+    (7, "message token counts", _message_token_counts),
+    (8, "log rollups and retention index", _log_rollups),
+    (9, "query result keyset", _query_result_keys),
+]
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    if not _table_exists(conn, "schema_version"):
+        return 0
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+def migrate(conn: sqlite3.Connection) -> int:
+    # Apply every pending migration, each in its own transaction
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        applied_at DATETIME NOT NULL
+    )
+    """)
+    current = get_schema_version(conn)
+    for version, name, apply in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN")
+        try:
+            apply(conn)
+            conn.execute(
+                "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                (version, name, datetime.now().isoformat())
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        logger.info(f"Applied migration {version}: {name}")
+        current = version
+    return current
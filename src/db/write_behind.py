@@ -0,0 +1,196 @@
+import atexit
+import itertools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+from src.core.config import config
+from src.db.database import get_db_connection, run_db
+
+logger = logging.getLogger(__name__)
+
+# Write-behind queue for audit inserts (logs, predictions, query costs).
+# Request paths enqueue the row and return; a single writer thread drains the
+# queue in batched transactions, so a commit's fsync is paid once per batch
+# instead of once per request. The writer commits with synchronous=FULL, so a
+# written batch survives power loss; rows still queued are flushed by stop()
+# on shutdown, leaving at most one flush interval at risk on a hard crash.
+
+_STOP = object()
+
+class WriteBehindQueue:
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0  # submits that had to wait for room (backpressure)
+        self.failed = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+
+    def submit(self, sql: str, params: Sequence[Any]):
+        # Blocks while the queue is full; writes synchronously when disabled
+        if not config.WRITE_BEHIND_ENABLED:
+            self._write([(sql, tuple(params))])
+            return
+        self.start()
+        try:
+            self._queue.put_nowait((sql, tuple(params)))
+        except queue.Full:
+            self.blocked += 1
+            self._put_waiting((sql, tuple(params)))
+
+    def _alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _put_waiting(self, item):
+        # Waits for room only while the writer is alive to make some; with the
+        # writer gone the row is written synchronously instead of blocking forever
+        while True:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if not self._alive():
+                    logger.error("Write-behind writer is not running, writing synchronously")
+                    if item is not _STOP:
+                        self._write([item])
+                    return
+
+    def submit_many(self, sql: str, rows: Iterable[Sequence[Any]]):
+        for params in rows:
+            self.submit(sql, params)
+
+    async def asubmit(self, sql: str, params: Sequence[Any]):
+        # Enqueues without leaving the event loop unless the queue is full
+        # (or the queue is disabled), in which case a DB worker waits instead
+        if config.WRITE_BEHIND_ENABLED:
+            self.start()
+            try:
+                self._queue.put_nowait((sql, tuple(params)))
+                return
+            except queue.Full:
+                pass
+        await run_db(self.submit, sql, params)
+
+    def flush(self, timeout: float = None):
+        # Waits until every queued row has been written. Rows left behind by a
+        # writer that died are written synchronously; TimeoutError if the
+        # writer is alive but doesn't finish in time.
+        deadline = None if timeout is None else time.monotonic() + timeout
+        done = self._queue.all_tasks_done
+        with done:
+            while self._queue.unfinished_tasks:
+                if not self._alive():
+                    break
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError(f"Write-behind flush timed out with {self._queue.qsize()} rows queued")
+                done.wait(0.1)
+            else:
+                return
+        self._drain()
+
+    def stop(self, timeout: float = 30):
+        # Drains the queue and stops the writer thread
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            self._put_waiting(_STOP)
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.error(f"Write-behind writer did not stop within {timeout}s, {self._queue.qsize()} rows still queued")
+                return
+        self._drain()
+
+    def _drain(self):
+        # Writes whatever the (dead or stopped) writer left in the queue
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rows.append(item)
+            self._queue.task_done()
+        if rows:
+            logger.error(f"Write-behind writer is not running, writing {len(rows)} queued rows synchronously")
+            self._write(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": config.WRITE_BEHIND_ENABLED,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "written": self.written,
+            "batches": self.batches,
+            "blocked": self.blocked,
+            "failed": self.failed,
+        }
+
+    def _run(self):
+        conn = get_db_connection()
+        conn.execute("PRAGMA synchronous=FULL")  # this thread's connection only
+        conn.close()
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Group commit: collect rows for up to flush_interval or batch_size
+            deadline = time.monotonic() + self.flush_interval
+            while item is not _STOP and len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+            rows = [entry for entry in batch if entry is not _STOP]
+            try:
+                if rows:
+                    self._write(rows)
+            except Exception as e:
+                # Keep the writer alive; _write already handles SQLite errors
+                self.failed += len(rows)
+                logger.error(f"Write-behind batch of {len(rows)} rows dropped: {str(e)}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if batch[-1] is _STOP:
+                return
+
+    def _write(self, rows: List[Tuple[str, tuple]]):
+        conn = get_db_connection()
+        try:
+            try:
+                with conn:
+                    for sql, group in itertools.groupby(rows, key=lambda row: row[0]):
+                        conn.executemany(sql, [params for _, params in group])
+                self.written += len(rows)
+            except sqlite3.Error as e:
+                # Retry row by row so one bad row doesn't drop the whole batch
+                logger.error(f"Write-behind batch of {len(rows)} rows failed, retrying individually: {str(e)}")
+                for sql, params in rows:
+                    try:
+                        with conn:
+                            conn.execute(sql, params)
+                        self.written += 1
+                    except sqlite3.Error as row_error:
+                        self.failed += 1
+                        logger.error(f"Write-behind row dropped: {str(row_error)} ({sql.split('(')[0].strip()})")
+            self.batches += 1
+        finally:
+            conn.close()
+
+writer = WriteBehindQueue(config.WRITE_BEHIND_MAX_QUEUE, config.WRITE_BEHIND_BATCH_SIZE, config.WRITE_BEHIND_FLUSH_INTERVAL)
+atexit.register(writer.stop)
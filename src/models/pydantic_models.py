@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+from src.core.config import config
 
 class CustomerData(BaseModel):
     CreditScore: float = Field(..., ge=300, le=850, description='Credit score of the customer (300-850)')
@@ -14,6 +15,22 @@ class CustomerData(BaseModel):
     IsActiveMember: bool = Field(..., description='Is the customer an active member')
     EstimatedSalary: float = Field(..., ge=0, description='Estimated salary')
 
+class BatchPredictRequest(BaseModel):
+    customers: List[CustomerData] = Field(..., min_length=1, max_length=config.BATCH_PREDICT_MAX_ROWS)
+    explain: bool = False  # Opt-in LLM explanation per row
+    language: str = 'en'
+
+class BatchPrediction(BaseModel):
+    index: int
+    prediction: int
+    probability: float
+    top_factors: Dict[str, float]
+    explanation: Optional[str] = None
+
+class BatchPredictResponse(BaseModel):
+    count: int
+    results: List[BatchPrediction]
+
 class ChatQuery(BaseModel):
     query: str
     history: Optional[List[Dict[str, str]]] = []  # [{"role": "user", "content": "..."}, ...]
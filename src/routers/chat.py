@@ -1,56 +1,106 @@
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from src.models.pydantic_models import ChatRequest, ChatResponse
-from src.services.router_agent import route_query
 from src.db import crud
-from src.db.database import get_db_connection
+from src.db.database import run_db
+from src.services.history import load_history, save_message
+import json
+import asyncio
 import logging
+from typing import Any, Dict, List, Tuple
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+async def start_chat_turn(chat_request: ChatRequest) -> Tuple[int, List[Dict[str, str]]]:
+    # Create new chat if no chat_id provided or chat_id is 0
+    if not chat_request.chat_id or chat_request.chat_id == 0:
+        title = chat_request.message[:30] + "..." if len(chat_request.message) > 30 else chat_request.message
+        chat_id = await run_db(crud.create_chat, title)
+    else:
+        chat_id = chat_request.chat_id
+        if not await run_db(crud.get_chat, chat_id):
+            raise HTTPException(status_code=404, detail="Chat not found")
+    
+    # Save user message
+    await run_db(save_message, chat_id, chat_request.message, "user")
+    
+    # Get the tail of the chat history with token counts
+    history = await run_db(load_history, chat_id)
+    return chat_id, history
+
+async def finish_chat_turn(chat_id: int, chat_request: ChatRequest, response_text: str):
+    # Save assistant response
+    await run_db(save_message, chat_id, response_text, "assistant")
+    
+    # Update chat title if default
+    chat = await run_db(crud.get_chat, chat_id)
+    if chat and chat["title"] == chat_request.message[:30] + "...":
+        new_title = response_text[:30] + "..." if len(response_text) > 30 else response_text
+        await run_db(crud.update_chat_title, chat_id, new_title)
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(chat_request: ChatRequest):
     try:
         logger.info(f"Received chat request: {chat_request}")
-        
-        # Create new chat if no chat_id provided or chat_id is 0
-        if not chat_request.chat_id or chat_request.chat_id == 0:
-            title = chat_request.message[:30] + "..." if len(chat_request.message) > 30 else chat_request.message
-            chat_id = crud.create_chat(title)
-        else:
-            chat_id = chat_request.chat_id
-            if not crud.get_chat(chat_id):
-                raise HTTPException(status_code=404, detail="Chat not found")
-        
-        # Save user message
-        crud.create_message(chat_id, chat_request.message, "user")
-        
-        # Get chat history
-        messages = crud.get_messages(chat_id)
-        history = [{"role": msg["role"], "content": msg["content"]} for msg in messages]
+        chat_id, history = await start_chat_turn(chat_request)
         
         # Route query
+        from src.services.router_agent import route_query  # Deferred heavy import
         response_text = await route_query(chat_request.message, history)
         
-        # Save assistant response
-        crud.create_message(chat_id, response_text, "assistant")
-        
-        # Update chat title if default
-        chat = crud.get_chat(chat_id)
-        if chat and chat["title"] == chat_request.message[:30] + "...":
-            new_title = response_text[:30] + "..." if len(response_text) > 30 else response_text
-            crud.update_chat_title(chat_id, new_title)
-        
+        await finish_chat_turn(chat_id, chat_request, response_text)
         return ChatResponse(response=response_text, chat_id=chat_id)
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_stream_endpoint(chat_request: ChatRequest):
+    # Server-sent events: "chat" (chat_id), "route", "prediction", "token"...,
+    # then "done" once the assembled response has been persisted
+    try:
+        logger.info(f"Received streaming chat request: {chat_request}")
+        chat_id, history = await start_chat_turn(chat_request)
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    from src.services.router_agent import stream_route_query  # Deferred heavy import
+    
+    async def events():
+        parts = []
+        persisted = False
+        try:
+            yield sse_event("chat", {"chat_id": chat_id})
+            async for event, data in stream_route_query(chat_request.message, history):
+                if event == "token":
+                    parts.append(data["text"])
+                elif event == "done":
+                    persisted = True
+                    # Shielded so a disconnect during the save doesn't cancel it
+                    await asyncio.shield(finish_chat_turn(chat_id, chat_request, data["response"]))
+                    data = {**data, "chat_id": chat_id}
+                yield sse_event(event, data)
+        finally:
+            if not persisted and parts:
+                # The client went away mid-stream: keep the text it was shown
+                logger.info(f"Chat {chat_id} stream closed before completion, saving partial response")
+                await asyncio.shield(finish_chat_turn(chat_id, chat_request, "".join(parts)))
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/chats")
 async def get_chats():
     try:
-        chats = crud.get_chats()
+        chats = await run_db(crud.get_chats)
         return [dict(chat) for chat in chats]
     except Exception as e:
         logger.error(f"Error getting chats: {str(e)}")
@@ -59,11 +109,11 @@ async def get_chats():
 @router.get("/chats/{chat_id}")
 async def get_chat(chat_id: int):
     try:
-        chat = crud.get_chat(chat_id)
+        chat = await run_db(crud.get_chat, chat_id)
         if not chat:
             raise HTTPException(status_code=404, detail="Chat not found")
         
-        messages = crud.get_messages(chat_id)
+        messages = await run_db(crud.get_messages, chat_id)
         return {
             "id": chat["id"],
             "title": chat["title"],
@@ -77,7 +127,7 @@ async def get_chat(chat_id: int):
 @router.delete("/chats/{chat_id}")
 async def delete_chat(chat_id: int):
     try:
-        success = crud.delete_chat(chat_id)
+        success = await run_db(crud.delete_chat, chat_id)
         if not success:
             raise HTTPException(status_code=404, detail="Chat not found")
         return {"message": "Chat deleted successfully"}
@@ -88,12 +138,7 @@ async def delete_chat(chat_id: int):
 @router.delete("/chats")
 async def delete_all_chats():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM chats")
-        cursor.execute("DELETE FROM messages")  # Cascade delete messages
-        conn.commit()
-        conn.close()
+        await run_db(crud.delete_all_chats)
         return {"message": "All chats deleted successfully"}
     except Exception as e:
         logger.error(f"Error deleting all chats: {str(e)}")
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException
+from src.models.pydantic_models import BatchPredictRequest, BatchPredictResponse
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+@router.post("/predict/batch", response_model=BatchPredictResponse)
+async def predict_batch_endpoint(batch_request: BatchPredictRequest):
+    try:
+        logger.info(f"Received batch prediction request: {len(batch_request.customers)} customers, explain={batch_request.explain}")
+        from src.services.prediction import predict_batch  # Deferred heavy import
+        records = [customer.model_dump() for customer in batch_request.customers]
+        results = await asyncio.to_thread(
+            predict_batch, records, batch_request.explain, batch_request.language
+        )
+        return BatchPredictResponse(count=len(results), results=results)
+    except Exception as e:
+        logger.error(f"Error in batch prediction endpoint: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from src.db.database import run_db
+from src.services.result_store import fetch_page, get_result, iter_export
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+EXPORT_MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+@router.get("/results/{result_id}")
+async def get_result_page(result_id: str, page: int = Query(1, ge=1), page_size: int = Query(None, ge=1),
+                          cursor: str = Query(None)):
+    try:
+        result = await run_db(fetch_page, result_id, page, page_size, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching result page: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return result
+
+@router.get("/results/{result_id}/export")
+async def export_result(result_id: str, format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    handle = await run_db(get_result, result_id)
+    if handle is None:
+        raise HTTPException(status_code=404, detail="Result not found")
+    return StreamingResponse(
+        iter_export(handle, format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="result-{result_id}.{format}"'}
+    )
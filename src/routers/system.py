@@ -0,0 +1,75 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+from src.core.startup import pipeline
+from src.core.workers import all_worker_metrics, worker, worker_statuses
+
+router = APIRouter()
+
+# Service modules are imported inside the handlers so that registering this
+# router does not pull in langchain or the model stack at startup
+
+@router.get("/metrics")
+async def metrics():
+    from src.core.metrics import render_families
+    return PlainTextResponse(render_families(all_worker_metrics()), media_type="text/plain; version=0.0.4")
+
+@router.get("/health")
+async def health():
+    return {"status": "ok", "worker": worker.index, "pid": worker.pid}
+
+@router.get("/workers")
+async def workers():
+    # Every worker of a serve.py deployment; 503 while any of them is down
+    statuses = worker_statuses()
+    body = {"count": worker.count, "served_by": worker.index, "workers": statuses}
+    return JSONResponse(body, status_code=200 if all(s["alive"] for s in statuses) else 503)
+
+@router.get("/ready")
+async def ready():
+    status = pipeline.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@router.get("/cache/stats")
+async def cache_stats():
+    from src.services.llm_cache import llm_cache
+    if llm_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **llm_cache.stats()}
+
+@router.get("/router/stats")
+async def router_stats():
+    from src.services.intent_router import route_stats
+    return route_stats()
+
+@router.get("/models")
+async def model_stats():
+    from src.services.model_registry import registry_stats
+    return registry_stats()
+
+@router.get("/shap/stats")
+async def shap_stats():
+    from src.services.shap_store import shap_cache
+    return shap_cache.stats()
+
+@router.get("/writer/stats")
+async def writer_stats():
+    from src.db.write_behind import writer
+    return writer.stats()
+
+@router.get("/llm/scheduler")
+async def llm_scheduler_stats():
+    from src.services.llm_scheduler import scheduler
+    from src.services.llm_resilience import stats as resilience_stats
+    return {**scheduler.stats(), "resilience": resilience_stats()}
+
+@router.get("/sql/costs")
+async def sql_costs(limit: int = 20):
+    from src.db.database import run_db
+    from src.services.sql_guard import expensive_patterns
+    return await run_db(expensive_patterns, limit)
+
+@router.get("/logs/daily")
+async def logs_daily(days: int = 30):
+    from src.db.database import run_db
+    from src.db.maintenance import daily_stats
+    return await run_db(daily_stats, days)
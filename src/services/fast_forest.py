@@ -0,0 +1,193 @@
+import os
+import logging
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+# Column spec kinds for the compiled preprocessor
+NUMERIC, ONEHOT = 0, 1
+
+class FastForest:
+    # Array-backed copy of the preprocessor and random forest. The
+    # ColumnTransformer is flattened into per-column fill/mean/scale values and
+    # one-hot lookup tables; every tree is packed into shared node arrays so a
+    # prediction walks all trees at once with NumPy indexing instead of going
+    # through pandas, sklearn validation and two separate forest passes.
+
+    def __init__(self, columns: List[Dict[str, Any]], n_outputs: int, classes: np.ndarray,
+                 roots: np.ndarray, left: np.ndarray, right: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, leaf_values: np.ndarray, max_depth: int, model_version: str):
+        self.columns = columns
+        self.n_outputs = n_outputs
+        self.classes = classes
+        self.roots = roots
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.leaf_values = leaf_values
+        self.max_depth = max_depth
+        self.model_version = model_version
+
+    @classmethod
+    def from_sklearn(cls, preprocessor, model, model_version: str) -> "FastForest":
+        return cls(_compile_preprocessor(preprocessor), len(preprocessor.get_feature_names_out()),
+                   np.asarray(model.classes_), *_compile_forest(model), model_version)
+
+    def transform_one(self, features: Dict[str, Any]) -> np.ndarray:
+        x = np.empty(self.n_outputs, dtype=np.float64)
+        for col in self.columns:
+            value = features.get(col["name"])
+            if value is None or (isinstance(value, float) and np.isnan(value)):
+                value = col["fill"]
+            if col["kind"] == NUMERIC:
+                x[col["offset"]] = (float(value) - col["mean"]) / col["scale"]
+            else:
+                try:
+                    x[col["offset"]:col["offset"] + col["width"]] = col["lookup"][value]
+                except KeyError:
+                    raise ValueError(f"Found unknown category {value!r} in column {col['name']}")
+        return x
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+        return self.leaf_values[nodes].mean(axis=1)
+
+    def predict_one(self, features: Dict[str, Any]) -> Tuple[int, float, np.ndarray]:
+        # One pass: returns (prediction, positive-class probability, preprocessed vector)
+        x = self.transform_one(features)
+        proba = self.predict_proba(x[None, :])[0]
+        return int(self.classes[np.argmax(proba)]), float(proba[1]), x
+
+    def save(self, path: str):
+        arrays = {
+            "classes": self.classes, "roots": self.roots, "left": self.left, "right": self.right,
+            "feature": self.feature, "threshold": self.threshold, "leaf_values": self.leaf_values,
+            "meta": np.array([self.n_outputs, self.max_depth]),
+            "model_version": np.array(self.model_version),
+            "columns": np.array(self.columns, dtype=object),
+        }
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "FastForest":
+        data = np.load(path, allow_pickle=True)  # columns hold small dicts of lookup tables
+        n_outputs, max_depth = (int(v) for v in data["meta"])
+        return cls(list(data["columns"]), n_outputs, data["classes"], data["roots"], data["left"],
+                   data["right"], data["feature"], data["threshold"], data["leaf_values"], max_depth,
+                   str(data["model_version"]))
+
+def _compile_preprocessor(preprocessor) -> List[Dict[str, Any]]:
+    from sklearn.pipeline import Pipeline
+    from sklearn.impute import SimpleImputer
+    from sklearn.preprocessing import StandardScaler, OneHotEncoder
+
+    columns = []
+    offset = 0
+    for name, transformer, input_columns in preprocessor.transformers_:
+        if transformer == 'drop' or len(input_columns) == 0:
+            continue
+        steps = [] if transformer == 'passthrough' else (
+            [step for _, step in transformer.steps] if isinstance(transformer, Pipeline) else [transformer]
+        )
+        fills, means, scales, encoder = [None] * len(input_columns), np.zeros(len(input_columns)), np.ones(len(input_columns)), None
+        for step in steps:
+            if isinstance(step, SimpleImputer) and step.strategy in ('mean', 'median', 'most_frequent', 'constant'):
+                fills = list(step.statistics_)
+            elif isinstance(step, StandardScaler):
+                if step.mean_ is not None:
+                    means = np.asarray(step.mean_, dtype=np.float64)
+                if step.scale_ is not None:
+                    scales = np.asarray(step.scale_, dtype=np.float64)
+            elif isinstance(step, OneHotEncoder) and encoder is None:
+                encoder = step
+            else:
+                raise ValueError(f"Unsupported preprocessing step for fast inference: {type(step).__name__} in '{name}'")
+
+        for j, column in enumerate(input_columns):
+            if encoder is None:
+                columns.append({"name": column, "kind": NUMERIC, "offset": offset, "fill": fills[j],
+                                "mean": float(means[j]), "scale": float(scales[j])})
+                offset += 1
+                continue
+            categories = list(encoder.categories_[j])
+            drop_idx = encoder.drop_idx_[j] if encoder.drop_idx_ is not None else None
+            kept = [k for k in range(len(categories)) if k != drop_idx]
+            lookup = {}
+            for k, category in enumerate(categories):
+                vector = np.zeros(len(kept))
+                if k != drop_idx:
+                    vector[kept.index(k)] = 1.0
+                lookup[category] = vector
+            columns.append({"name": column, "kind": ONEHOT, "offset": offset, "fill": fills[j],
+                            "width": len(kept), "lookup": lookup})
+            offset += len(kept)
+
+    if offset != len(preprocessor.get_feature_names_out()):
+        raise ValueError(f"Compiled preprocessor emits {offset} features, expected {len(preprocessor.get_feature_names_out())}")
+    return columns
+
+def _compile_forest(model):
+    if not hasattr(model, "estimators_"):
+        raise ValueError(f"Unsupported model for fast inference: {type(model).__name__}")
+    roots, lefts, rights, features, thresholds, values = [], [], [], [], [], []
+    base, max_depth = 0, 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        left = tree.children_left.astype(np.int64)
+        right = tree.children_right.astype(np.int64)
+        leaf = left == -1
+        roots.append(base)
+        # Shift child indices into the shared arrays; leaves keep -1
+        lefts.append(np.where(leaf, -1, left + base))
+        rights.append(np.where(leaf, -1, right + base))
+        features.append(np.where(leaf, 0, tree.feature).astype(np.int64))
+        thresholds.append(tree.threshold.astype(np.float64))
+        # Per-node class distribution normalized like DecisionTreeClassifier.predict_proba
+        value = tree.value[:, 0, :].astype(np.float64)
+        totals = value.sum(axis=1, keepdims=True)
+        values.append(value / np.where(totals == 0, 1, totals))
+        base += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    return (np.array(roots, dtype=np.int64), np.concatenate(lefts), np.concatenate(rights),
+            np.concatenate(features), np.concatenate(thresholds), np.concatenate(values), max_depth + 1)
+
+def build_fast_forest() -> FastForest:
+    # Load the exported arrays if they match the current artifacts, else export them
+    from src.services.model_registry import get_model, get_preprocessor, get_model_version
+    version = get_model_version()
+    if os.path.exists(config.FAST_FOREST_PATH):
+        engine = FastForest.load(config.FAST_FOREST_PATH)
+        if engine.model_version == version:
+            return engine
+    engine = FastForest.from_sklearn(get_preprocessor(), get_model(), version)
+    engine.save(config.FAST_FOREST_PATH)
+    return engine
+
+def verify_parity(engine: FastForest, records: List[Dict[str, Any]], atol: float = 1e-9) -> Dict[str, Any]:
+    # Compare against the sklearn path; used by benchmarks/bench_fast_forest.py
+    import pandas as pd
+    from src.services.model_registry import get_model, get_preprocessor
+    expected_X = get_preprocessor().transform(pd.DataFrame(records))
+    expected = get_model().predict_proba(expected_X)
+    X = np.vstack([engine.transform_one(r) for r in records])
+    actual = engine.predict_proba(X)
+    return {
+        "rows": len(records),
+        "max_transform_error": float(np.max(np.abs(X - np.asarray(expected_X, dtype=np.float64)))),
+        "max_proba_error": float(np.max(np.abs(actual - expected))),
+        "prediction_mismatches": int(np.sum(np.argmax(actual, axis=1) != np.argmax(expected, axis=1))),
+        "ok": bool(np.allclose(X, expected_X, atol=atol) and np.allclose(actual, expected, atol=atol)),
+    }
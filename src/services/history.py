@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+from src.core.config import config
+from src.core.metrics import timed
+from src.db import crud
+
+logger = logging.getLogger(__name__)
+
+# Chat history with per-message token counts from the model's tokenizer.
+# Counts are stored in messages.token_count when a message is saved, so a turn
+# only tokenizes new text. Without tiktoken (or offline before its encoding is
+# cached) counts fall back to len(text) // 4 + 1 and are not stored, so exact
+# counts replace them once the tokenizer is available.
+
+_encoding = None
+_encoding_failed = False
+_encoding_lock = threading.Lock()
+
+def get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        with _encoding_lock:
+            if _encoding is None and not _encoding_failed:
+                try:
+                    import tiktoken
+                    try:
+                        _encoding = tiktoken.encoding_for_model(config.MODEL_NAME)
+                    except KeyError:
+                        # Unknown model name (e.g. an OpenRouter model id)
+                        _encoding = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    _encoding_failed = True
+                    logger.warning(f"tiktoken unavailable, estimating tokens from text length: {str(e)}")
+    return _encoding
+
+def exact_tokens(text: str) -> Optional[int]:
+    encoding = get_encoding()
+    if encoding is None:
+        return None
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens(text: str) -> int:
+    exact = exact_tokens(text)
+    return exact if exact is not None else len(text) // 4 + 1
+
+def message_text(role: str, content: str) -> str:
+    # The form messages take in the router prompt
+    return f"{role}: {content}"
+
+@timed("persistence")
+def save_message(chat_id: int, content: str, role: str) -> int:
+    return crud.create_message(chat_id, content, role, exact_tokens(message_text(role, content)))
+
+@timed("db_lookup")
+def load_history(chat_id: int, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    # The most recent messages only, oldest first, each with its token count.
+    # Rows saved without an exact count are counted here and backfilled.
+    rows = crud.get_recent_messages(chat_id, limit or config.HISTORY_MAX_MESSAGES)
+    history, backfill = [], []
+    for row in rows:
+        tokens = row["token_count"]
+        if tokens is None:
+            text = message_text(row["role"], row["content"])
+            tokens = exact_tokens(text)
+            if tokens is not None:
+                backfill.append((tokens, row["id"]))
+            else:
+                tokens = len(text) // 4 + 1
+        history.append({"role": row["role"], "content": row["content"], "tokens": tokens})
+    if backfill:
+        crud.set_message_token_counts(backfill)
+    return history
@@ -0,0 +1,104 @@
+import re
+import logging
+from collections import Counter
+from typing import Dict, Optional, Tuple
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+# Wording about a churn outcome. With an aggregate it only says what is being
+# counted ("how many customers are predicted to churn" is a SQL query), so it
+# then doesn't score for prediction_tool.
+PREDICT_STEM = r'\bpredict(?:ion|ed)?\b'
+WILL_CHURN = r'\bwill\b.*\bchurn\b|\blikely to (?:churn|leave)\b'
+CHURN = r'\bchurn\b'
+AGGREGATE = r'\bhow many\b|\bnumber of\b|\baverage\b|\bavg\b|\bmean\b|\bcount\b|\btotal\b|\bsum\b'
+OUTCOME_PATTERNS = {PREDICT_STEM, WILL_CHURN, CHURN}
+
+# (pattern, weight) per tool, mirroring the keywords listed in router_prompt.
+# Comparisons on probability are weighted highest because those queries also
+# contain sql_tool keywords ("list", "show"). Checked against the labelled
+# queries in benchmarks/check_intent_router.py.
+INTENT_PATTERNS = {
+    "probability_filter_tool": [
+        (r'probability\s*(?:is\s*)?(?:greater than|above|over|more than|higher than|exceeds?|>=?)', 4),
+        (r'churn\s*probability', 1),
+    ],
+    "recommendation_tool": [
+        (r'\brecommend(?:ation)?s?\b', 3),
+        (r'\bsuggest(?:ion)?s?\b', 3),
+        (r'\bactions?\b', 2),
+        (r'\bretain\b|\bretention\b|\bwhat can (?:i|we) do\b', 3),
+    ],
+    "prediction_tool": [
+        (PREDICT_STEM, 3),
+        (WILL_CHURN, 2),
+        (r'\bexplain\b|\bwhy\b', 2),
+        (CHURN, 1),
+        (r'\b\d{8}\b', 1),
+        (r'year-old', 1),
+    ],
+    "sql_tool": [
+        (r'\bhow many\b|\bnumber of\b', 3),
+        (r'\baverage\b|\bavg\b|\bmean\b', 3),
+        (r'\bcount\b|\btotal\b|\bsum\b', 3),
+        (r'\bshow all\b|\blist\b', 2),
+        (r'\b(?:max(?:imum)?|min(?:imum)?|highest|lowest|top \d+)\b', 2),
+    ],
+}
+
+_COMPILED = {
+    tool: [(re.compile(pattern, re.IGNORECASE), weight, tool == "prediction_tool" and pattern in OUTCOME_PATTERNS)
+           for pattern, weight in patterns]
+    for tool, patterns in INTENT_PATTERNS.items()
+}
+_AGGREGATE = re.compile(AGGREGATE, re.IGNORECASE)
+
+# How often each routing path is taken, e.g. {"fast:sql_tool": 10, "llm": 3}
+route_counts: Counter = Counter()
+
+def score_intents(query: str) -> Dict[str, int]:
+    aggregate = _AGGREGATE.search(query) is not None
+    return {
+        tool: sum(weight for pattern, weight, outcome in patterns
+                  if not (aggregate and outcome) and pattern.search(query))
+        for tool, patterns in _COMPILED.items()
+    }
+
+def classify_intent(query: str) -> Tuple[Optional[str], float]:
+    # Returns (tool, confidence); tool is None when nothing matched strongly enough.
+    # Confidence is the margin of the best score over the runner-up; routing
+    # needs it strictly above INTENT_CONFIDENCE_THRESHOLD, so a 2:1 lead isn't enough.
+    scores = sorted(score_intents(query).items(), key=lambda x: x[1], reverse=True)
+    (best_tool, best), (_, runner_up) = scores[0], scores[1]
+    if best < config.INTENT_MIN_SCORE:
+        return None, 0.0
+    return best_tool, (best - runner_up) / best
+
+def fast_route(query: str) -> Optional[str]:
+    # Route locally when confident; None means fall back to router_chain
+    if not config.FAST_ROUTER_ENABLED:
+        return None
+    tool, confidence = classify_intent(query)
+    if tool is None or confidence <= config.INTENT_CONFIDENCE_THRESHOLD:
+        return None
+    route_counts[f"fast:{tool}"] += 1
+    logger.info(f"Fast-path routed to {tool} (confidence={confidence:.2f})")
+    return tool
+
+def best_guess(query: str) -> Optional[str]:
+    # Highest-scoring tool regardless of confidence, for when the LLM router
+    # is unavailable
+    tool, score = max(score_intents(query).items(), key=lambda x: x[1])
+    if score == 0:
+        return None
+    route_counts[f"fallback:{tool}"] += 1
+    return tool
+
+def record_llm_route(tool_name: str):
+    route_counts["llm"] += 1
+    route_counts[f"llm:{tool_name}"] += 1
+
+def route_stats() -> Dict[str, int]:
+    fast = sum(v for k, v in route_counts.items() if k.startswith("fast:"))
+    return {"fast_path": fast, "llm": route_counts["llm"], "by_route": dict(route_counts)}
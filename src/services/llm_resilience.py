@@ -0,0 +1,313 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from contextlib import AsyncExitStack
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional
+import openai
+from src.core.config import config, parse_chain_settings
+from src.core.metrics import llm_events
+
+logger = logging.getLogger(__name__)
+
+# Deadlines, per-chain timeouts, jittered retries and optional hedging for LLM
+# calls. A chat turn starts a deadline in the request's context; every call
+# made for that turn (including from worker threads, which copy the context)
+# gets at most min(chain timeout, time left) per attempt and is retried only
+# while the deadline allows. The attempt timer starts once the call holds its
+# scheduler slot: time spent queued is bounded by the deadline alone, so a
+# queued call is never retried (and sent to the back of the queue) for being
+# slow. Callers catch LLMUnavailable to degrade.
+
+current_deadline: ContextVar[Optional[float]] = ContextVar("llm_deadline", default=None)
+
+class LLMUnavailable(Exception):
+    # No usable answer from the LLM in time; callers degrade instead of failing
+    pass
+
+class DeadlineExceeded(LLMUnavailable):
+    pass
+
+class LLMTimeout(LLMUnavailable):
+    pass
+
+class AttemptAbandoned(LLMUnavailable):
+    # A hedged sync attempt whose caller already has a result
+    pass
+
+class CancelToken:
+    # Shared by the sibling attempts of a hedged sync call: once one has an
+    # answer, cancel() wakes the others still queued for a scheduler slot,
+    # and they leave the queue
+    def __init__(self):
+        self.cancelled = False
+        self._events: List[threading.Event] = []
+        self._lock = threading.Lock()
+
+    def watch(self, event: threading.Event):
+        with self._lock:
+            self._events.append(event)
+            if self.cancelled:
+                event.set()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            events = list(self._events)
+        for event in events:
+            event.set()
+
+# Worth another attempt: hung or dropped requests, rate limits, provider 5xx
+RETRYABLE = (asyncio.TimeoutError, LLMTimeout, openai.APIConnectionError, openai.RateLimitError,
+             openai.InternalServerError)
+
+chain_timeouts: Dict[str, float] = parse_chain_settings(config.LLM_CHAIN_TIMEOUTS, float)
+
+def start_deadline(seconds: float) -> float:
+    # Like current_tool, set once per chat turn in the turn's own task
+    deadline = time.monotonic() + seconds
+    current_deadline.set(deadline)
+    return deadline
+
+def remaining() -> Optional[float]:
+    deadline = current_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+def deadline_exceeded(chain: str, message: str) -> DeadlineExceeded:
+    llm_events.inc(chain=chain, event="deadline_exceeded")
+    return DeadlineExceeded(message)
+
+def attempt_timeout(chain: str) -> float:
+    timeout = chain_timeouts.get(chain, config.LLM_TIMEOUT_SECONDS)
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise deadline_exceeded(chain, f"No time left for the {chain} call")
+    return min(timeout, left)
+
+def backoff(attempt: int) -> float:
+    # Full jitter: uniform over [0, base * 2^attempt], capped
+    return random.uniform(0, min(config.LLM_RETRY_MAX_SECONDS, config.LLM_RETRY_BASE_SECONDS * 2 ** attempt))
+
+class LatencyTracker:
+    # Recent successful call latencies per chain; their p95 is the hedge delay
+    def __init__(self, window: int):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, chain: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(chain, deque(maxlen=self.window)).append(seconds)
+
+    def quantile(self, chain: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(chain, ()))
+        if len(samples) < config.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return samples[int(q * (len(samples) - 1))]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            chains = list(self._samples)
+        return {chain: {"samples": len(self._samples[chain]), "p50_ms": _ms(self.quantile(chain, 0.5)),
+                        "p95_ms": _ms(self.quantile(chain, 0.95))} for chain in chains}
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else seconds * 1000
+
+latencies = LatencyTracker(config.LLM_LATENCY_WINDOW)
+
+def hedge_delay(chain: str) -> Optional[float]:
+    if not config.LLM_HEDGE_ENABLED:
+        return None
+    p95 = latencies.quantile(chain, 0.95)
+    return None if p95 is None else max(p95, config.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+def _give_up(chain: str, error: BaseException) -> LLMUnavailable:
+    if isinstance(error, LLMUnavailable):
+        return error
+    if isinstance(error, (asyncio.TimeoutError, openai.APITimeoutError)):
+        llm_events.inc(chain=chain, event="timeout")
+        return LLMTimeout(f"The {chain} call timed out")
+    return LLMUnavailable(f"The {chain} call failed: {error}")
+
+async def within_attempt_timeout(chain: str, call: Callable[[], Awaitable[Any]]) -> Any:
+    # One upstream call, run while holding its scheduler slot
+    timeout = attempt_timeout(chain)
+    started = time.perf_counter()
+    result = await asyncio.wait_for(call(), timeout)
+    latencies.record(chain, time.perf_counter() - started)
+    return result
+
+def within_attempt_timeout_sync(chain: str, call: Callable[[float], Any]) -> Any:
+    # A blocking call can't be interrupted, so the timeout goes to the HTTP
+    # request itself (call(timeout)) and the thread is never left behind
+    timeout = attempt_timeout(chain)
+    started = time.perf_counter()
+    result = call(timeout)
+    latencies.record(chain, time.perf_counter() - started)
+    return result
+
+def _can_hedge_within(chain: str) -> Optional[float]:
+    delay = hedge_delay(chain)
+    return None if delay is None or delay >= attempt_timeout(chain) else delay
+
+async def _first_success(chain: str, attempt: Callable[[bool], Awaitable[Any]], can_hedge: Callable[[], bool]) -> Any:
+    # Attempts bound themselves (queue wait by the deadline, the call by the
+    # attempt timeout), so no outer timeout here
+    delay = _can_hedge_within(chain)
+    if delay is None:
+        return await attempt(False)
+
+    primary = asyncio.ensure_future(attempt(False))
+    tasks = [primary]
+    error: Optional[BaseException] = None
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=delay)
+        if not done and can_hedge():
+            # Slower than the chain's p95: race a duplicate request
+            llm_events.inc(chain=chain, event="hedge")
+            tasks.append(asyncio.ensure_future(attempt(True)))
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        llm_events.inc(chain=chain, event="hedge_won")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+async def resilient_call(chain: str, attempt: Callable[[bool], Awaitable[Any]],
+                         can_hedge: Callable[[], bool] = lambda: True) -> Any:
+    # attempt(hedged) queues for a slot and makes one upstream call within
+    # within_attempt_timeout; hedged duplicates must not be coalesced with
+    # the call they race
+    for n in range(config.LLM_MAX_RETRIES + 1):
+        try:
+            return await _first_success(chain, attempt, can_hedge)
+        except RETRYABLE as e:
+            left = remaining()
+            delay = backoff(n)
+            if n == config.LLM_MAX_RETRIES or (left is not None and left <= delay):
+                raise _give_up(chain, e) from e
+            llm_events.inc(chain=chain, event="retry")
+            logger.warning(f"Retrying {chain} call in {delay:.2f}s after {type(e).__name__}")
+            await asyncio.sleep(delay)
+
+# Hedged sync calls run the primary and the hedge on this pool. The loser is
+# not interrupted: if still queued it is cancelled out of the scheduler, if
+# already sent it holds its slot until its own HTTP timeout at the latest.
+_sync_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm")
+
+def _submit(attempt: Callable[[bool, Optional[CancelToken]], Any], hedged: bool, cancel: CancelToken):
+    return _sync_executor.submit(contextvars.copy_context().run, attempt, hedged, cancel)
+
+def _first_success_sync(chain: str, attempt: Callable[[bool, Optional[CancelToken]], Any],
+                        can_hedge: Callable[[], bool]) -> Any:
+    delay = _can_hedge_within(chain)
+    if delay is None:
+        return attempt(False, None)  # In the caller's thread
+
+    cancel = CancelToken()
+    primary = _submit(attempt, False, cancel)
+    pending = {primary}
+    error: Optional[BaseException] = None
+    try:
+        done, _ = wait(pending, timeout=delay)
+        if not done and can_hedge():
+            llm_events.inc(chain=chain, event="hedge")
+            pending.add(_submit(attempt, True, cancel))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        llm_events.inc(chain=chain, event="hedge_won")
+                    return future.result()
+                error = future.exception()
+        raise error
+    finally:
+        cancel.cancel()
+
+def resilient_call_sync(chain: str, attempt: Callable[[bool, Optional[CancelToken]], Any],
+                        can_hedge: Callable[[], bool] = lambda: True) -> Any:
+    # attempt(hedged, cancel) queues for a slot (leaving the queue if cancel
+    # fires) and makes one upstream call within within_attempt_timeout_sync
+    for n in range(config.LLM_MAX_RETRIES + 1):
+        try:
+            return _first_success_sync(chain, attempt, can_hedge)
+        except RETRYABLE as e:
+            left = remaining()
+            delay = backoff(n)
+            if n == config.LLM_MAX_RETRIES or (left is not None and left <= delay):
+                raise _give_up(chain, e) from e
+            llm_events.inc(chain=chain, event="retry")
+            logger.warning(f"Retrying {chain} call in {delay:.2f}s after {type(e).__name__}")
+            time.sleep(delay)
+
+async def resilient_stream(chain: str, open_stream: Callable[[], AsyncIterator[Any]],
+                           slot: Callable[[], AsyncContextManager]) -> AsyncIterator[Any]:
+    # Streams are retried only until their first chunk, which must arrive
+    # within the attempt timeout of getting the slot; after that the rest
+    # must arrive within the deadline
+    for n in range(config.LLM_MAX_RETRIES + 1):
+        resources = AsyncExitStack()
+        await resources.enter_async_context(slot())  # Queue wait: bounded by the deadline only
+        stream = open_stream()
+        resources.push_async_callback(stream.aclose)
+        try:
+            timeout = attempt_timeout(chain)
+            started = time.perf_counter()
+            first = await asyncio.wait_for(stream.__anext__(), timeout)
+        except StopAsyncIteration:
+            await resources.aclose()
+            return
+        except RETRYABLE as e:
+            await resources.aclose()
+            left = remaining()
+            delay = backoff(n)
+            if n == config.LLM_MAX_RETRIES or (left is not None and left <= delay):
+                raise _give_up(chain, e) from e
+            llm_events.inc(chain=chain, event="retry")
+            logger.warning(f"Retrying {chain} stream in {delay:.2f}s after {type(e).__name__}")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            await resources.aclose()
+            raise
+        latencies.record(chain, time.perf_counter() - started)  # Time to first token
+        break
+    try:
+        yield first
+        while True:
+            left = remaining()
+            try:
+                chunk = await asyncio.wait_for(stream.__anext__(), None if left is None else max(left, 0.0))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError as e:
+                raise deadline_exceeded(chain, f"The {chain} stream ran past the deadline") from e
+            yield chunk
+    finally:
+        await resources.aclose()
+
+def stats() -> Dict[str, Any]:
+    return {
+        "chain_timeouts": chain_timeouts,
+        "default_timeout_s": config.LLM_TIMEOUT_SECONDS,
+        "hedging": config.LLM_HEDGE_ENABLED,
+        "latency": latencies.stats(),
+    }
@@ -0,0 +1,427 @@
+import time
+import bisect
+import asyncio
+import hashlib
+import itertools
+import threading
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManager
+from langchain_core.load import dumps
+from langchain_core.runnables import ensure_config
+from src.core.config import config, parse_chain_settings
+from src.core.metrics import llm_wait_seconds
+from src.services.llm_resilience import (AttemptAbandoned, CancelToken, deadline_exceeded, remaining, resilient_call,
+                                        resilient_call_sync, resilient_stream, within_attempt_timeout,
+                                        within_attempt_timeout_sync)
+
+# Every LLM call of every chain passes through one scheduler: a global and a
+# per-chain in-flight limit, a queue ordered by priority then arrival, and
+# single-flight coalescing of identical non-streamed calls. The chain is the
+# run's tag (router, sql, extraction, explain, recommend); the priority comes
+# from the caller's context, so batch work yields to interactive chats.
+# Waiting for a slot is bounded by the caller's deadline; a waiter that runs
+# out of time or is cancelled leaves the queue without being dispatched.
+
+INTERACTIVE, BATCH, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch", BACKGROUND: "background"}
+
+current_priority: ContextVar[int] = ContextVar("llm_priority", default=INTERACTIVE)
+
+@contextmanager
+def llm_priority(level: int):
+    token = current_priority.set(level)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+def chain_name(tags: Optional[List[str]]) -> str:
+    # Runnable sequences add their own "seq:step:N" tags
+    return next((tag for tag in tags or [] if not tag.startswith("seq:")), "untagged")
+
+class _LeaderGone(Exception):
+    # The call a follower was waiting on was cancelled; the follower retries
+    pass
+
+class _Waiter:
+    __slots__ = ("chain", "priority", "enqueued", "granted", "loop", "future", "event")
+
+    def __init__(self, chain: str, priority: int):
+        self.chain, self.priority = chain, priority
+        self.enqueued = time.perf_counter()
+        self.granted = False
+        self.loop = self.future = self.event = None
+
+    def wake(self):
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+class LLMScheduler:
+    def __init__(self, max_in_flight: int, chain_limits: Dict[str, int], single_flight: bool = True):
+        self.max_in_flight = max_in_flight
+        self.chain_limits = chain_limits
+        self.single_flight = single_flight
+        self.in_flight = 0
+        self.chain_in_flight: Dict[str, int] = {}
+        self._waiting: List[Tuple[int, int, _Waiter]] = []  # (priority, seq, waiter), kept sorted
+        self._seq = itertools.count()
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "queued": 0, "coalesced": 0}
+        self.max_wait_seconds = 0.0
+
+    def has_room(self, chain: str) -> bool:
+        with self._lock:
+            return self._has_room(chain)
+
+    def _has_room(self, chain: str) -> bool:
+        return (self.in_flight < self.max_in_flight
+                and self.chain_in_flight.get(chain, 0) < self.chain_limits.get(chain, self.max_in_flight))
+
+    def _take(self, chain: str):
+        self.in_flight += 1
+        self.chain_in_flight[chain] = self.chain_in_flight.get(chain, 0) + 1
+
+    def _dispatch(self):
+        # Grant slots in queue order to waiters whose chain has room. Afterwards
+        # every remaining waiter is blocked, so a new arrival that finds room
+        # can never jump ahead of a waiter of the same chain.
+        i = 0
+        while i < len(self._waiting) and self.in_flight < self.max_in_flight:
+            waiter = self._waiting[i][2]
+            if self._has_room(waiter.chain):
+                del self._waiting[i]
+                self._take(waiter.chain)
+                waiter.granted = True
+                waiter.wake()
+            else:
+                i += 1
+
+    def _enqueue(self, chain: str, priority: int) -> Optional[_Waiter]:
+        # Called with the lock held; None means the slot was taken right away
+        self.counters["calls"] += 1
+        if self._has_room(chain):
+            self._take(chain)
+            return None
+        self.counters["queued"] += 1
+        waiter = _Waiter(chain, priority)
+        bisect.insort(self._waiting, (priority, next(self._seq), waiter), key=lambda item: item[:2])
+        return waiter
+
+    def _observe_wait(self, chain: str, priority: int, seconds: float):
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+        llm_wait_seconds.observe(seconds, chain=chain, priority=PRIORITY_NAMES.get(priority, str(priority)))
+
+    def release(self, chain: str):
+        with self._lock:
+            self.in_flight -= 1
+            self.chain_in_flight[chain] -= 1
+            self._dispatch()
+
+    def _leave(self, waiter: _Waiter) -> bool:
+        # Takes a waiter that gave up out of the queue; True if it had been
+        # granted a slot meanwhile, which the caller must release
+        with self._lock:
+            if not waiter.granted:
+                self._waiting = [item for item in self._waiting if item[2] is not waiter]
+            return waiter.granted
+
+    async def acquire(self, chain: str, priority: Optional[int] = None):
+        priority = current_priority.get() if priority is None else priority
+        with self._lock:
+            waiter = self._enqueue(chain, priority)
+            if waiter is not None:
+                waiter.loop = asyncio.get_running_loop()
+                waiter.future = waiter.loop.create_future()
+        if waiter is None:
+            self._observe_wait(chain, priority, 0.0)
+            return
+        left = remaining()
+        try:
+            await asyncio.wait_for(waiter.future, None if left is None else max(left, 0.0))
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            if self._leave(waiter):
+                self.release(chain)  # Granted just as the caller gave up
+            if isinstance(e, asyncio.TimeoutError):
+                raise deadline_exceeded(chain, f"Ran out of time waiting for a {chain} slot") from e
+            raise
+        self._observe_wait(chain, priority, time.perf_counter() - waiter.enqueued)
+
+    def acquire_sync(self, chain: str, priority: Optional[int] = None, cancel: Optional[CancelToken] = None):
+        # For chains invoked from worker threads (predict_and_explain, batch explain)
+        priority = current_priority.get() if priority is None else priority
+        if cancel is not None and cancel.cancelled:
+            raise AttemptAbandoned(f"The {chain} call is no longer needed")
+        with self._lock:
+            waiter = self._enqueue(chain, priority)
+            if waiter is not None:
+                waiter.event = threading.Event()
+        if waiter is None:
+            self._observe_wait(chain, priority, 0.0)
+            return
+        if cancel is not None:
+            cancel.watch(waiter.event)
+        left = remaining()
+        waiter.event.wait(None if left is None else max(left, 0.0))
+        if waiter.granted and not (cancel is not None and cancel.cancelled):
+            self._observe_wait(chain, priority, time.perf_counter() - waiter.enqueued)
+            return
+        if self._leave(waiter):
+            self.release(chain)
+        if cancel is not None and cancel.cancelled:
+            raise AttemptAbandoned(f"The {chain} call is no longer needed")
+        raise deadline_exceeded(chain, f"Ran out of time waiting for a {chain} slot")
+
+    @asynccontextmanager
+    async def slot(self, chain: str):
+        await self.acquire(chain)
+        try:
+            yield
+        finally:
+            self.release(chain)
+
+    @contextmanager
+    def slot_sync(self, chain: str, cancel: Optional[CancelToken] = None):
+        self.acquire_sync(chain, cancel=cancel)
+        try:
+            yield
+        finally:
+            self.release(chain)
+
+    def _join_flight(self, key: Optional[str]) -> Tuple[Optional[Future], bool]:
+        # Returns (future, is_leader); no key means no coalescing
+        if key is None or not self.single_flight:
+            return None, True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.counters["coalesced"] += 1
+                return flight, False
+            flight = self._flights[key] = Future()
+            return flight, True
+
+    def _land(self, key: Optional[str], flight: Optional[Future], result: Any = None, error: BaseException = None):
+        if flight is None:
+            return
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        if error is not None:
+            flight.set_exception(error)
+        else:
+            flight.set_result(result)
+
+    async def run(self, chain: str, key: Optional[str], func: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        # Returns (result, shared); shared results came from another caller's call
+        while True:
+            flight, leader = self._join_flight(key)
+            if not leader:
+                try:
+                    return await _await_future(chain, flight), True
+                except _LeaderGone:
+                    continue
+            try:
+                async with self.slot(chain):
+                    result = await func()
+            except asyncio.CancelledError:
+                self._land(key, flight, error=_LeaderGone())
+                raise
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, result)
+            return result, False
+
+    def run_sync(self, chain: str, key: Optional[str], func: Callable[[], Any],
+                 cancel: Optional[CancelToken] = None) -> Tuple[Any, bool]:
+        while True:
+            flight, leader = self._join_flight(key)
+            if not leader:
+                try:
+                    return _wait_future(chain, flight, cancel), True
+                except _LeaderGone:
+                    continue
+            try:
+                with self.slot_sync(chain, cancel):
+                    result = func()
+                    if cancel is not None:
+                        cancel.cancel()  # Before our slot goes to a sibling attempt that lost
+            except AttemptAbandoned:
+                self._land(key, flight, error=_LeaderGone())  # Followers still want an answer
+                raise
+            except BaseException as e:
+                self._land(key, flight, error=e)
+                raise
+            self._land(key, flight, result)
+            return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            waiting_by_chain: Dict[str, int] = {}
+            waiting_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+            now = time.perf_counter()
+            oldest = 0.0
+            for _, _, waiter in self._waiting:
+                waiting_by_chain[waiter.chain] = waiting_by_chain.get(waiter.chain, 0) + 1
+                waiting_by_priority[PRIORITY_NAMES.get(waiter.priority, str(waiter.priority))] += 1
+                oldest = max(oldest, now - waiter.enqueued)
+            chains = set(self.chain_limits) | set(self.chain_in_flight) | set(waiting_by_chain)
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queue_depth": len(self._waiting),
+                "oldest_wait_ms": oldest * 1000,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+                "waiting": waiting_by_priority,
+                "coalescing": len(self._flights),
+                "chains": {
+                    chain: {
+                        "in_flight": self.chain_in_flight.get(chain, 0),
+                        "limit": self.chain_limits.get(chain, self.max_in_flight),
+                        "waiting": waiting_by_chain.get(chain, 0),
+                    }
+                    for chain in sorted(chains)
+                },
+                **self.counters,
+            }
+
+async def _await_future(chain: str, flight: Future) -> Any:
+    # Wait (within the deadline) for another caller's call without letting our
+    # own cancellation cancel the shared future (asyncio.wrap_future would
+    # propagate it)
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+
+    def copy(done: Future):
+        if waiter.done():
+            return
+        if done.exception() is not None:
+            waiter.set_exception(done.exception())
+        else:
+            waiter.set_result(done.result())
+
+    flight.add_done_callback(lambda done: loop.call_soon_threadsafe(copy, done))
+    left = remaining()
+    done, _ = await asyncio.wait({waiter}, timeout=None if left is None else max(left, 0.0))
+    if not done:
+        waiter.cancel()
+        raise deadline_exceeded(chain, f"Ran out of time waiting for a shared {chain} call")
+    return waiter.result()
+
+def _wait_future(chain: str, flight: Future, cancel: Optional[CancelToken]) -> Any:
+    # The sync counterpart; a cancelled caller stops waiting too
+    landed = threading.Event()
+    flight.add_done_callback(lambda done: landed.set())
+    if cancel is not None:
+        cancel.watch(landed)
+    left = remaining()
+    landed.wait(None if left is None else max(left, 0.0))
+    if flight.done():
+        return flight.result()
+    if cancel is not None and cancel.cancelled:
+        raise AttemptAbandoned(f"The {chain} call is no longer needed")
+    raise deadline_exceeded(chain, f"Ran out of time waiting for a shared {chain} call")
+
+def shared_generation(result):
+    # Coalesced callers get a copy with zero cost, like a cache hit, so token
+    # usage is only counted once
+    generations = []
+    for generation in result.generations:
+        message = getattr(generation, "message", None)
+        if message is not None and getattr(message, "usage_metadata", None):
+            message = message.model_copy(update={"usage_metadata": {**message.usage_metadata, "total_cost": 0}})
+            generation = generation.model_copy(update={"message": message})
+        generations.append(generation)
+    return result.model_copy(update={"generations": generations})
+
+scheduler = LLMScheduler(
+    config.LLM_MAX_IN_FLIGHT,
+    parse_chain_settings(config.LLM_CHAIN_LIMITS, int),
+    single_flight=config.LLM_SINGLE_FLIGHT_ENABLED
+)
+
+class ScheduledChatModel:
+    # Mixin placed before a chat model class. Generations and streams take a
+    # scheduler slot for the run's chain; identical non-streamed calls in
+    # flight at the same time share one upstream request. Timeouts, retries
+    # and hedging (src/services/llm_resilience.py) wrap each call; the attempt
+    # timeout only runs once the call holds its slot.
+
+    def _flight_key(self, messages, stop, kwargs) -> Optional[str]:
+        if not scheduler.single_flight:
+            return None
+        return hashlib.sha256((self._get_llm_string(stop=stop, **kwargs) + dumps(messages)).encode()).hexdigest()
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        generate = partial(super()._generate, messages, stop=stop, run_manager=run_manager, **kwargs)
+        if getattr(self, "streaming", False):
+            return generate()  # Served by _stream, which takes the slot
+        chain = chain_name(run_manager.tags if run_manager else None)
+        key = self._flight_key(messages, stop, kwargs)
+        # Each attempt (retry or hedge) queues for its own slot; hedges are never coalesced.
+        # The attempt timeout becomes the HTTP request's own timeout.
+        call = partial(within_attempt_timeout_sync, chain, lambda timeout: generate(timeout=timeout))
+        result, shared = resilient_call_sync(
+            chain, lambda hedged, cancel: scheduler.run_sync(chain, None if hedged else key, call, cancel),
+            lambda: scheduler.has_room(chain)
+        )
+        return shared_generation(result) if shared else result
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        generate = partial(super()._agenerate, messages, stop=stop, run_manager=run_manager, **kwargs)
+        if getattr(self, "streaming", False):
+            return await generate()
+        chain = chain_name(run_manager.tags if run_manager else None)
+        key = self._flight_key(messages, stop, kwargs)
+        call = partial(within_attempt_timeout, chain, generate)
+        result, shared = await resilient_call(
+            chain, lambda hedged: scheduler.run(chain, None if hedged else key, call),
+            lambda: scheduler.has_room(chain)
+        )
+        return shared_generation(result) if shared else result
+
+    def _run_chain(self, config) -> str:
+        # The tags the run will get, resolved the way stream()/astream() do
+        config = ensure_config(config)
+        return chain_name(CallbackManager.configure(config.get("callbacks"), None, False, config.get("tags"), self.tags).tags)
+
+    # stream()/astream() don't hand a run manager (or its tags) to _stream and
+    # _astream, so they take the slot themselves; _stream/_astream only do when
+    # called from a generation with a run manager
+
+    def stream(self, input, config=None, **kwargs):
+        with scheduler.slot_sync(self._run_chain(config)):
+            yield from super().stream(input, config, **kwargs)
+
+    async def astream(self, input, config=None, **kwargs):
+        chain = self._run_chain(config)
+        # Timed out or failed before the first chunk: retried within the deadline
+        async for chunk in resilient_stream(chain, lambda: super(ScheduledChatModel, self).astream(input, config, **kwargs),
+                                            lambda: scheduler.slot(chain)):
+            yield chunk
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        if run_manager is None:
+            yield from super()._stream(messages, stop=stop, **kwargs)
+            return
+        with scheduler.slot_sync(chain_name(run_manager.tags)):
+            yield from super()._stream(messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        if run_manager is None:
+            async for chunk in super()._astream(messages, stop=stop, **kwargs):
+                yield chunk
+            return
+        async with scheduler.slot(chain_name(run_manager.tags)):
+            async for chunk in super()._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+                yield chunk
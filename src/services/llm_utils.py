@@ -4,13 +4,52 @@ from typing import Dict, Any
 from langchain_openai import ChatOpenAI
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.globals import set_llm_cache
 from src.core.config import config
+from src.core.metrics import llm_tokens, timed
+from src.services.llm_cache import llm_cache
+from src.services.llm_scheduler import ScheduledChatModel, chain_name
 
-llm = ChatOpenAI(
+# Every chain shares this client, so the global cache covers router, SQL,
+# extraction, explain and recommend calls alike
+if llm_cache is not None:
+    set_llm_cache(llm_cache)
+
+class TokenUsageCallback(BaseCallbackHandler):
+    # Feeds churnbot_llm_tokens_total; each chain tags its runs with its name
+    def on_llm_end(self, response, *, tags=None, **kwargs):
+        chain = chain_name(tags)
+        counted = False
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if not usage:
+                    continue
+                counted = True
+                if "total_cost" in usage:
+                    continue  # Cache hit or coalesced call, marked with a zero cost
+                llm_tokens.inc(usage.get("input_tokens", 0), chain=chain, kind="prompt")
+                llm_tokens.inc(usage.get("output_tokens", 0), chain=chain, kind="completion")
+        if not counted:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            llm_tokens.inc(usage.get("prompt_tokens", 0), chain=chain, kind="prompt")
+            llm_tokens.inc(usage.get("completion_tokens", 0), chain=chain, kind="completion")
+
+class ScheduledChatOpenAI(ScheduledChatModel, ChatOpenAI):
+    pass
+
+llm = (ScheduledChatOpenAI if config.LLM_SCHEDULER_ENABLED else ChatOpenAI)(
     model=config.MODEL_NAME,
     openai_api_key=config.OPENAI_API_KEY,
     base_url=config.OPENROUTER_BASE,
-    temperature=0.0
+    temperature=0.0,
+    stream_usage=True,  # Report token usage for streamed responses too
+    # Backstop only: the scheduler enforces per-chain timeouts and retries
+    # with jitter inside the chat turn's deadline
+    timeout=config.LLM_TIMEOUT_SECONDS,
+    max_retries=0 if config.LLM_SCHEDULER_ENABLED else 2,
+    callbacks=[TokenUsageCallback()]
 )
 
 def generate_extraction_prompt(text: str) -> str:
@@ -27,9 +66,7 @@ Text: "{text}"
 JSON:
 """
 
-def parse_text_to_json(text: str) -> Dict[str, Any]:
-    prompt = generate_extraction_prompt(text)
-    response = llm.invoke(prompt).content
+def parse_extraction_response(response: str) -> Dict[str, Any]:
     json_match = re.search(r'\{.*\}', response, re.DOTALL)
     if json_match:
         try:
@@ -39,4 +76,15 @@ def parse_text_to_json(text: str) -> Dict[str, Any]:
             return data
         except:
             pass
-    return None
\ No newline at end of file
+    return None
+
+def parse_text_to_json(text: str) -> Dict[str, Any]:
+    prompt = generate_extraction_prompt(text)
+    response = llm.invoke(prompt, config={"tags": ["extraction"]}).content
+    return parse_extraction_response(response)
+
+@timed("feature_extraction")
+async def aparse_text_to_json(text: str) -> Dict[str, Any]:
+    prompt = generate_extraction_prompt(text)
+    response = (await llm.ainvoke(prompt, config={"tags": ["extraction"]})).content
+    return parse_extraction_response(response)
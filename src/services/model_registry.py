@@ -0,0 +1,122 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict
+import joblib
+from src.core.config import config
+
+logger = logging.getLogger(__name__)
+
+def _resident_bytes() -> int:
+    # Current RSS from /proc; 0 where it isn't available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class Artifact:
+    # A lazily loaded, process-wide model artifact with load metrics
+    def __init__(self, name: str, loader: Callable[[], Any], path: str = None):
+        self.name = name
+        self.loader = loader
+        self.path = path
+        self.value = None
+        self.load_seconds = None
+        self.resident_bytes = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        if self.value is None:
+            with self._lock:
+                if self.value is None:
+                    rss_before = _resident_bytes()
+                    start = time.perf_counter()
+                    value = self.loader()
+                    self.load_seconds = time.perf_counter() - start
+                    self.resident_bytes = max(_resident_bytes() - rss_before, 0)
+                    self.value = value
+                    logger.info(
+                        f"Loaded {self.name} in {self.load_seconds:.2f}s "
+                        f"(+{self.resident_bytes / 2**20:.1f} MiB resident)"
+                    )
+        return self.value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.value is not None,
+            "load_seconds": self.load_seconds,
+            "resident_bytes": self.resident_bytes,
+            "file_bytes": os.path.getsize(self.path) if self.path and os.path.exists(self.path) else None,
+        }
+
+def _load_joblib(path: str):
+    # mmap_mode only maps plain numpy arrays stored in the pickle. sklearn trees
+    # copy their node arrays into their own buffers on unpickling, so every
+    # process that loads the forest holds a private copy; serve.py workers
+    # share it by being forked after the parent has loaded it
+    return lambda: joblib.load(path, mmap_mode=config.MODEL_MMAP_MODE)
+
+def _build_explainer():
+    import shap  # Heavy import, only needed once SHAP is first used
+    return shap.TreeExplainer(get_model())
+
+def _build_fast_forest():
+    from src.services.fast_forest import build_fast_forest
+    return build_fast_forest()
+
+_artifacts = {
+    "model": Artifact("model", _load_joblib(config.MODEL_PATH), config.MODEL_PATH),
+    "preprocessor": Artifact("preprocessor", _load_joblib(config.PREPROCESSOR_PATH), config.PREPROCESSOR_PATH),
+    "explainer": Artifact("explainer", _build_explainer),
+    "fast_forest": Artifact("fast_forest", _build_fast_forest, config.FAST_FOREST_PATH),
+}
+_fast_forest_failed = False
+
+def get_model():
+    return _artifacts["model"].get()
+
+def get_preprocessor():
+    return _artifacts["preprocessor"].get()
+
+def get_explainer():
+    return _artifacts["explainer"].get()
+
+def get_fast_forest():
+    # None when the optional engine is disabled or could not be compiled;
+    # callers then use the sklearn path
+    global _fast_forest_failed
+    if not config.FAST_INFERENCE_ENABLED or _fast_forest_failed:
+        return None
+    try:
+        return _artifacts["fast_forest"].get()
+    except Exception as e:
+        _fast_forest_failed = True
+        logger.warning(f"Fast inference disabled, falling back to sklearn: {str(e)}")
+        return None
+
+def warm_up():
+    for name, artifact in _artifacts.items():
+        if name == "fast_forest":
+            get_fast_forest()
+        else:
+            artifact.get()
+
+def registry_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: artifact.stats() for name, artifact in _artifacts.items()}
+
+_model_version = None
+
+def get_model_version() -> str:
+    # Content hash of the model and preprocessor artifacts, so retraining invalidates stored scores
+    global _model_version
+    if _model_version is None:
+        digest = hashlib.sha256()
+        for path in (config.MODEL_PATH, config.PREPROCESSOR_PATH):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+        _model_version = digest.hexdigest()[:16]
+    return _model_version
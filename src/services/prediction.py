@@ -1,18 +1,23 @@
-import joblib
-import shap
 import pandas as pd
 import numpy as np
 import json
+import asyncio
+import logging
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from src.services.llm_utils import llm
+from src.services.llm_scheduler import BATCH, llm_priority
+from src.services.llm_resilience import LLMUnavailable
 from src.core.config import config
-from src.db.database import get_db_connection
+from src.core.metrics import llm_events, stage, timed
+from src.services.model_registry import get_model, get_preprocessor, get_fast_forest
+from src.services.shap_store import shap_rows, top_shap_factors, get_customer_factors
+from src.db.database import get_db_connection, run_db
+from src.db.write_behind import writer
 from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 
-model = joblib.load(config.MODEL_PATH)
-preprocessor = joblib.load(config.PREPROCESSOR_PATH)
-explainer = shap.TreeExplainer(model)
+logger = logging.getLogger(__name__)
 
 explain_prompt = PromptTemplate(
     template="""
@@ -27,83 +32,219 @@ Respond in {language} with no additional details.
     """,
     input_variables=["pred", "prob", "shap", "data", "language"]
 )
-explain_chain = LLMChain(llm=llm, prompt=explain_prompt)
+explain_chain = LLMChain(llm=llm, prompt=explain_prompt).with_config(tags=["explain"])
+# Plain runnable for token streaming (LLMChain only yields the final text)
+explain_stream = (explain_prompt | llm).with_config(tags=["explain"])
 
-def predict_and_explain(features: dict, query: str, customer_id: str = None, language: str = 'en') -> str:
+@timed("db_lookup")
+def get_customer_outcome(customer_id: str) -> Optional[Dict[str, Any]]:
+    # Known customers are answered from the dataset's ground truth
+    conn = get_db_connection()
     try:
-        if customer_id:
-            conn = get_db_connection()
-            try:
-                customer_df = pd.read_sql("SELECT * FROM customers WHERE CustomerId = ?", conn, params=(customer_id,))
-                if not customer_df.empty:
-                    customer_data = customer_df.iloc[0].to_dict()
-                    pred = int(customer_data["Exited"])
-                    prob = 1.0 if pred == 1 else 0.0
-
-                    explanation = explain_chain.invoke({
-                        "pred": pred,
-                        "prob": prob,
-                        "shap": "Ground truth from dataset",
-                        "data": customer_data,
-                        "language": language
-                    })['text']
-
-                    return (
-                        f"Customer Information:\n{json.dumps(customer_data, indent=2)}\n\n"
-                        f"{explanation}\n\n"
-                        f"Actual Churn: {pred} (1 = Churned, 0 = Retained)"
-                    )
-            finally:
-                conn.close()
+        customer_df = pd.read_sql("SELECT * FROM customers WHERE CustomerId = ?", conn, params=(customer_id,))
+        if customer_df.empty:
+            return None
+        return customer_df.iloc[0].to_dict()
+    finally:
+        conn.close()
 
-        # Model prediction for new customer
+def score_customer(features: dict) -> Tuple[int, float, Dict[str, float]]:
+    # CPU-bound part of a prediction: preprocessing, model and SHAP
+    engine = get_fast_forest()
+    if engine is not None:
+        # Single vectorized pass straight from the feature dict (preprocessing
+        # is part of it, so it is all recorded as "predict")
+        with stage("predict"):
+            pred, prob, processed = engine.predict_one(features)
+        with stage("shap"):
+            return pred, prob, top_shap_factors(shap_rows(processed[None, :])[0])
+
+    model, preprocessor = get_model(), get_preprocessor()
+    with stage("preprocess"):
         df = pd.DataFrame([features])
         processed = preprocessor.transform(df)
+    with stage("predict"):
         pred = int(model.predict(processed)[0])  # Ensure scalar
         prob = float(model.predict_proba(processed)[0][1])  # Ensure scalar for positive class
 
-        # Handle SHAP values
-        shap_values = explainer.shap_values(processed)
-        # For binary classification, select the positive class SHAP values
-        shap_vals = shap_values[1] if isinstance(shap_values, list) and len(shap_values) > 1 else shap_values
-        # Flatten if necessary
-        shap_vals = np.array(shap_vals).flatten()
-        shap_dict = dict(zip(preprocessor.get_feature_names_out(), shap_vals.tolist()))
-        top_factors = dict(sorted(shap_dict.items(), key=lambda x: abs(x[1]), reverse=True)[:3])
-
-        explanation = explain_chain.invoke({
-            "pred": pred,
-            "prob": prob,
-            "shap": top_factors,
-            "data": features,
-            "language": language
-        })['text']
+    # SHAP values, served from the attribution cache for repeated feature vectors
+    with stage("shap"):
+        return pred, prob, top_shap_factors(shap_rows(processed)[0])
+
+@timed("db_lookup")
+def known_customer_shap(customer_id: str) -> Any:
+    # Precomputed model attributions for a dataset customer, when available
+    return get_customer_factors(customer_id) or "Ground truth from dataset"
+
+PREDICTION_INSERT = """
+INSERT INTO predictions (customer_id, features, prediction, probability, timestamp)
+VALUES (?, ?, ?, ?, ?)
+"""
+
+def prediction_row(features: dict, pred: int, prob: float, customer_id: str = None) -> tuple:
+    return (
+        customer_id if customer_id else 'unknown',
+        json.dumps(features),
+        pred,
+        prob,
+        datetime.now().isoformat()
+    )
+
+@timed("persistence")
+def save_prediction(features: dict, pred: int, prob: float, customer_id: str = None):
+    # Queued; the write-behind writer commits it with the next batch
+    writer.submit(PREDICTION_INSERT, prediction_row(features, pred, prob, customer_id))
+
+@timed("persistence")
+async def asave_prediction(features: dict, pred: int, prob: float, customer_id: str = None):
+    await writer.asubmit(PREDICTION_INSERT, prediction_row(features, pred, prob, customer_id))
+
+@timed("persistence")
+def save_predictions(rows: List[tuple]):
+    # A batch is written in one transaction and committed before the response
+    # returns, rather than through the write-behind queue
+    conn = get_db_connection()
+    try:
+        with conn:
+            conn.executemany(PREDICTION_INSERT, rows)
+    finally:
+        conn.close()
+
+def explain_inputs(pred: int, prob: float, shap: Any, data: dict, language: str) -> Dict[str, Any]:
+    return {"pred": pred, "prob": prob, "shap": shap, "data": data, "language": language}
+
+def format_known_customer(customer_data: dict, explanation: str, pred: int) -> str:
+    return (
+        f"Customer Information:\n{json.dumps(customer_data, indent=2)}\n\n"
+        f"{explanation}\n\n"
+        f"Actual Churn: {pred} (1 = Churned, 0 = Retained)"
+    )
+
+def format_prediction(features: dict, explanation: str, pred: int, prob: float) -> str:
+    return (
+        f"Customer Information:\n{json.dumps(features, indent=2)}\n\n"
+        f"{explanation}\n\n"
+        f"Predicted Churn: {pred}, Probability: {prob:.2f}"
+    )
+
+EXPLANATION_UNAVAILABLE = (
+    "Explanation unavailable: the language model did not answer in time.",
+    "التفسير غير متاح: لم يستجب النموذج اللغوي في الوقت المحدد."
+)
+
+def explanation_unavailable(language: str) -> str:
+    llm_events.inc(chain="explain", event="degraded")
+    return EXPLANATION_UNAVAILABLE[0] if language == 'en' else EXPLANATION_UNAVAILABLE[1]
+
+def explain_prediction(inputs: Dict[str, Any]) -> str:
+    # Past the deadline (or with the provider down) the answer degrades to
+    # the numeric prediction without the narrative
+    try:
+        with stage("explain_llm"):
+            return explain_chain.invoke(inputs)['text']
+    except LLMUnavailable as e:
+        logger.warning(f"Explanation skipped: {str(e)}")
+        return explanation_unavailable(inputs["language"])
+
+async def aexplain_prediction(inputs: Dict[str, Any]) -> str:
+    try:
+        with stage("explain_llm"):
+            return (await explain_chain.ainvoke(inputs))['text']
+    except LLMUnavailable as e:
+        logger.warning(f"Explanation skipped: {str(e)}")
+        return explanation_unavailable(inputs["language"])
+
+def predict_and_explain(features: dict, query: str, customer_id: str = None, language: str = 'en') -> str:
+    try:
+        if customer_id:
+            customer_data = get_customer_outcome(customer_id)
+            if customer_data is not None:
+                pred = int(customer_data["Exited"])
+                prob = 1.0 if pred == 1 else 0.0
+                shap = known_customer_shap(customer_id)
+                explanation = explain_prediction(explain_inputs(pred, prob, shap, customer_data, language))
+                return format_known_customer(customer_data, explanation, pred)
+
+        # Model prediction for new customer
+        pred, prob, top_factors = score_customer(features)
+        explanation = explain_prediction(explain_inputs(pred, prob, top_factors, features, language))
+
+        # Save prediction to database
+        save_prediction(features, pred, prob, customer_id)
+
+        return format_prediction(features, explanation, pred, prob)
+    except Exception as e:
+        return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
+
+async def apredict_and_explain(features: dict, query: str, customer_id: str = None, language: str = 'en') -> str:
+    # Async variant: the explanation is awaited on the event loop and only the
+    # model/SHAP work is offloaded to a thread
+    try:
+        if customer_id:
+            customer_data = await run_db(get_customer_outcome, customer_id)
+            if customer_data is not None:
+                pred = int(customer_data["Exited"])
+                prob = 1.0 if pred == 1 else 0.0
+                shap = await run_db(known_customer_shap, customer_id)
+                explanation = await aexplain_prediction(explain_inputs(pred, prob, shap, customer_data, language))
+                return format_known_customer(customer_data, explanation, pred)
+
+        # Model prediction for new customer
+        pred, prob, top_factors = await asyncio.to_thread(score_customer, features)
+        explanation = await aexplain_prediction(explain_inputs(pred, prob, top_factors, features, language))
 
         # Save prediction to database
-        conn = get_db_connection()
-        try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                INSERT INTO predictions (customer_id, features, prediction, probability, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-                """,
-                (
-                    customer_id if customer_id else 'unknown',
-                    json.dumps(features),
-                    pred,
-                    prob,
-                    datetime.now().isoformat()
-                )
-            )
-            conn.commit()
-        finally:
-            conn.close()
-
-        return (
-            f"Customer Information:\n{json.dumps(features, indent=2)}\n\n"
-            f"{explanation}\n\n"
-            f"Predicted Churn: {pred}, Probability: {prob:.2f}"
-        )
+        await asave_prediction(features, pred, prob, customer_id)
+
+        return format_prediction(features, explanation, pred, prob)
     except Exception as e:
-        return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
\ No newline at end of file
+        return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
+
+def predict_batch(records: List[Dict[str, Any]], explain: bool = False, language: str = 'en', top_n: int = 3) -> List[Dict[str, Any]]:
+    # Preprocessing, prediction and SHAP run once over the whole matrix;
+    # LLM explanations are opt-in since they cost one call per row
+    if not records:
+        return []
+
+    model, preprocessor = get_model(), get_preprocessor()
+    df = pd.DataFrame(records)
+    processed = preprocessor.transform(df)
+    proba = model.predict_proba(processed)
+    # Same decision rule as RandomForestClassifier.predict, without a second pass over the forest
+    preds = model.classes_.take(np.argmax(proba, axis=1))
+    probs = proba[:, 1]
+
+    shap_matrix = shap_rows(processed)
+
+    results = []
+    for i, record in enumerate(records):
+        results.append({
+            "index": i,
+            "prediction": int(preds[i]),
+            "probability": float(probs[i]),
+            "top_factors": top_shap_factors(shap_matrix[i], top_n),
+            "explanation": None
+        })
+
+    if explain:
+        # Batch explanations queue behind interactive chat calls
+        with llm_priority(BATCH):
+            outputs = explain_chain.batch([
+                explain_inputs(r["prediction"], r["probability"], r["top_factors"], record, language)
+                for r, record in zip(results, records)
+            ], return_exceptions=True)
+        for r, output in zip(results, outputs):
+            if isinstance(output, LLMUnavailable):
+                r["explanation"] = explanation_unavailable(language)
+            elif isinstance(output, Exception):
+                raise output
+            else:
+                r["explanation"] = output['text']
+
+    timestamp = datetime.now().isoformat()
+    save_predictions([
+        ('unknown', json.dumps(record), r["prediction"], r["probability"], timestamp)
+        for r, record in zip(results, records)
+    ])
+
+    return results
@@ -1,6 +1,7 @@
 from typing import Dict, Any
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
+from src.core.metrics import timed
 from src.services.llm_utils import llm
 
 recommend_prompt = PromptTemplate(
@@ -11,7 +12,13 @@ Use bullet points and keep each recommendation short.
     """,
     input_variables=["data", "language"]
 )
-recommend_chain = LLMChain(llm=llm, prompt=recommend_prompt)
+recommend_chain = LLMChain(llm=llm, prompt=recommend_prompt).with_config(tags=["recommend"])
+# Plain runnable for token streaming (LLMChain only yields the final text)
+recommend_stream = (recommend_prompt | llm).with_config(tags=["recommend"])
 
 def recommend_actions(features: Dict[str, Any], query: str, language: str = 'en') -> str:
-    return recommend_chain.invoke({"data": features, "language": language})['text']
\ No newline at end of file
+    return recommend_chain.invoke({"data": features, "language": language})['text']
+
+@timed("recommend_llm")
+async def arecommend_actions(features: Dict[str, Any], query: str, language: str = 'en') -> str:
+    return (await recommend_chain.ainvoke({"data": features, "language": language}))['text']
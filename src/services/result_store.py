@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+import uuid
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import pandas as pd
+from src.core.config import config
+from src.db.database import get_db_connection, open_readonly_connection
+from src.services.sql_guard import guarded, validate_read_only
+
+# Result handles: a query's SQL is stored once and its rows are served page by
+# page or streamed as an export, instead of materializing the whole result
+# into a markdown string that ends up in messages and logs. Handles with an
+# order key (a unique sort over result columns) are paged by keyset: each page
+# returns a cursor holding the last row's key, and the next page seeks past it,
+# so pages stay stable and deep pages cost the same as the first.
+
+OrderKey = List[Tuple[str, str]]  # [(column, "asc" | "desc"), ...]
+
+def _order_by(order_key: OrderKey) -> str:
+    return ", ".join(f'"{column}" {direction.upper()}' for column, direction in order_key)
+
+def _after(order_key: OrderKey, values: Sequence[Any]) -> Tuple[str, List[Any]]:
+    # Rows strictly after the cursor in key order, e.g. for (p DESC, id ASC):
+    # p <= ? AND (p < ? OR (p = ? AND id > ?)). The leading bound gives the
+    # planner a single index range to seek into instead of an OR of scans.
+    clauses, params = [], [values[0]]
+    for i, (column, direction) in enumerate(order_key):
+        terms = [f'"{name}" = ?' for name, _ in order_key[:i]]
+        terms.append(f'"{column}" {"<" if direction == "desc" else ">"} ?')
+        clauses.append("(" + " AND ".join(terms) + ")")
+        params.extend(values[:i + 1])
+    first, first_direction = order_key[0]
+    bound = f'"{first}" {"<=" if first_direction == "desc" else ">="} ?'
+    return f"{bound} AND ({' OR '.join(clauses)})", params
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, order_key: OrderKey) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(values, list) or len(values) != len(order_key):
+        raise ValueError("Invalid cursor")
+    return values
+
+def _next_cursor(columns: List[str], order_key: OrderKey, row: Sequence[Any]) -> str:
+    return encode_cursor([row[columns.index(column)] for column, _ in order_key])
+
+def create_result(sql_query: str, params: Sequence[Any] = (), page_size: Optional[int] = None,
+                  order_key: Optional[OrderKey] = None) -> Dict[str, Any]:
+    # Runs the first page (plus one row to detect more) and records the handle
+    page_size = page_size or config.RESULT_PAGE_SIZE
+    sql_query = validate_read_only(sql_query)
+    order = f" ORDER BY {_order_by(order_key)}" if order_key else ""
+    first_page = f"SELECT * FROM ({sql_query}){order} LIMIT ?"
+    conn = get_db_connection()
+    try:
+        with guarded(conn, first_page, (*params, page_size + 1), label="result") as budget:
+            cursor = conn.execute(first_page, (*params, page_size + 1))
+            columns = [desc[0] for desc in cursor.description]
+            rows = [tuple(row) for row in cursor.fetchall()]
+            budget.add_rows(len(rows))
+            if len(rows) <= page_size:
+                total = len(rows)
+            else:
+                total = conn.execute(f"SELECT COUNT(*) FROM ({sql_query})", tuple(params)).fetchone()[0]
+
+        result_id = uuid.uuid4().hex
+        conn.execute(
+            """
+            INSERT INTO query_results (id, sql, params, columns, total_estimate, created_at, order_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (result_id, sql_query, json.dumps(list(params)), json.dumps(columns), total, datetime.now().isoformat(),
+             json.dumps(order_key) if order_key else None)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    result = {
+        "id": result_id,
+        "columns": columns,
+        "rows": rows[:page_size],
+        "page": 1,
+        "page_size": page_size,
+        "total_estimate": total,
+        "has_more": total > page_size,
+    }
+    if order_key:
+        result["next_cursor"] = _next_cursor(columns, order_key, rows[page_size - 1]) if result["has_more"] else None
+    return result
+
+def get_result(result_id: str) -> Optional[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        row = conn.execute("SELECT * FROM query_results WHERE id = ?", (result_id,)).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "sql": row["sql"],
+        "params": json.loads(row["params"]),
+        "columns": json.loads(row["columns"]),
+        "total_estimate": row["total_estimate"],
+        "order_key": [tuple(part) for part in json.loads(row["order_key"])] if row["order_key"] else None,
+    }
+
+def fetch_page(result_id: str, page: int = 1, page_size: Optional[int] = None,
+               cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    # Ordered handles page by cursor (page is ignored); others by page number
+    page_size = min(page_size or config.RESULT_PAGE_SIZE, config.RESULT_MAX_PAGE_SIZE)
+    handle = get_result(result_id)
+    if handle is None:
+        return None
+    order_key = handle["order_key"]
+    if order_key:
+        return _fetch_keyset_page(handle, cursor, page_size)
+    page_query = f"SELECT * FROM ({handle['sql']}) LIMIT ? OFFSET ?"
+    params = (*handle["params"], page_size + 1, (page - 1) * page_size)
+    conn = get_db_connection()
+    try:
+        with guarded(conn, page_query, params, label="page") as budget:
+            rows = [list(row) for row in conn.execute(page_query, params).fetchall()]
+            budget.add_rows(len(rows))
+    finally:
+        conn.close()
+    return {
+        "id": result_id,
+        "columns": handle["columns"],
+        "rows": rows[:page_size],
+        "page": page,
+        "page_size": page_size,
+        "total_estimate": handle["total_estimate"],
+        "has_more": len(rows) > page_size,
+        "next_page": page + 1 if len(rows) > page_size else None,
+    }
+
+def _fetch_keyset_page(handle: Dict[str, Any], cursor: Optional[str], page_size: int) -> Dict[str, Any]:
+    order_key = handle["order_key"]
+    where, key_params = _after(order_key, decode_cursor(cursor, order_key)) if cursor else ("1", [])
+    page_query = f"SELECT * FROM ({handle['sql']}) WHERE {where} ORDER BY {_order_by(order_key)} LIMIT ?"
+    params = (*handle["params"], *key_params, page_size + 1)
+    conn = get_db_connection()
+    try:
+        with guarded(conn, page_query, params, label="page") as budget:
+            rows = [list(row) for row in conn.execute(page_query, params).fetchall()]
+            budget.add_rows(len(rows))
+    finally:
+        conn.close()
+    has_more = len(rows) > page_size
+    return {
+        "id": handle["id"],
+        "columns": handle["columns"],
+        "rows": rows[:page_size],
+        "cursor": cursor,
+        "page_size": page_size,
+        "total_estimate": handle["total_estimate"],
+        "has_more": has_more,
+        "next_cursor": _next_cursor(handle["columns"], order_key, rows[page_size - 1]) if has_more else None,
+    }
+
+def iter_export(handle: Dict[str, Any], fmt: str) -> Iterator[str]:
+    # Streams every row in bounded chunks over a dedicated read-only
+    # connection, since the response may be consumed from several threads
+    conn = open_readonly_connection()
+    try:
+        with guarded(conn, handle["sql"], handle["params"], label="export",
+                     time_budget=config.SQL_EXPORT_TIME_BUDGET_SECONDS,
+                     max_rows=config.SQL_EXPORT_MAX_ROWS) as budget:
+            cursor = conn.execute(handle["sql"], handle["params"])
+            columns = [desc[0] for desc in cursor.description]
+            if fmt == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(columns)
+                yield buffer.getvalue()
+            while True:
+                rows = cursor.fetchmany(config.RESULT_EXPORT_CHUNK_SIZE)
+                if not rows:
+                    break
+                budget.add_rows(len(rows))
+                if fmt == "csv":
+                    buffer = io.StringIO()
+                    csv.writer(buffer).writerows(rows)
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+    finally:
+        conn.close()
+
+def format_result_summary(result: Dict[str, Any], language: str = 'en') -> str:
+    # Compact chat message: the first page as a table plus a pointer to the rest
+    table = pd.DataFrame(result["rows"], columns=result["columns"])
+    try:
+        text = table.to_markdown(index=False)
+    except ImportError:
+        # Fallback if tabulate is not installed
+        text = table.to_string(index=False)
+    if result["has_more"]:
+        shown, total = len(result["rows"]), result["total_estimate"]
+        if "id" not in result:
+            # Ranked in-memory result without a handle to page through
+            text += (
+                f"\n\nShowing the {shown} highest-probability rows of {total} matches."
+                if language == 'en' else
+                f"\n\nعرض أعلى {shown} صفوف احتمالاً من {total} نتيجة."
+            )
+            return text
+        result_id = result["id"]
+        next_page = f"cursor={result['next_cursor']}" if result.get("next_cursor") else "page=2"
+        text += (
+            f"\n\nShowing {shown} of {total} rows. Next page: /api/results/{result_id}?{next_page} "
+            f"(export: /api/results/{result_id}/export?format=csv)"
+            if language == 'en' else
+            f"\n\nعرض {shown} من {total} صف. الصفحة التالية: /api/results/{result_id}?{next_page} "
+            f"(تصدير: /api/results/{result_id}/export?format=csv)"
+        )
+    return text
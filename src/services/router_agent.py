@@ -1,60 +1,60 @@
 import re
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
-from src.services.llm_utils import llm, parse_text_to_json
-from src.services.prediction import predict_and_explain
-from src.services.recommendation import recommend_actions
+from src.services.llm_utils import llm, aparse_text_to_json
+from src.services.prediction import (
+    apredict_and_explain, get_customer_outcome, known_customer_shap, score_customer, asave_prediction,
+    explain_inputs, explain_stream, explanation_unavailable, format_known_customer, format_prediction
+)
+from src.services.recommendation import arecommend_actions, recommend_stream
 from src.services.sql import execute_sql_query, sql_chain  # Import sql_chain
-from src.db.database import get_db_connection
-from pandas import read_sql
+from src.services.result_store import create_result, format_result_summary
+from src.services.sql_guard import SQLGuardError, guarded, validate_read_only
+from src.services.scoring import FEATURE_COLUMNS
+from src.services.model_registry import get_model, get_preprocessor, get_model_version
+from src.services.intent_router import best_guess, fast_route, record_llm_route
+from src.services.llm_resilience import LLMUnavailable, start_deadline
+from src.services.history import count_tokens, message_text
+from src.db.database import get_db_connection, open_readonly_connection, run_db
+from src.db import crud
 import asyncio
+import heapq
 import logging
-from langdetect import detect
+import time
 import pandas as pd
 import numpy as np
 from src.core.config import config
-import joblib
+from src.core.metrics import current_tool, observe_stage, stage, timed, turn_seconds
 
 logger = logging.getLogger(__name__)
 
-model = joblib.load(config.MODEL_PATH)
-preprocessor = joblib.load(config.PREPROCESSOR_PATH)
-
-# Token estimation function (approximate: 1 token ≈ 4 characters)
-def estimate_tokens(text: str) -> int:
-    return len(text) // 4 + 1
-
 # Maximum token limit for gpt-4o-mini
 MAX_TOKENS = 8000
 # Reserve some tokens for the prompt and response
 RESERVED_TOKENS = 1000
 MAX_HISTORY_TOKENS = MAX_TOKENS - RESERVED_TOKENS
 
-def get_features_from_query(query: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
+async def get_features_from_query(query: str, history: List[Dict[str, str]]) -> Dict[str, Any]:
     if re.search(r'\d{8}', query):
         customer_id = re.search(r'\d{8}', query).group(0)
-        conn = get_db_connection()
-        try:
-            customer_df = read_sql("SELECT * FROM customers WHERE CustomerId = ?", conn, params=(customer_id,))
-            if customer_df.empty:
-                return None
-            return customer_df.iloc[0].to_dict()
-        finally:
-            conn.close()
+        with stage("db_lookup"):
+            return await run_db(crud.get_customer, customer_id)
     else:
-        features = parse_text_to_json(query)
+        features = await aparse_text_to_json(query)
         if features:
             return features
     
     if 'this customer' in query.lower() or 'the customer' in query.lower():
         for msg in reversed(history):
             if msg['role'] == 'user' and (re.search(r'\d{8}', msg['content']) or 'year-old' in msg['content']):
-                return get_features_from_query(msg['content'], [])
+                return await get_features_from_query(msg['content'], [])
     
     return None
 
+@timed("language_detection")
 def detect_language(query: str) -> str:
+    from langdetect import detect  # Deferred: loads language profiles on first import
     try:
         return detect(query)
     except:
@@ -77,7 +77,7 @@ Respond ONLY with the tool name: prediction_tool, recommendation_tool, sql_tool,
     """,
     input_variables=["history", "query"]
 )
-router_chain = LLMChain(llm=llm, prompt=router_prompt)
+router_chain = LLMChain(llm=llm, prompt=router_prompt).with_config(tags=["router"])
 
 def extract_probability_threshold(query: str) -> float:
     match = re.search(r'probability\s*(?:greater than|above)\s*([\d.]+)', query, re.IGNORECASE)
@@ -87,105 +87,394 @@ def extract_sql_conditions(query: str) -> str:
     conditions = re.split(r'with\s*churn\s*probability', query, flags=re.IGNORECASE)[0].strip()
     return conditions
 
+# Most at risk first, like the in-memory fallback; CustomerId makes the key
+# unique so result pages can be fetched by keyset
+SCORED_ORDER = [("ChurnProbability", "desc"), ("CustomerId", "asc")]
+
+class ScoresIncomplete(Exception):
+    # Some matched customers have no score from the current model (the
+    # 'scores' startup phase hasn't run yet, new customers, or a model swap)
+    pass
+
+def build_scored_query(sql_query: str) -> str:
+    # Join the generated conditions against the materialized scores so the
+    # threshold becomes a WHERE on the indexed probability column; scores of
+    # an older model version never match
+    return f"""
+    WITH matched AS ({validate_read_only(sql_query)})
+    SELECT matched.*, customer_scores.probability AS ChurnProbability
+    FROM matched
+    JOIN customer_scores ON customer_scores.CustomerId = matched.CustomerId
+                        AND customer_scores.model_version = ?
+    WHERE customer_scores.probability > ?
+    ORDER BY customer_scores.probability DESC, customer_scores.CustomerId
+    """
+
+def build_unscored_query(sql_query: str) -> str:
+    # Any matched customer without a current score
+    return f"""
+    WITH matched AS ({validate_read_only(sql_query)})
+    SELECT matched.CustomerId
+    FROM matched
+    LEFT JOIN customer_scores ON customer_scores.CustomerId = matched.CustomerId
+                             AND customer_scores.model_version = ?
+    WHERE customer_scores.CustomerId IS NULL
+    LIMIT 1
+    """
+
+def check_scores_current(sql_query: str, version: str):
+    # The join would silently drop unscored customers, so they send the
+    # query to the in-memory fallback instead
+    unscored = build_unscored_query(sql_query)
+    conn = get_db_connection()
+    try:
+        with guarded(conn, unscored, (version,), label="score_coverage"):
+            missing = conn.execute(unscored, (version,)).fetchone()
+    finally:
+        conn.close()
+    if missing is not None:
+        raise ScoresIncomplete(f"Customer {missing[0]} has no score from model {version}")
+
+def create_scored_result(sql_query: str, threshold: float) -> Dict[str, Any]:
+    version = get_model_version()
+    check_scores_current(sql_query, version)
+    return create_result(build_scored_query(sql_query), (version, threshold), order_key=SCORED_ORDER)
+
+def stream_scored_rows(sql_query: str, threshold: float, chunk_size: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    # Fallback for generated queries that don't expose CustomerId: reads,
+    # preprocesses and scores one chunk at a time and yields only the rows
+    # above the threshold, so memory stays flat however many customers match.
+    # Uses its own read-only connection since the consumer may advance it
+    # from different executor threads.
+    sql_query = validate_read_only(sql_query)
+    conn = open_readonly_connection()
+    try:
+        with guarded(conn, sql_query, label="score_stream",
+                     time_budget=config.SCORE_STREAM_TIME_BUDGET_SECONDS,
+                     max_rows=config.SCORE_STREAM_MAX_ROWS) as budget:
+            for chunk in pd.read_sql(sql_query, conn, chunksize=chunk_size or config.SCORE_STREAM_CHUNK_SIZE):
+                budget.add_rows(len(chunk))
+                processed = get_preprocessor().transform(chunk[FEATURE_COLUMNS])
+                chunk['ChurnProbability'] = get_model().predict_proba(processed)[:, 1]
+                yield chunk[chunk['ChurnProbability'] > threshold]
+    finally:
+        conn.close()
+
+class TopMatches:
+    # Running match count plus a bounded min-heap of the highest-probability rows
+    def __init__(self, top_k: int):
+        self.top_k = top_k
+        self.total = 0
+        self.columns: List[str] = []
+        self._heap: List[Tuple[float, int, tuple]] = []
+        self._seq = 0
+
+    def add(self, chunk: pd.DataFrame):
+        if not self.columns:
+            self.columns = list(chunk.columns)
+        self.total += len(chunk)
+        prob_index = self.columns.index('ChurnProbability')
+        for row in chunk.nlargest(self.top_k, 'ChurnProbability').itertuples(index=False, name=None):
+            self._seq += 1
+            item = (row[prob_index], self._seq, row)
+            if len(self._heap) < self.top_k:
+                heapq.heappush(self._heap, item)
+            elif item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+
+    def result(self) -> Dict[str, Any]:
+        rows = [list(row) for _, _, row in sorted(self._heap, key=lambda item: (-item[0], item[1]))]
+        return {"columns": self.columns, "rows": rows, "total_estimate": self.total, "has_more": self.total > len(rows)}
+
+def fetch_above_threshold(sql_query: str, threshold: float) -> Dict[str, Any]:
+    # Materialized scores give a paged result handle; the streaming fallback
+    # keeps the match count and the top PROBABILITY_FILTER_TOP_K rows
+    try:
+        return create_scored_result(sql_query, threshold)
+    except SQLGuardError:
+        # Rejected or over budget; rerunning it in memory would only cost more
+        raise
+    except Exception as e:
+        logger.info(f"Falling back to in-memory scoring: {str(e)}")
+    top = TopMatches(config.PROBABILITY_FILTER_TOP_K)
+    for chunk in stream_scored_rows(sql_query, threshold):
+        top.add(chunk)
+    return top.result()
+
+async def generate_filter_sql(query: str) -> Tuple[str, float]:
+    # Extract conditions and threshold, then generate SQL for the conditions
+    conditions = extract_sql_conditions(query)
+    threshold = extract_probability_threshold(query)
+    with stage("sql_generation"):
+        sql_query = await sql_chain.ainvoke({"query": conditions})
+    return sql_query['text'].strip(), threshold
+
+NO_MATCHES = (
+    "No customers found with churn probability above the threshold.",
+    "لم يتم العثور على عملاء باحتمالية التسرب فوق الحد."
+)
+
 async def probability_filter_query(query: str, language: str = 'en') -> str:
     try:
-        conn = get_db_connection()
-        try:
-            # Extract conditions and threshold
-            conditions = extract_sql_conditions(query)
-            threshold = extract_probability_threshold(query)
-            
-            # Generate SQL query for conditions
-            sql_query = await sql_chain.ainvoke({"query": conditions})
-            sql_query = sql_query['text'].strip()
-            
-            # Fetch matching customers
-            df = pd.read_sql(sql_query, conn)
-            if df.empty:
-                return "No customers found matching the criteria." if language == 'en' else "لم يتم العثور على عملاء مطابقين للمعايير."
-            
-            # Compute churn probabilities
-            features = df[['CreditScore', 'Geography', 'Gender', 'Age', 'Tenure', 'Balance', 
-                          'NumOfProducts', 'HasCrCard', 'IsActiveMember', 'EstimatedSalary']]
-            processed = preprocessor.transform(features)
-            probs = model.predict_proba(processed)[:, 1]
-            
-            # Filter by probability
-            df['ChurnProbability'] = probs
-            filtered_df = df[df['ChurnProbability'] > threshold]
-            
-            if filtered_df.empty:
-                return "No customers found with churn probability above the threshold." if language == 'en' else "لم يتم العثور على عملاء باحتمالية التسرب فوق الحد."
-            
-            return filtered_df.to_markdown(index=False)
-        finally:
-            conn.close()
+        sql_query, threshold = await generate_filter_sql(query)
+        
+        with stage("sql_execution"):
+            result = await run_db(fetch_above_threshold, sql_query, threshold)
+        
+        if not result["rows"]:
+            return localize(NO_MATCHES, language)
+        
+        return format_result_summary(result, language)
+    except LLMUnavailable:
+        return localize(LLM_UNAVAILABLE, language)
     except Exception as e:
         return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
 
+async def stream_probability_filter(query: str, language: str = 'en') -> AsyncIterator[Tuple[str, Any]]:
+    # Streaming counterpart of probability_filter_query: when the fallback has
+    # to score in memory, yields ("rows", payload) for the matches of each
+    # chunk as soon as it is scored, then ("result", text) with the summary
+    try:
+        sql_query, threshold = await generate_filter_sql(query)
+        try:
+            with stage("sql_execution"):
+                result = await run_db(create_scored_result, sql_query, threshold)
+        except SQLGuardError:
+            raise
+        except Exception as e:
+            logger.info(f"Falling back to in-memory scoring: {str(e)}")
+            top = TopMatches(config.PROBABILITY_FILTER_TOP_K)
+            chunks = stream_scored_rows(sql_query, threshold)
+            waited = 0.0  # Scoring time only, not the time spent emitting rows
+            try:
+                while True:
+                    started = time.perf_counter()
+                    chunk = await run_db(next, chunks, None)
+                    waited += time.perf_counter() - started
+                    if chunk is None:
+                        break
+                    top.add(chunk)
+                    if not chunk.empty:
+                        yield "rows", {"columns": list(chunk.columns), "rows": chunk.values.tolist()}
+            finally:
+                await run_db(chunks.close)
+                observe_stage("sql_execution", waited)
+            result = top.result()
+        
+        if not result["rows"]:
+            yield "result", localize(NO_MATCHES, language)
+        else:
+            yield "result", format_result_summary(result, language)
+    except LLMUnavailable:
+        yield "result", localize(LLM_UNAVAILABLE, language)
+    except Exception as e:
+        yield "result", f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
+
+INPUT_TOO_LARGE = (
+    "Error: Input too large, even after truncating history. Please shorten your query or clear chat history.",
+    "خطأ: الإدخال كبير جدًا، حتى بعد تقليص السجل. يرجى تقصير الطلب أو مسح سجل الدردشة."
+)
+CUSTOMER_NOT_FOUND = ("Customer data not found or invalid.", "بيانات العميل غير موجودة أو غير صالحة.")
+INVALID_QUERY = ("Invalid query type.", "نوع الطلب غير صالح.")
+LLM_UNAVAILABLE = (
+    "The language model did not respond in time. Please try again.",
+    "لم يستجب النموذج اللغوي في الوقت المحدد. يرجى المحاولة مرة أخرى."
+)
+
+def localize(message: Tuple[str, str], language: str) -> str:
+    return message[0] if language == 'en' else message[1]
+
+def truncate_history(query: str, history: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    # Keep the newest messages that fit the history token budget, using the
+    # counts load_history attached to each message
+    query_tokens = count_tokens(query)
+    budget = min(config.HISTORY_TOKEN_BUDGET, MAX_HISTORY_TOKENS - query_tokens)
+    truncated_history = []
+    history_tokens = 0
+    
+    # Add messages from history (most recent first) until the budget is spent
+    for msg in reversed(history):
+        msg_tokens = msg.get("tokens") or count_tokens(message_text(msg['role'], msg['content']))
+        if history_tokens + msg_tokens <= budget:
+            truncated_history.insert(0, msg)  # Insert at beginning to maintain order
+            history_tokens += msg_tokens
+        else:
+            logger.info(f"Truncating history: message '{msg['content'][:30]}...' exceeds token budget")
+            break
+    
+    total_tokens = query_tokens + history_tokens
+    
+    # Log token usage
+    logger.info(f"Tokens: query={query_tokens}, history={history_tokens}, total={total_tokens}")
+    return truncated_history, total_tokens
+
+async def select_tool(query: str, truncated_history: List[Dict[str, str]]) -> str:
+    with stage("fast_router"):
+        tool_name = fast_route(query)
+    if tool_name is None:
+        history_str = "\n".join([message_text(msg['role'], msg['content']) for msg in truncated_history])
+        try:
+            with stage("router_llm"):
+                response = await router_chain.ainvoke({"history": history_str, "query": query})
+        except LLMUnavailable:
+            # Fall back to the best keyword match, however weak
+            tool_name = best_guess(query)
+            if tool_name is None:
+                raise
+            logger.warning(f"Router LLM unavailable, guessed {tool_name}")
+            return tool_name
+        tool_name = response['text'].strip().lower()
+        record_llm_route(tool_name)
+    return tool_name
+
 async def route_query(query: str, history: List[Dict[str, str]]) -> str:
+    started = time.perf_counter()
+    start_deadline(config.CHAT_DEADLINE_SECONDS)  # Every LLM call of this turn fits in it
     language = detect_language(query)  # Define language early
     try:
-        # Truncate history to fit within token limit
-        total_tokens = estimate_tokens(query)
-        truncated_history = []
-        history_tokens = 0
+        truncated_history, total_tokens = truncate_history(query, history)
         
-        # Add messages from history (most recent first) until token limit is reached
-        for msg in reversed(history[-4:]):  # Limit to last 4 messages initially
-            msg_text = f"{msg['role']}: {msg['content']}"
-            msg_tokens = estimate_tokens(msg_text)
-            if history_tokens + msg_tokens + total_tokens <= MAX_HISTORY_TOKENS:
-                truncated_history.insert(0, msg)  # Insert at beginning to maintain order
-                history_tokens += msg_tokens
-            else:
-                logger.info(f"Truncating history: message '{msg_text[:30]}...' exceeds token limit")
-                break
+        # Check if total tokens still exceed limit
+        if total_tokens > MAX_TOKENS:
+            return localize(INPUT_TOO_LARGE, language)
         
-        history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in truncated_history])
-        total_tokens += history_tokens
+        tool_name = await select_tool(query, truncated_history)
+        current_tool.set(tool_name)
         
-        # Log token usage
-        logger.info(f"Estimated tokens: query={estimate_tokens(query)}, history={history_tokens}, total={total_tokens}")
+        if "prediction" in tool_name:
+            features = await get_features_from_query(query, truncated_history)
+            if not features:
+                return localize(CUSTOMER_NOT_FOUND, language)
+            customer_id = features.get('CustomerId')
+            result = await apredict_and_explain(features, query, customer_id, language)
+        elif "recommendation" in tool_name:
+            features = await get_features_from_query(query, truncated_history)
+            if not features:
+                return localize(CUSTOMER_NOT_FOUND, language)
+            result = await arecommend_actions(features, query, language)
+        elif "sql" in tool_name:
+            result = await execute_sql_query(query, language)
+        elif "probability_filter" in tool_name:
+            result = await probability_filter_query(query, language)
+        else:
+            return localize(INVALID_QUERY, language)
         
-        # Check if total tokens still exceed limit
+        latency = time.perf_counter() - started
+        turn_seconds.observe(latency, tool=tool_name)
+        await crud.queue_log(query, str(result), tool_name, latency * 1000)
+        return result
+    except LLMUnavailable as e:
+        logger.warning(f"LLM unavailable in route_query: {str(e)}")
+        return localize(LLM_UNAVAILABLE, language)
+    except Exception as e:
+        logger.error(f"Error in route_query: {str(e)}")
+        return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
+
+async def stream_tokens(runnable, inputs: Dict[str, Any], stage_name: str) -> AsyncIterator[str]:
+    # Records only the time spent waiting on the LLM, not on the consumer
+    waited = 0.0
+    stream = runnable.astream(inputs).__aiter__()
+    while True:
+        started = time.perf_counter()
+        try:
+            chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            break
+        finally:
+            waited += time.perf_counter() - started
+        if chunk.content:
+            yield chunk.content
+    observe_stage(stage_name, waited)
+
+async def stream_route_query(query: str, history: List[Dict[str, str]]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    # Streaming counterpart of route_query. Yields (event, payload) pairs:
+    # "route" once the tool is chosen, "prediction" as soon as the model has
+    # scored, "token" for each LLM chunk, and a final "done" with the
+    # assembled response (the same text route_query would have returned).
+    started = time.perf_counter()
+    start_deadline(config.CHAT_DEADLINE_SECONDS)
+    language = detect_language(query)
+    try:
+        truncated_history, total_tokens = truncate_history(query, history)
         if total_tokens > MAX_TOKENS:
-            return (
-                "Error: Input too large, even after truncating history. Please shorten your query or clear chat history."
-                if language == 'en' else
-                "خطأ: الإدخال كبير جدًا، حتى بعد تقليص السجل. يرجى تقصير الطلب أو مسح سجل الدردشة."
-            )
+            yield "done", {"response": localize(INPUT_TOO_LARGE, language)}
+            return
         
-        response = await router_chain.ainvoke({"history": history_str, "query": query})
-        tool_name = response['text'].strip().lower()
+        tool_name = await select_tool(query, truncated_history)
+        current_tool.set(tool_name)
+        yield "route", {"tool": tool_name}
         
-        conn = get_db_connection()
-        try:
-            cursor = conn.cursor()
-            
-            if "prediction" in tool_name:
-                features = get_features_from_query(query, truncated_history)
-                if not features:
-                    return "Customer data not found or invalid." if language == 'en' else "بيانات العميل غير موجودة أو غير صالحة."
-                customer_id = features.get('CustomerId')
-                result = await asyncio.to_thread(predict_and_explain, features, query, customer_id, language)
-            elif "recommendation" in tool_name:
-                features = get_features_from_query(query, truncated_history)
-                if not features:
-                    return "Customer data not found or invalid." if language == 'en' else "بيانات العميل غير موجودة أو غير صالحة."
-                result = await asyncio.to_thread(recommend_actions, features, query, language)
-            elif "sql" in tool_name:
-                result = await execute_sql_query(query, language)
-            elif "probability_filter" in tool_name:
-                result = await probability_filter_query(query, language)
+        if "prediction" in tool_name or "recommendation" in tool_name:
+            features = await get_features_from_query(query, truncated_history)
+            if not features:
+                yield "done", {"response": localize(CUSTOMER_NOT_FOUND, language)}
+                return
+        
+        if "prediction" in tool_name:
+            customer_id = features.get('CustomerId')
+            customer_data = await run_db(get_customer_outcome, customer_id) if customer_id else None
+            if customer_data is not None:
+                pred = int(customer_data["Exited"])
+                prob = 1.0 if pred == 1 else 0.0
+                yield "prediction", {"prediction": pred, "probability": prob, "ground_truth": True}
+                shap = await run_db(known_customer_shap, customer_id)
+                inputs = explain_inputs(pred, prob, shap, customer_data, language)
             else:
-                return "Invalid query type." if language == 'en' else "نوع الطلب غير صالح."
+                pred, prob, top_factors = await asyncio.to_thread(score_customer, features)
+                yield "prediction", {"prediction": pred, "probability": prob, "top_factors": top_factors}
+                inputs = explain_inputs(pred, prob, top_factors, features, language)
             
-            cursor.execute("INSERT INTO logs (query, response) VALUES (?, ?)", (query, str(result)))
-            conn.commit()
-            return result
-        finally:
-            conn.close()
+            parts = []
+            try:
+                async for text in stream_tokens(explain_stream, inputs, "explain_llm"):
+                    parts.append(text)
+                    yield "token", {"text": text}
+            except LLMUnavailable as e:
+                # The prediction event already went out; close with a notice
+                logger.warning(f"Explanation stream cut short: {str(e)}")
+                notice = ("\n\n" if parts else "") + explanation_unavailable(language)
+                parts.append(notice)
+                yield "token", {"text": notice}
+            
+            if customer_data is not None:
+                result = format_known_customer(customer_data, "".join(parts), pred)
+            else:
+                await asave_prediction(features, pred, prob, customer_id)
+                result = format_prediction(features, "".join(parts), pred, prob)
+        elif "recommendation" in tool_name:
+            parts = []
+            try:
+                async for text in stream_tokens(recommend_stream, {"data": features, "language": language}, "recommend_llm"):
+                    parts.append(text)
+                    yield "token", {"text": text}
+            except LLMUnavailable as e:
+                if not parts:
+                    raise
+                # Keep the recommendations the client has already shown and say they were cut off
+                logger.warning(f"Recommendation stream cut short: {str(e)}")
+                notice = "\n\n" + localize(LLM_UNAVAILABLE, language)
+                parts.append(notice)
+                yield "token", {"text": notice}
+            result = "".join(parts)
+        elif "sql" in tool_name:
+            result = await execute_sql_query(query, language)
+        elif "probability_filter" in tool_name:
+            async for event, data in stream_probability_filter(query, language):
+                if event == "rows":
+                    yield event, data
+                else:
+                    result = data
+        else:
+            yield "done", {"response": localize(INVALID_QUERY, language)}
+            return
+        
+        latency = time.perf_counter() - started
+        turn_seconds.observe(latency, tool=tool_name)
+        await crud.queue_log(query, str(result), tool_name, latency * 1000)
+        yield "done", {"response": result}
+    except LLMUnavailable as e:
+        logger.warning(f"LLM unavailable in stream_route_query: {str(e)}")
+        yield "done", {"response": localize(LLM_UNAVAILABLE, language)}
     except Exception as e:
-        logger.error(f"Error in route_query: {str(e)}")
-        return f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"
\ No newline at end of file
+        logger.error(f"Error in stream_route_query: {str(e)}")
+        yield "done", {"response": f"Error: {str(e)}" if language == 'en' else f"خطأ: {str(e)}"}
@@ -0,0 +1,69 @@
+import argparse
+import logging
+from datetime import datetime
+from typing import Dict
+import pandas as pd
+from src.core.config import config
+from src.db.database import get_db_connection, init_db
+from src.services.model_registry import get_model, get_preprocessor, get_model_version
+
+logger = logging.getLogger(__name__)
+
+FEATURE_COLUMNS = ['CreditScore', 'Geography', 'Gender', 'Age', 'Tenure', 'Balance',
+                   'NumOfProducts', 'HasCrCard', 'IsActiveMember', 'EstimatedSalary']
+
+def feature_hashes(df: pd.DataFrame) -> pd.Series:
+    return pd.util.hash_pandas_object(df[FEATURE_COLUMNS], index=False).astype(str)
+
+def rebuild_customer_scores(full: bool = False) -> Dict[str, int]:
+    # Refresh customer_scores; only rows whose features or model version changed are rescored
+    version = get_model_version()
+    conn = get_db_connection()
+    try:
+        customers = pd.read_sql(f"SELECT CustomerId, {', '.join(FEATURE_COLUMNS)} FROM customers", conn)
+        customers['feature_hash'] = feature_hashes(customers)
+
+        existing = pd.read_sql("SELECT CustomerId, feature_hash, model_version FROM customer_scores", conn)
+        if full or existing.empty:
+            stale = customers
+        else:
+            merged = customers.merge(existing, on='CustomerId', how='left', suffixes=('', '_stored'))
+            changed = (merged['feature_hash_stored'] != merged['feature_hash']) | (merged['model_version'] != version)
+            stale = customers[changed.to_numpy()]
+
+        scored_at = datetime.now().isoformat()
+        for start in range(0, len(stale), config.SCORE_CHUNK_SIZE):
+            chunk = stale.iloc[start:start + config.SCORE_CHUNK_SIZE]
+            probs = get_model().predict_proba(get_preprocessor().transform(chunk[FEATURE_COLUMNS]))[:, 1]
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO customer_scores (CustomerId, probability, model_version, feature_hash, scored_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    zip(chunk['CustomerId'].astype(int).tolist(), probs.tolist(),
+                        [version] * len(chunk), chunk['feature_hash'].tolist(), [scored_at] * len(chunk))
+                )
+
+        # Drop scores for customers that no longer exist
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM customer_scores WHERE CustomerId NOT IN (SELECT CustomerId FROM customers)"
+            ).rowcount
+
+        stats = {"customers": len(customers), "rescored": len(stale), "removed": removed}
+        logger.info(f"Customer scores refreshed (model {version}): {stats}")
+        return stats
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from src.core.config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Rebuild the materialized customer_scores table")
+    parser.add_argument("--full", action="store_true", help="Rescore every customer instead of only changed rows")
+    args = parser.parse_args()
+
+    setup_logging()
+    init_db()
+    print(rebuild_customer_scores(full=args.full))
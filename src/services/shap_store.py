@@ -0,0 +1,164 @@
+import json
+import hashlib
+import logging
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+import numpy as np
+import pandas as pd
+from src.core.config import config
+from src.db.database import get_db_connection, init_db
+from src.services.model_registry import get_explainer, get_preprocessor, get_model_version
+from src.services.scoring import FEATURE_COLUMNS, feature_hashes
+
+logger = logging.getLogger(__name__)
+
+def positive_class_shap(shap_values) -> np.ndarray:
+    # Normalize to an (n_rows, n_features) matrix for the positive class.
+    # Older shap releases return one array per class, newer ones a single
+    # (n_rows, n_features, n_classes) array
+    if isinstance(shap_values, list):
+        shap_values = shap_values[1] if len(shap_values) > 1 else shap_values[0]
+    shap_values = np.asarray(shap_values)
+    if shap_values.ndim == 3:
+        shap_values = shap_values[:, :, 1]
+    return shap_values.reshape(shap_values.shape[0], -1)
+
+def top_shap_factors(shap_row: np.ndarray, top_n: int = 3) -> Dict[str, float]:
+    feature_names = get_preprocessor().get_feature_names_out()
+    order = np.argsort(-np.abs(shap_row))[:top_n]
+    return {feature_names[j]: float(shap_row[j]) for j in order}
+
+class ShapCache:
+    # Content-addressed LRU of SHAP rows, keyed on the preprocessed feature
+    # vector and the model version
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(vector: np.ndarray) -> str:
+        digest = hashlib.sha256(get_model_version().encode())
+        digest.update(np.ascontiguousarray(vector, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: np.ndarray):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+shap_cache = ShapCache(config.SHAP_CACHE_ENTRIES)
+
+def shap_rows(processed) -> np.ndarray:
+    # SHAP matrix for preprocessed rows; only cache misses go through the explainer
+    processed = np.asarray(processed)
+    keys = [ShapCache.make_key(row) for row in processed]
+    rows = [shap_cache.get(key) for key in keys]
+    # Identical vectors within one call are explained once
+    missing = {}
+    for i, row in enumerate(rows):
+        if row is None:
+            missing.setdefault(keys[i], i)
+    if missing:
+        computed = positive_class_shap(get_explainer().shap_values(processed[list(missing.values())]))
+        for key, row in zip(missing, computed):
+            shap_cache.put(key, row)
+        by_key = dict(zip(missing, computed))
+        rows = [row if row is not None else by_key[key] for row, key in zip(rows, keys)]
+    return np.vstack(rows)
+
+def get_customer_factors(customer_id: str, top_n: int = 3) -> Optional[Dict[str, float]]:
+    # Precomputed attributions for a known customer, if current for this model
+    conn = get_db_connection()
+    try:
+        row = conn.execute(
+            "SELECT shap_values FROM customer_shap WHERE CustomerId = ? AND model_version = ?",
+            (customer_id, get_model_version())
+        ).fetchone()
+    finally:
+        conn.close()
+    if row is None:
+        return None
+    return top_shap_factors(np.asarray(json.loads(row["shap_values"])), top_n)
+
+def precompute_customer_shap(full: bool = False) -> Dict[str, int]:
+    # Bulk-compute SHAP rows for customers whose features or model version changed
+    version = get_model_version()
+    conn = get_db_connection()
+    try:
+        customers = pd.read_sql(f"SELECT CustomerId, {', '.join(FEATURE_COLUMNS)} FROM customers", conn)
+        customers['feature_hash'] = feature_hashes(customers)
+
+        existing = pd.read_sql("SELECT CustomerId, feature_hash, model_version FROM customer_shap", conn)
+        if full or existing.empty:
+            stale = customers
+        else:
+            merged = customers.merge(existing, on='CustomerId', how='left', suffixes=('', '_stored'))
+            changed = (merged['feature_hash_stored'] != merged['feature_hash']) | (merged['model_version'] != version)
+            stale = customers[changed.to_numpy()]
+
+        preprocessor, explainer = get_preprocessor(), get_explainer()
+        computed_at = datetime.now().isoformat()
+        for start in range(0, len(stale), config.SHAP_CHUNK_SIZE):
+            chunk = stale.iloc[start:start + config.SHAP_CHUNK_SIZE]
+            matrix = positive_class_shap(explainer.shap_values(preprocessor.transform(chunk[FEATURE_COLUMNS])))
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT OR REPLACE INTO customer_shap (CustomerId, model_version, feature_hash, shap_values, computed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    zip(chunk['CustomerId'].astype(int).tolist(), [version] * len(chunk),
+                        chunk['feature_hash'].tolist(), [json.dumps(row.tolist()) for row in matrix],
+                        [computed_at] * len(chunk))
+                )
+            logger.info(f"SHAP precompute: {min(start + config.SHAP_CHUNK_SIZE, len(stale))}/{len(stale)} rows")
+
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM customer_shap WHERE CustomerId NOT IN (SELECT CustomerId FROM customers)"
+            ).rowcount
+
+        stats = {"customers": len(customers), "computed": len(stale), "removed": removed}
+        logger.info(f"Customer SHAP attributions refreshed (model {version}): {stats}")
+        return stats
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    from src.core.config import setup_logging
+
+    parser = argparse.ArgumentParser(description="Precompute SHAP attributions for every customer")
+    parser.add_argument("--full", action="store_true", help="Recompute every customer instead of only changed rows")
+    args = parser.parse_args()
+
+    setup_logging()
+    init_db()
+    print(precompute_customer_shap(full=args.full))
@@ -2,8 +2,9 @@ from langchain.prompts import PromptTemplate
 from langchain.chains import LLMChain
 from src.services.llm_utils import llm
 from src.core.config import config
-from src.db.database import get_db_connection
-import pandas as pd
+from src.core.metrics import stage
+from src.db.database import run_db
+from src.services.result_store import create_result, format_result_summary
 import sqlite3
 
 sql_prompt = PromptTemplate(
@@ -24,33 +25,23 @@ Examples:
     """,
     input_variables=["query"]
 )
-sql_chain = LLMChain(llm=llm, prompt=sql_prompt)
+sql_chain = LLMChain(llm=llm, prompt=sql_prompt).with_config(tags=["sql"])
 
 async def execute_sql_query(query: str, language: str = 'en') -> str:
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
         # Generate SQL query
-        sql_query = await sql_chain.ainvoke({"query": query})
+        with stage("sql_generation"):
+            sql_query = await sql_chain.ainvoke({"query": query})
         sql_query = sql_query['text'].strip()
         
-        # Execute query
-        cursor.execute(sql_query)
-        results = cursor.fetchall()
-        columns = [desc[0] for desc in cursor.description]
+        # Run the first page off the event loop and keep a handle for the rest
+        with stage("sql_execution"):
+            result = await run_db(create_result, sql_query)
         
         # Format results
-        if not results:
+        if not result["rows"]:
             return "No results found." if language == 'en' else "لا توجد نتائج."
         
-        df = pd.DataFrame(results, columns=columns)
-        try:
-            return df.to_markdown(index=False)
-        except ImportError:
-            # Fallback if tabulate is not installed
-            return df.to_string(index=False)
+        return format_result_summary(result, language)
     except sqlite3.Error as e:
         return f"SQL Error: {str(e)}" if language == 'en' else f"خطأ SQL: {str(e)}"
-    finally:
-        conn.close()
\ No newline at end of file
@@ -0,0 +1,170 @@
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from src.core.config import config
+from src.db.database import get_db_connection
+from src.db.write_behind import writer
+
+logger = logging.getLogger(__name__)
+
+class SQLGuardError(sqlite3.DatabaseError):
+    # Raised when generated SQL is rejected or exceeds its budget; subclasses
+    # sqlite3.Error so existing "SQL Error" handling reports it to the user
+    pass
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'")
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_NUMBERS = re.compile(r"\b\d+(?:\.\d+)?\b")
+# REPLACE only as a statement ("WITH ... REPLACE INTO"); INSERT OR REPLACE is
+# caught by INSERT, and the replace() string function stays allowed
+_FORBIDDEN = re.compile(
+    r"\b(INSERT|UPDATE|DELETE|REPLACE(?=\s+INTO\b)|UPSERT|DROP|ALTER|CREATE|ATTACH|DETACH|PRAGMA|VACUUM|REINDEX|ANALYZE|BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE)\b",
+    re.IGNORECASE
+)
+
+# Authorizer actions a read-only query may need
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+def validate_read_only(sql_query: str) -> str:
+    # Returns the cleaned statement or raises SQLGuardError
+    sql_query = sql_query.strip().rstrip(';').strip()
+    code = _COMMENTS.sub(' ', _LITERALS.sub("''", sql_query))
+    if not sql_query:
+        raise SQLGuardError("Empty SQL statement")
+    if ';' in code:
+        raise SQLGuardError("Only a single SQL statement is allowed")
+    if not re.match(r"\s*(SELECT|WITH)\b", code, re.IGNORECASE):
+        raise SQLGuardError("Only SELECT queries are allowed")
+    forbidden = _FORBIDDEN.search(code)
+    if forbidden:
+        raise SQLGuardError(f"Statement contains forbidden keyword: {forbidden.group(1).upper()}")
+    return sql_query
+
+def fingerprint(sql_query: str) -> str:
+    # Literal-insensitive hash so repeated query shapes aggregate together
+    shape = _NUMBERS.sub('?', _LITERALS.sub('?', sql_query))
+    shape = re.sub(r'\s+', ' ', shape).strip().lower()
+    return hashlib.sha1(shape.encode()).hexdigest()[:16]
+
+def _authorize(action, arg1, arg2, db_name, trigger):
+    if action not in _ALLOWED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    # CTE references are reported without a database name
+    if action == sqlite3.SQLITE_READ and db_name is not None and arg1 not in config.SQL_ALLOWED_TABLES:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+def check_plan(conn: sqlite3.Connection, sql_query: str, params: Sequence[Any] = ()) -> List[str]:
+    # Rejects plans with nested full scans: two table scans in the same loop
+    # nest (a cartesian product or unindexed join) or a table scan inside a
+    # correlated subquery, both of which run in O(n^2)
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql_query}", tuple(params)).fetchall()
+    details = {row[0]: (row[1], row[3]) for row in plan}
+    scans_by_parent: Dict[int, int] = {}
+    for node_id, (parent, detail) in details.items():
+        if not detail.startswith("SCAN ") or detail.startswith("SCAN CONSTANT ROW"):
+            continue
+        scans_by_parent[parent] = scans_by_parent.get(parent, 0) + 1
+        ancestor = parent
+        while ancestor in details:
+            if details[ancestor][1].startswith("CORRELATED"):
+                raise SQLGuardError(f"Query plan rejected: full scan inside a correlated subquery ({detail})")
+            ancestor = details[ancestor][0]
+    if any(count > 1 for count in scans_by_parent.values()):
+        raise SQLGuardError("Query plan rejected: nested full table scans (missing join condition?)")
+    return [row[3] for row in plan]
+
+class QueryBudget:
+    def __init__(self, time_budget: float, max_rows: int):
+        self.time_budget = time_budget
+        self.max_rows = max_rows
+        self.started = time.perf_counter()
+        self.steps = 0
+        self.rows = 0
+        self.plan: List[str] = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def add_rows(self, count: int):
+        self.rows += count
+        if self.rows > self.max_rows:
+            raise SQLGuardError(f"Query exceeded the row budget of {self.max_rows} rows")
+
+@contextmanager
+def guarded(conn: sqlite3.Connection, sql_query: str, params: Sequence[Any] = (),
+            time_budget: Optional[float] = None, max_rows: Optional[int] = None, label: str = "sql"):
+    # Runs the caller's execute/fetch for an already validated statement under
+    # the read-only authorizer and a progress-handler time budget, and
+    # records the query's cost. Callers report fetched rows via budget.add_rows.
+    budget = QueryBudget(time_budget or config.SQL_TIME_BUDGET_SECONDS, max_rows or config.SQL_MAX_ROWS)
+
+    def on_progress():
+        budget.steps += config.SQL_PROGRESS_STEPS
+        return 1 if budget.elapsed() > budget.time_budget else 0
+
+    status, error = "ok", None
+    conn.set_authorizer(_authorize)
+    conn.set_progress_handler(on_progress, config.SQL_PROGRESS_STEPS)
+    try:
+        budget.plan = check_plan(conn, sql_query, params)
+        yield budget
+    except SQLGuardError as e:
+        status, error = "rejected", str(e)
+        raise
+    except sqlite3.DatabaseError as e:
+        message = str(e)
+        if "interrupted" in message:
+            status, error = "timeout", f"Query exceeded the time budget of {budget.time_budget:g}s"
+            raise SQLGuardError(error) from e
+        if "prohibited" in message or "not authorized" in message:
+            # Authorizer denial: a write or a read outside SQL_ALLOWED_TABLES
+            status, error = "rejected", f"Query rejected: {message}"
+            raise SQLGuardError(error) from e
+        status, error = "error", message
+        raise
+    except Exception as e:
+        status, error = "error", str(e)
+        raise
+    finally:
+        conn.set_authorizer(None)
+        conn.set_progress_handler(None, 0)
+        record_query_cost(label, sql_query, budget, status, error)
+
+QUERY_COST_INSERT = """
+INSERT INTO query_costs (label, fingerprint, sql, status, error, duration_ms, vm_steps, rows, plan, timestamp)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def record_query_cost(label: str, sql_query: str, budget: QueryBudget, status: str, error: Optional[str]):
+    duration_ms = budget.elapsed() * 1000
+    if status != "ok" or duration_ms > config.SQL_SLOW_QUERY_MS:
+        logger.warning(f"SQL {label} {status} in {duration_ms:.0f}ms ({budget.rows} rows): {sql_query[:200]}")
+    writer.submit(QUERY_COST_INSERT, (
+        label, fingerprint(sql_query), sql_query, status, error, duration_ms, budget.steps,
+        budget.rows, " | ".join(budget.plan), datetime.now().isoformat()
+    ))
+
+def expensive_patterns(limit: int = 20) -> List[Dict[str, Any]]:
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            """
+            SELECT fingerprint, MIN(sql) AS example, COUNT(*) AS runs,
+                   AVG(duration_ms) AS avg_ms, MAX(duration_ms) AS max_ms,
+                   AVG(vm_steps) AS avg_steps, SUM(status != 'ok') AS failures
+            FROM query_costs
+            GROUP BY fingerprint
+            ORDER BY avg_ms * runs DESC
+            LIMIT ?
+            """,
+            (limit,)
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(row) for row in rows]